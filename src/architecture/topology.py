@@ -0,0 +1,163 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+from typing import List, Optional, Tuple
+
+from src.architecture.component import ArchitectureComponent
+from src.render.plan import DEFAULT_EFFECTS, RenderPlan, compile_render_plan
+from src.state.store import STATE_SLOT_INDEX, STATE_SLOTS
+import src.utils.types as types
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the compiled render plan changes, so cached plans of older versions are not used
+PLAN_CACHE_VERSION = 2
+CONNECTION_DIRECTIONS = ("outgoing_connections", "ingoing_connections", "component_connections")
+EFFECT_PARAMETERS = {"effect", "color", "end_color", "period", "speed", "duty"}
+
+
+class TopologyError(ValueError):
+    """ Raised for topology files that do not describe a valid board """
+
+
+def parse_pixels(value: list, where: str) -> List[int]:
+    """ Expand a pixel list, entries are pixel indices or ranges like "35-21" (both ends included) """
+    pixels = []
+    for entry in value:
+        if isinstance(entry, int) and not isinstance(entry, bool):
+            pixels.append(entry)
+            continue
+        try:
+            start, end = (int(part) for part in str(entry).split("-"))
+        except ValueError:
+            raise TopologyError(f"{where}: invalid pixel entry {entry!r}, expected an index or a range like \"4-10\"")
+        step = 1 if end >= start else -1
+        pixels.extend(range(start, end + step, step))
+    return pixels
+
+
+def parse_color(value, where: str) -> Tuple[int, int, int]:
+    if not isinstance(value, list) or len(value) != 3 or not all(isinstance(channel, int) and 0 <= channel <= 255 for channel in value):
+        raise TopologyError(f"{where}: invalid color {value!r}, expected [r, g, b] with values from 0 to 255")
+    return tuple(value)
+
+
+def parse_effect(value, where: str) -> types.EffectSpec:
+    """ Parse an effect like {"effect": "pulse", "color": [0, 255, 0], "period": 1.5} """
+    if not isinstance(value, dict) or str(value.get("effect", "")).upper() not in types.EffectKind.__members__:
+        raise TopologyError(f"{where}: invalid effect {value!r}, expected {{\"effect\": name}} with one of "
+                            f"{', '.join(kind.name.lower() for kind in types.EffectKind)}")
+    kind = types.EffectKind[value["effect"].upper()]
+    unknown = set(value) - EFFECT_PARAMETERS
+    if unknown:
+        raise TopologyError(f"{where}: unknown effect parameters {', '.join(sorted(unknown))}")
+    needs_color = kind not in (types.EffectKind.NONE, types.EffectKind.OFF)
+    if needs_color and "color" not in value:
+        raise TopologyError(f"{where}: the {kind.name.lower()} effect needs a color")
+    for parameter in ("period", "speed", "duty"):
+        # bool is an int as well, but true is no period
+        if parameter in value and (not isinstance(value[parameter], (int, float)) or isinstance(value[parameter], bool) or value[parameter] <= 0):
+            raise TopologyError(f"{where}: {parameter} has to be a positive number")
+    if value.get("duty", 0.5) > 1:
+        raise TopologyError(f"{where}: duty is the share of the period the blink is on and can not exceed 1")
+    return types.EffectSpec(
+        kind,
+        parse_color(value["color"], where) if needs_color else (0, 0, 0),
+        parse_color(value["end_color"], where) if "end_color" in value else None,
+        value.get("period"),
+        value.get("speed"),
+        value.get("duty", 0.5))
+
+
+def parse_connection(value: dict, where: str) -> types.ConnectionComponent:
+    if not isinstance(value, dict):
+        raise TopologyError(f"{where}: invalid connection {value!r}, expected an object")
+    state_id = value.get("state_id")
+    if state_id not in STATE_SLOT_INDEX:
+        raise TopologyError(f"{where}: unknown state id {state_id!r}")
+    compliant_effect = parse_effect(value["compliant"], f"{where} compliant") if "compliant" in value else None
+    non_compliant_effect = parse_effect(value["non_compliant"], f"{where} non_compliant") if "non_compliant" in value else None
+    layer = value.get("layer", 0)
+    if not isinstance(layer, int) or isinstance(layer, bool):
+        raise TopologyError(f"{where}: layer has to be an integer")
+    blend = str(value.get("blend", "replace")).upper()
+    if blend not in types.BlendMode.__members__:
+        raise TopologyError(f"{where}: unknown blend mode {value.get('blend')!r}, expected one of {', '.join(mode.name.lower() for mode in types.BlendMode)}")
+    return types.ConnectionComponent(state_id, parse_pixels(value.get("pixels", []), where),
+                                     compliant_effect, non_compliant_effect, layer, types.BlendMode[blend])
+
+
+def parse_topology(data: dict) -> List[ArchitectureComponent]:
+    components = []
+    names = set()
+    if not isinstance(data, dict) or not isinstance(data.get("components", []), list):
+        raise TopologyError("Topology has to be an object with a list of components")
+    for index, component in enumerate(data.get("components", [])):
+        if not isinstance(component, dict):
+            raise TopologyError(f"component {index}: invalid component {component!r}, expected an object")
+        name = component.get("name") or f"component {index}"
+        if name in names:
+            raise TopologyError(f"Component name {name!r} is used twice")
+        names.add(name)
+        for direction in CONNECTION_DIRECTIONS:
+            if not isinstance(component.get(direction, []), list):
+                raise TopologyError(f"{name} {direction}: expected a list of connections")
+        connections = {
+            direction: [parse_connection(connection, f"{name} {direction} {connection_index}")
+                        for connection_index, connection in enumerate(component.get(direction, []))]
+            for direction in CONNECTION_DIRECTIONS}
+        components.append(ArchitectureComponent(name=name, **connections))
+    return components
+
+
+def load_topology(path: str) -> List[ArchitectureComponent]:
+    with open(path) as topology_file:
+        return parse_topology(json.load(topology_file))
+
+
+def load_render_plan(path: str, nb_pixels: int, cache_dir: Optional[str] = None) -> RenderPlan:
+    """ Load, validate and compile a topology file into a render plan.
+
+    Compiled plans are cached in cache_dir, keyed by the hash of the file, the stripe length, the cache version
+    and everything of the code the plan is compiled with (the state slots and the default effects), so later
+    boots with the same file skip parsing, validation and compilation. Writing a plan deletes the outdated plans of
+    the same file and stripe length. A cache that can not be written is skipped.
+    Pixels outside the stripe and unknown state ids raise a TopologyError, overlaps are reported on the plan.
+    """
+    with open(path, "rb") as topology_file:
+        content = topology_file.read()
+    key = hashlib.sha256(content + f"|{nb_pixels}|{PLAN_CACHE_VERSION}|{STATE_SLOTS}|{DEFAULT_EFFECTS}".encode("utf-8")).hexdigest()
+    # Plans of other topology files or stripe lengths, e.g. of the other boards, have another prefix and are kept
+    cache_prefix = f"{os.path.splitext(os.path.basename(path))[0]}-{nb_pixels}-"
+    cache_path = os.path.join(cache_dir, f"{cache_prefix}{key}.plan") if cache_dir else None
+
+    if cache_path and os.path.exists(cache_path):
+        try:
+            with open(cache_path, "rb") as cache_file:
+                return pickle.load(cache_file)
+        except Exception as exception:
+            logger.warning(f"Ignoring unreadable render plan cache {cache_path}: {exception}")
+
+    try:
+        plan = compile_render_plan(parse_topology(json.loads(content)), nb_pixels)
+    except TopologyError:
+        raise
+    except ValueError as exception:
+        raise TopologyError(f"{path}: {exception}")
+
+    if cache_path:
+        # Write to a temporary file first, so an interrupted boot never leaves a broken cache behind
+        temporary_path = f"{cache_path}.tmp"
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            with open(temporary_path, "wb") as cache_file:
+                pickle.dump(plan, cache_file)
+            os.replace(temporary_path, cache_path)
+            for name in os.listdir(cache_dir):
+                if name.startswith(cache_prefix) and name.endswith(".plan") and name != os.path.basename(cache_path):
+                    os.remove(os.path.join(cache_dir, name))
+        except OSError as exception:
+            logger.warning(f"Could not write the render plan cache {cache_path}, the next boot compiles again: {exception}")
+    return plan
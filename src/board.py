@@ -0,0 +1,115 @@
+import time
+from typing import Callable, List, Optional
+
+from src.interfaces.input import InputQueue
+from src.interfaces.neopixel import NeopixelInterface
+from src.render.plan import RenderPlan
+from src.render.recorder import SessionRecorder
+from src.render.scheduler import RenderScheduler
+from src.state.coalescer import StateCoalescer
+from src.state.persistence import StatePersistence
+from src.state.store import STATE_SLOTS
+from src.utils.metrics import LATENCY_BUCKETS, Histogram
+import src.utils.types as types
+
+
+class Board():
+    def __init__(self,
+                 name: str,
+                 neopixel_client: NeopixelInterface,
+                 render_scheduler: RenderScheduler,
+                 state_coalescer: StateCoalescer,
+                 board_plan: RenderPlan,
+                 connecting_plan: RenderPlan,
+                 state_persistence: Optional[StatePersistence] = None,
+                 session_recorder: Optional[SessionRecorder] = None):
+        """ One kitty: its own compliance, layout and LED stripe. Every board is rendered by its own thread,
+        so a slow show() of one stripe does not hold back the others
+
+        name (str): Name of the board in logs and metrics
+        neopixel_client (NeopixelInterface): LED stripe the frames are rendered to
+        render_scheduler (RenderScheduler): Paces the frames of this board
+        state_coalescer (StateCoalescer): Compliance the board is rendered with, flushed once per frame
+        board_plan (RenderPlan): Plan of the architecture, shown while connected
+        connecting_plan (RenderPlan): Plan shown while there is no connection to the broker
+        state_persistence (StatePersistence): Saves every change of the compliance, None to not save it
+        session_recorder (SessionRecorder): Records every frame and the compliance changes, None to not record them
+        """
+        self.name = name
+        self.neopixel_client = neopixel_client
+        self.render_scheduler = render_scheduler
+        self.state_coalescer = state_coalescer
+        self.board_plan = board_plan
+        self.connecting_plan = connecting_plan
+        self.state_persistence = state_persistence
+        self.session_recorder = session_recorder
+        # Time from receiving a compliance change to the first frame showing it
+        self.message_latencies = Histogram(LATENCY_BUCKETS)
+        # Called from the render thread with the monotonic time of the first shown frame
+        self.on_first_frame: Optional[Callable[[float], None]] = None
+        # Local controls, drained once per frame by the render thread of one board and passed to on_inputs
+        self.input_queue: Optional[InputQueue] = None
+        self.on_inputs: Optional[Callable[[List[types.InputEvent]], None]] = None
+        # Set by any thread, the render thread loads it before the next frame
+        self.requested_plan = connecting_plan
+        self.stopped = False
+        self._loaded_plan: Optional[RenderPlan] = None
+        self._shown_generation = None
+        self._shown_mask: Optional[int] = None
+
+    def show_connected(self, connected: bool):
+        """ Switch between the architecture and the connecting animation, safe to call from any thread """
+        if self.session_recorder:
+            self.session_recorder.record_event("connected" if connected else "disconnected")
+        self.requested_plan = self.board_plan if connected else self.connecting_plan
+
+    def run(self):
+        """ Render frames until stop() is called, blocks the calling thread """
+        self.render_scheduler.run(self.render_frame)
+
+    def stop(self):
+        """ Let run() return after the current frame, safe to call from any thread """
+        self.stopped = True
+        self.render_scheduler.stop()
+
+    def render_frame(self, frame_time: float):
+        """ Render one frame of the board, frame_time is the elapsed time in seconds """
+        # Without input this only checks the queue is empty, it takes no lock
+        if self.input_queue:
+            events = self.input_queue.drain()
+            if events and self.on_inputs:
+                self.on_inputs(events)
+        plan = self.requested_plan
+        if plan is not self._loaded_plan:
+            self.neopixel_client.load_plan(plan)
+            self._loaded_plan = plan
+        self.neopixel_client.update_animation(frame_time)
+        snapshot = self.state_coalescer.flush()
+        self.neopixel_client.update_states(snapshot)
+        shown = self.neopixel_client.show_changes()
+        if snapshot.generation != self._shown_generation:
+            self._shown_generation = snapshot.generation
+            latency = self.state_coalescer.clock() - snapshot.received_at if snapshot.received_at else None
+            if latency is not None:
+                self.message_latencies.observe(latency)
+            if self.session_recorder:
+                self._record_changes(snapshot, latency)
+        if self.session_recorder:
+            self.session_recorder.record_frame(frame_time, snapshot, plan is self.board_plan,
+                                               self.neopixel_client.frame_buffer.output if shown else None)
+        if self.on_first_frame:
+            on_first_frame, self.on_first_frame = self.on_first_frame, None
+            on_first_frame(time.monotonic())
+        # The scheduler only starts running in the render thread, a stop() before that would be lost
+        if self.stopped:
+            self.render_scheduler.stop()
+
+    def _record_changes(self, snapshot: types.ComplianceSnapshot, latency: Optional[float]):
+        """ Record which states changed with the snapshot, the first snapshot records all non-compliant ones """
+        changed = snapshot.compliant_mask ^ (self._shown_mask if self._shown_mask is not None else (1 << len(STATE_SLOTS)) - 1)
+        self._shown_mask = snapshot.compliant_mask
+        if not changed:
+            return
+        self.session_recorder.record_event("compliance", {
+            "states": {state_id: snapshot.is_compliant(slot) for slot, state_id in enumerate(STATE_SLOTS) if changed >> slot & 1},
+            "latency": latency})
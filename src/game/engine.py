@@ -0,0 +1,112 @@
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from src.state.store import STATE_SLOTS
+from src.utils.metrics import Histogram
+import src.utils.types as types
+
+# Remediations take minutes, not milliseconds
+REMEDIATION_BUCKETS = (10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1200.0, 1800.0)
+
+
+class GameEngine():
+    def __init__(self,
+                 difficulties: Dict[str, Tuple[str, str]],
+                 difficulty: Optional[str] = None,
+                 timeout: float = 1800.0,
+                 clock: Callable[[], float] = time.monotonic,
+                 wall_clock: Callable[[], float] = time.time):
+        """ Tracks the game sessions started with the button: every state that turns non-compliant during a session
+        counts as injected, the session is completed once every injected state is compliant again.
+        Not thread-safe, the supervisor calls it from the event loop only
+
+        difficulties (Dict[str, Tuple[str, str]]): Topic and message that start the chaos, per difficulty
+        difficulty (str): Difficulty the first session is started with, None for the first one of difficulties
+        timeout (float): Seconds after which a session ends even if not everything was remediated
+        clock (Callable): Monotonic clock returning seconds, the same clock the compliance snapshots are received with
+        wall_clock (Callable): Wall clock returning seconds, the start time of the sessions
+        """
+        if not difficulties:
+            raise ValueError("Game needs at least one difficulty")
+        self.difficulties = difficulties
+        self.levels: List[str] = list(difficulties)
+        self.difficulty = difficulty or self.levels[0]
+        if self.difficulty not in difficulties:
+            raise ValueError(f"Unknown difficulty '{self.difficulty}'")
+        self.timeout = timeout
+        self.clock = clock
+        self.wall_clock = wall_clock
+        self.stats = types.GameStats()
+        self.remediation_times = Histogram(REMEDIATION_BUCKETS)
+        self.session: Optional[types.GameSession] = None
+        self._session_start = 0.0
+        self._compliant_mask: Optional[int] = None
+
+    @property
+    def message(self) -> Tuple[str, str]:
+        """ Topic and message that start the chaos with the current difficulty """
+        return self.difficulties[self.difficulty]
+
+    def next_difficulty(self) -> str:
+        """ Switch to the next difficulty, after the last one the first one follows """
+        self.difficulty = self.levels[(self.levels.index(self.difficulty) + 1) % len(self.levels)]
+        return self.difficulty
+
+    def start(self) -> types.GameSession:
+        """ Start a session with the current difficulty. A running session is aborted, the new one replaces it """
+        self.abort()
+        self._session_start = self.clock()
+        self.session = types.GameSession(difficulty=self.difficulty, started_at=self.wall_clock(), remediations={})
+        self.stats.started += 1
+        return self.session
+
+    def update(self, snapshot: types.ComplianceSnapshot) -> Optional[types.GameSession]:
+        """ Take the transitions of a new snapshot. Returns the session if it was completed by them """
+        previous = self._compliant_mask
+        self._compliant_mask = snapshot.compliant_mask
+        session = self.session
+        if session is None or previous is None:
+            return None
+        elapsed = (snapshot.received_at or self.clock()) - self._session_start
+        changed = previous ^ snapshot.compliant_mask
+        for slot, state_id in enumerate(STATE_SLOTS):
+            if not changed >> slot & 1:
+                continue
+            remediation = session.remediations.get(state_id)
+            if not snapshot.is_compliant(slot):
+                # A state that breaks again after its remediation keeps its first injection
+                if remediation is None:
+                    session.remediations[state_id] = types.GameRemediation(state_id, injected_after=max(0.0, elapsed))
+                    self.stats.injections += 1
+                else:
+                    remediation.remediated_after = None
+            elif remediation is not None and remediation.remediated_after is None:
+                remediation.remediated_after = max(remediation.injected_after, elapsed)
+                self.stats.remediations += 1
+        if session.remediations and all(remediation.remediated_after is not None for remediation in session.remediations.values()):
+            return self._finish(completed=True, duration=max(remediation.remediated_after for remediation in session.remediations.values()))
+        return None
+
+    def expire(self) -> Optional[types.GameSession]:
+        """ End the session if it ran longer than the timeout. Returns the ended session """
+        if self.session is None or self.clock() - self._session_start < self.timeout:
+            return None
+        self.stats.timed_out += 1
+        return self._finish(completed=False, duration=self.clock() - self._session_start)
+
+    def abort(self) -> Optional[types.GameSession]:
+        """ End the session without a result, e.g. because all states were reset """
+        if self.session is None:
+            return None
+        self.stats.aborted += 1
+        return self._finish(completed=False, duration=self.clock() - self._session_start)
+
+    def _finish(self, completed: bool, duration: float) -> types.GameSession:
+        session, self.session = self.session, None
+        session.completed = completed
+        session.duration = duration
+        if completed:
+            self.stats.completed += 1
+            for remediation in session.remediations.values():
+                self.remediation_times.observe(remediation.time_to_remediate)
+        return session
@@ -0,0 +1,112 @@
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import src.utils.types as types
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    difficulty TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    duration REAL NOT NULL,
+    completed INTEGER NOT NULL,
+    nb_injections INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS remediations (
+    session_id INTEGER NOT NULL REFERENCES sessions(id),
+    state_id TEXT NOT NULL,
+    injected_after REAL NOT NULL,
+    remediated_after REAL,
+    time_to_remediate REAL
+);
+-- Leaderboard and rank of a difficulty, both read a range of this index instead of scanning the sessions
+CREATE INDEX IF NOT EXISTS sessions_ranking ON sessions(difficulty, completed, duration);
+CREATE INDEX IF NOT EXISTS remediations_session ON remediations(session_id);
+-- Fastest remediation per state
+CREATE INDEX IF NOT EXISTS remediations_state ON remediations(state_id, time_to_remediate);
+"""
+
+
+class Leaderboard():
+    def __init__(self, filepath: str):
+        """ Results of all game sessions in an SQLite database. Every query runs in the one thread of the
+        leaderboard and returns a future, so neither the event loop nor the render threads wait for the SD card
+
+        filepath (str): Database file, created with its tables and indexes if it does not exist
+        """
+        self.filepath = filepath
+        self._connection = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="leaderboard")
+
+    def add_session(self, session: types.GameSession) -> "Future[int]":
+        """ Store a finished session, resolves with its id """
+        return self._executor.submit(self._add_session, session)
+
+    def top(self, difficulty: str, limit: int = 10) -> "Future[List[types.LeaderboardEntry]]":
+        """ Fastest completed sessions of the difficulty """
+        return self._executor.submit(self._top, difficulty, limit)
+
+    def rank(self, session_id: int) -> "Future[Optional[int]]":
+        """ Place of a completed session among the sessions of its difficulty, 1 is the fastest and sessions with the
+        same duration share the place. Counts the faster sessions on the ranking index, which reads the index
+        entries before the session (O(log n + rank)) but never the sessions themselves """
+        return self._executor.submit(self._rank, session_id)
+
+    def best_remediations(self) -> "Future[Dict[str, float]]":
+        """ Fastest time to remediate per state over all sessions """
+        return self._executor.submit(self._best_remediations)
+
+    def close(self):
+        """ Finish the queued queries and close the database """
+        self._executor.submit(self._close)
+        self._executor.shutdown(wait=True)
+
+    def _connect(self):
+        if self._connection is None:
+            # Imported here, so it does not delay the first frame
+            import sqlite3
+            os.makedirs(os.path.dirname(self.filepath), exist_ok=True)
+            self._connection = sqlite3.connect(self.filepath)
+            # A power cut may lose the last session but never corrupts the database, and syncs are batched by the WAL
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.executescript(SCHEMA)
+        return self._connection
+
+    def _add_session(self, session: types.GameSession) -> int:
+        connection = self._connect()
+        with connection:
+            cursor = connection.execute(
+                "INSERT INTO sessions (difficulty, started_at, duration, completed, nb_injections) VALUES (?, ?, ?, ?, ?)",
+                (session.difficulty, session.started_at, session.duration, int(session.completed), len(session.remediations)))
+            connection.executemany(
+                "INSERT INTO remediations (session_id, state_id, injected_after, remediated_after, time_to_remediate) VALUES (?, ?, ?, ?, ?)",
+                [(cursor.lastrowid, remediation.state_id, remediation.injected_after, remediation.remediated_after, remediation.time_to_remediate)
+                 for remediation in session.remediations.values()])
+        return cursor.lastrowid
+
+    def _top(self, difficulty: str, limit: int) -> List[types.LeaderboardEntry]:
+        rows = self._connect().execute(
+            "SELECT id, difficulty, started_at, duration, nb_injections FROM sessions "
+            "WHERE difficulty = ? AND completed = 1 ORDER BY duration LIMIT ?", (difficulty, limit))
+        return [types.LeaderboardEntry(*row) for row in rows]
+
+    def _rank(self, session_id: int) -> Optional[int]:
+        connection = self._connect()
+        row = connection.execute("SELECT difficulty, duration FROM sessions WHERE id = ? AND completed = 1", (session_id,)).fetchone()
+        if row is None:
+            return None
+        faster, = connection.execute(
+            "SELECT COUNT(*) FROM sessions WHERE difficulty = ? AND completed = 1 AND duration < ?", row).fetchone()
+        return faster + 1
+
+    def _best_remediations(self) -> Dict[str, float]:
+        rows = self._connect().execute(
+            "SELECT state_id, MIN(time_to_remediate) FROM remediations WHERE time_to_remediate IS NOT NULL GROUP BY state_id")
+        return dict(rows.fetchall())
+
+    def _close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
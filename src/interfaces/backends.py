@@ -0,0 +1,201 @@
+import struct
+import sys
+import time
+import zlib
+from typing import Optional
+
+import numpy as np
+
+
+class StripBackend():
+    """ Output of the frame buffer, e.g. a Neopixel stripe or a simulated one """
+    nb_pixels: int
+
+    def write(self, frame: np.ndarray, changed: np.ndarray):
+        """ Take over the (nb_pixels, 3) uint8 RGB frame, changed holds the indices that differ from the last one """
+        raise NotImplementedError
+
+    def show(self):
+        """ Display the last written frame """
+        raise NotImplementedError
+
+    def cleanup(self):
+        pass
+
+
+class NeopixelStripBackend(StripBackend):
+    def __init__(self, port: str, nb_pixels: int):
+        """
+        port (str): Name of the board pin the LED stripe is connected to, e.g. "D18"
+        nb_pixels (int): Number of pixels of the LED stripe
+        """
+        # Imported here so the rest of the project can be used without a Raspberry Pi
+        import board
+        import neopixel
+        self.nb_pixels = nb_pixels
+        # The order of the pixel colors - RGB or GRB. Some NeoPixels have red and green reversed!
+        # For RGBW NeoPixels, simply change the ORDER to RGBW or GRBW.
+        self.neopixel_client: neopixel.NeoPixel = neopixel.NeoPixel(getattr(board, port), nb_pixels, brightness=1, auto_write=False, pixel_order=neopixel.RGB)
+        self._driver_buffer, self._driver_offset, self._channel_order = self._find_driver_buffer(self.neopixel_client)
+
+    @staticmethod
+    def _find_driver_buffer(neopixel_client):
+        """ Locate the byte buffer of the Adafruit pixel buffer so a frame can be copied in one go.
+        Returns (None, 0, None) if the driver does not expose a plain RGB buffer """
+        buffer = getattr(neopixel_client, "_post_brightness_buffer", None)
+        byteorder = getattr(neopixel_client, "_byteorder", None)
+        if buffer is None or byteorder is None or getattr(neopixel_client, "_bpp", None) != 3:
+            return None, 0, None
+        # A brightness below 1 makes the driver scale every pixel itself, keep using its setter then
+        if getattr(neopixel_client, "_pre_brightness_buffer", None) is not None:
+            return None, 0, None
+        # byteorder[c] is the byte offset of channel c (r, g, b) inside a pixel
+        channel_order = np.argsort(np.asarray(byteorder[:3]))
+        return buffer, getattr(neopixel_client, "_offset", 0), channel_order
+
+    def write(self, frame: np.ndarray, changed: np.ndarray):
+        if self._driver_buffer is not None:
+            # One bulk copy of the whole frame in the byte order of the stripe
+            frame_bytes = frame[:, self._channel_order].tobytes()
+            self._driver_buffer[self._driver_offset:self._driver_offset + len(frame_bytes)] = frame_bytes
+            return
+        for index in changed:
+            self.neopixel_client[int(index)] = tuple(int(value) for value in frame[index])
+
+    def show(self):
+        self.neopixel_client.show()
+
+    def cleanup(self):
+        self.neopixel_client.deinit()
+
+
+class SimulatedStripBackend(StripBackend):
+    def __init__(self, 
+                 nb_pixels: int, 
+                 history: int = 600, 
+                 render_terminal: bool = False, 
+                 render_interval: float = 0.1,
+                 clock=time.monotonic):
+        """ LED stripe without hardware. Every shown frame is kept in a ring buffer
+
+        nb_pixels (int): Number of pixels of the simulated stripe
+        history (int): Number of shown frames kept in the ring buffer
+        render_terminal (bool): Draw the stripe as one line of colored blocks in the terminal
+        render_interval (float): Minimum number of seconds between two terminal renders
+        clock (Callable): Clock used to timestamp shown frames
+        """
+        self.nb_pixels = nb_pixels
+        self.pixels = np.zeros((nb_pixels, 3), dtype=np.uint8)
+        self.history = history
+        self.frames = np.zeros((history, nb_pixels, 3), dtype=np.uint8)
+        self.timestamps = np.zeros(history)
+        self.nb_shown = 0
+        self.render_terminal = render_terminal
+        self.render_interval = render_interval
+        self.clock = clock
+        self._last_render = None
+
+    def write(self, frame: np.ndarray, changed: np.ndarray):
+        self.pixels[:] = frame
+
+    def show(self):
+        index = self.nb_shown % self.history
+        self.frames[index] = self.pixels
+        self.timestamps[index] = self.clock()
+        self.nb_shown += 1
+        if self.render_terminal:
+            now = self.timestamps[index]
+            if self._last_render is None or now - self._last_render >= self.render_interval:
+                self._last_render = now
+                sys.stdout.write("\r" + self.to_ansi(self.pixels) + "\x1b[0m")
+                sys.stdout.flush()
+
+    def recorded_frames(self, last: Optional[int] = None) -> np.ndarray:
+        """ Shown frames still in the ring buffer, oldest first. last limits the result to the newest frames """
+        nb_frames = min(self.nb_shown, self.history)
+        if last is not None:
+            nb_frames = min(nb_frames, last)
+        order = [(self.nb_shown - nb_frames + offset) % self.history for offset in range(nb_frames)]
+        return self.frames[order]
+
+    @staticmethod
+    def to_ansi(frame: np.ndarray) -> str:
+        """ One true color block per pixel """
+        return "".join(f"\x1b[38;2;{red};{green};{blue}m█" for red, green, blue in frame.tolist())
+
+    def save_png(self, path: str, last: Optional[int] = None, scale: int = 4):
+        """ Write the recorded frames as image, one row per frame from top (oldest) to bottom (newest) """
+        frames = self.recorded_frames(last)
+        if not len(frames):
+            frames = self.pixels[None]
+        image = np.repeat(np.repeat(frames, scale, axis=0), scale, axis=1)
+        write_png(path, image)
+
+
+class WledStripBackend(StripBackend):
+    # Most pixels one DNRGB packet of the WLED realtime UDP protocol can carry
+    PIXELS_PER_PACKET = 489
+
+    def __init__(self, address: str, nb_pixels: int):
+        """ LED controller running WLED on the network, frames are sent with its realtime UDP protocol (DNRGB)
+
+        address (str): "host" or "host:port" of the controller, the port defaults to 21324
+        nb_pixels (int): Number of pixels of the LED stripe
+        """
+        import socket
+        host, _, port = address.partition(":")
+        self.target = (host, int(port or 21324))
+        self.nb_pixels = nb_pixels
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.pixels = np.zeros((nb_pixels, 3), dtype=np.uint8)
+
+    def write(self, frame: np.ndarray, changed: np.ndarray):
+        self.pixels[:] = frame
+
+    def show(self):
+        data = self.pixels.tobytes()
+        for start in range(0, self.nb_pixels, self.PIXELS_PER_PACKET):
+            # Protocol 4 (DNRGB), stay in realtime mode until the next packet (255), start index, then RGB per pixel
+            header = struct.pack(">BBH", 4, 255, start)
+            self.socket.sendto(header + data[start * 3:(start + self.PIXELS_PER_PACKET) * 3], self.target)
+
+    def cleanup(self):
+        self.pixels[:] = 0
+        self.show()
+        self.socket.close()
+
+
+def write_png(path: str, image: np.ndarray):
+    """ Minimal PNG writer for (height, width, 3) uint8 RGB images """
+    height, width, _ = image.shape
+    raw = b"".join(b"\x00" + image[row].tobytes() for row in range(height))
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff)
+
+    with open(path, "wb") as png_file:
+        png_file.write(b"\x89PNG\r\n\x1a\n")
+        png_file.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)))
+        png_file.write(chunk(b"IDAT", zlib.compress(raw)))
+        png_file.write(chunk(b"IEND", b""))
+
+
+def create_strip_backend(backend: str, port: str, nb_pixels: int) -> StripBackend:
+    """ Create the LED stripe backend by name, "neopixel", "simulated" or "wled" (port is the address of the controller) """
+    if backend == "neopixel":
+        return NeopixelStripBackend(port, nb_pixels)
+    if backend == "simulated":
+        return SimulatedStripBackend(nb_pixels, render_terminal=True)
+    if backend == "wled":
+        return WledStripBackend(port, nb_pixels)
+    raise ValueError(f"Unknown hardware backend '{backend}'")
+
+
+def create_button(backend: str, port: int, callback):
+    """ Create the button by name of the hardware backend, "neopixel" uses the GPIO button """
+    import src.interfaces.button as button_interface
+    if backend == "neopixel":
+        return button_interface.ButtonInterface(port, callback)
+    if backend == "simulated":
+        return button_interface.SimulatedButtonInterface(port, callback)
+    raise ValueError(f"Unknown hardware backend '{backend}'")
@@ -1,10 +1,29 @@
-import RPi.GPIO as GPIO
 from typing import Callable
     
 class ButtonInterface():
-    def __init__(self, port: int, callback: Callable[[], None]) -> None:
+    def __init__(self, port: int, callback: Callable[[int], None]) -> None:
+        # Imported here so the rest of the project can be used without a Raspberry Pi
+        import RPi.GPIO as GPIO
+        self.GPIO = GPIO
         self.BUTTON_GPIO = port
         GPIO.setmode(GPIO.BCM)
         GPIO.setup(self.BUTTON_GPIO, GPIO.IN, pull_up_down=GPIO.PUD_UP)
         GPIO.add_event_detect(self.BUTTON_GPIO, GPIO.FALLING, callback=callback, bouncetime=100)
 
+    def cleanup(self):
+        self.GPIO.cleanup()
+
+
+class SimulatedButtonInterface():
+    def __init__(self, port: int, callback: Callable[[int], None]) -> None:
+        """ Button without hardware, press() calls the callback like a falling edge on the GPIO would """
+        self.BUTTON_GPIO = port
+        self.callback = callback
+        self.nb_presses = 0
+
+    def press(self):
+        self.nb_presses += 1
+        self.callback(self.BUTTON_GPIO)
+
+    def cleanup(self):
+        pass
@@ -0,0 +1,177 @@
+import logging
+import os
+import select
+import sys
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, TextIO
+
+import src.utils.types as types
+
+logger = logging.getLogger(__name__)
+
+
+class DebouncePolicy():
+    def __init__(self, intervals: Dict[types.InputEventKind, float]):
+        """
+        intervals (Dict[InputEventKind, float]): Minimum seconds between two accepted events of the kind,
+            kinds without an interval are never debounced
+        """
+        self.intervals = intervals
+        # Timestamp of the last accepted event per kind
+        self._last: Dict[types.InputEventKind, float] = {}
+
+    def interval(self, kind: types.InputEventKind) -> float:
+        return self.intervals.get(kind, 0.0)
+
+    def accept(self, event: types.InputEvent) -> bool:
+        """ Whether the event is far enough from the last accepted one of its kind, only accepted events count """
+        last = self._last.get(event.kind)
+        if last is not None and event.timestamp - last < self.interval(event.kind):
+            return False
+        self._last[event.kind] = event.timestamp
+        return True
+
+
+class InputQueue():
+    def __init__(self,
+                 debounce: Optional[DebouncePolicy] = None,
+                 max_size: int = 32,
+                 clock: Callable[[], float] = time.monotonic):
+        """ Events of all local controls (buttons, keys) in one queue. Sources post from their own threads,
+        the render loop takes them once per frame without blocking.
+
+        debounce (DebouncePolicy): Decides which events are too close to the previous one, None to accept all
+        max_size (int): Maximum number of queued events, the oldest one is dropped when it is full
+        clock (Callable): Monotonic clock returning seconds, injectable for deterministic runs
+        """
+        self.debounce = debounce or DebouncePolicy({})
+        self.max_size = max_size
+        self.clock = clock
+        self.stats = types.InputStats()
+        self._events: Deque[types.InputEvent] = deque()
+        self._lock = threading.Lock()
+
+    def post(self, kind: types.InputEventKind, source: str) -> bool:
+        """ Queue an event, safe to call from any thread. Returns False if it was debounced """
+        event = types.InputEvent(kind=kind, source=source, timestamp=self.clock())
+        with self._lock:
+            self.stats.posted += 1
+            accepted = self.debounce.accept(event)
+            if not accepted:
+                self.stats.debounced += 1
+            else:
+                if len(self._events) >= self.max_size:
+                    self._events.popleft()
+                    self.stats.dropped += 1
+                self._events.append(event)
+        if not accepted:
+            logger.info(f"Ignoring {kind.value} from {source}. Please wait for {self.debounce.interval(kind):.0f} seconds between presses.")
+        return accepted
+
+    def callback(self, kind: types.InputEventKind, source: str) -> Callable[..., None]:
+        """ Callback for a source that posts an event of the kind, e.g. for GPIO edge detection """
+        return lambda *args: self.post(kind, source)
+
+    def drain(self) -> List[types.InputEvent]:
+        """ Take all queued events in the order they were posted """
+        # Most frames have no input, those do not take the lock
+        if not self._events:
+            return []
+        with self._lock:
+            events = list(self._events)
+            self._events.clear()
+        self.stats.handled += len(events)
+        return events
+
+
+class TerminalInputSource():
+    def __init__(self, input_queue: InputQueue, keys: Dict[str, types.InputEventKind], stream: TextIO = sys.stdin):
+        """ Reads single key presses from the terminal the script runs in, needs no root access. Without a
+        terminal, e.g. when started by cron, it does nothing
+
+        input_queue (InputQueue): Queue the events of the keys are posted to
+        keys (Dict[str, InputEventKind]): Event per key, e.g. "\\x11" for Ctrl+Q
+        stream (TextIO): Terminal to read from
+        """
+        self.input_queue = input_queue
+        self.keys = keys
+        self.fd: Optional[int] = None
+        self._running = False
+        if not stream.isatty():
+            logger.info("Not started from a terminal, keys are disabled")
+            return
+
+        import termios
+        self.termios = termios
+        self.fd = stream.fileno()
+        self._saved_attributes = termios.tcgetattr(self.fd)
+        attributes = termios.tcgetattr(self.fd)
+        # Without flow control the terminal passes Ctrl+Q (XON) on instead of swallowing it
+        attributes[0] &= ~termios.IXON
+        # Every key is read right away and not echoed, Ctrl+C still sends SIGINT
+        attributes[3] &= ~(termios.ICANON | termios.ECHO)
+        attributes[6][termios.VMIN] = 1
+        attributes[6][termios.VTIME] = 0
+        termios.tcsetattr(self.fd, termios.TCSANOW, attributes)
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="terminal-input", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while self._running:
+            # Times out so cleanup() does not have to wait for the next key
+            readable, _, _ = select.select([self.fd], [], [], 0.2)
+            if not readable:
+                continue
+            key = os.read(self.fd, 1).decode(errors="ignore")
+            if not key:
+                break
+            kind = self.keys.get(key)
+            if kind:
+                self.input_queue.post(kind, "terminal")
+
+    def cleanup(self):
+        if not self._running:
+            return
+        self._running = False
+        self._thread.join()
+        self.termios.tcsetattr(self.fd, self.termios.TCSANOW, self._saved_attributes)
+
+
+class KeyboardInputSource():
+    def __init__(self, input_queue: InputQueue, hotkeys: Dict[str, types.InputEventKind]):
+        """ Global hotkeys of the keyboard package. They work without a terminal, but need root on Linux
+
+        input_queue (InputQueue): Queue the events of the hotkeys are posted to
+        hotkeys (Dict[str, InputEventKind]): Event per hotkey, e.g. "ctrl+q"
+        """
+        import keyboard
+        self.keyboard = keyboard
+        self._handles = [keyboard.add_hotkey(hotkey, input_queue.callback(kind, "keyboard")) for hotkey, kind in hotkeys.items()]
+
+    def cleanup(self):
+        for handle in self._handles:
+            self.keyboard.remove_hotkey(handle)
+
+
+def create_key_source(source: Optional[str], input_queue: InputQueue, terminal_keys: Dict[str, types.InputEventKind],
+                      keyboard_hotkeys: Dict[str, types.InputEventKind]):
+    """ Create the key input by name: "terminal", "keyboard" or None for no keys. Without a terminal, e.g. when
+    startup.sh is run by cron, "terminal" falls back to the global hotkeys, so Ctrl+Q keeps working """
+    if source is None:
+        return None
+    if source == "terminal":
+        if sys.stdin.isatty():
+            return TerminalInputSource(input_queue, terminal_keys)
+        logger.info("Not started from a terminal, using the global hotkeys instead")
+        try:
+            return KeyboardInputSource(input_queue, keyboard_hotkeys)
+        except (ImportError, OSError) as error:
+            # The keyboard package needs root on Linux
+            logger.warning(f"Keys are disabled, the global hotkeys are not available: {error!r}")
+            return None
+    if source == "keyboard":
+        return KeyboardInputSource(input_queue, keyboard_hotkeys)
+    raise ValueError(f"Unknown key source '{source}', expected 'terminal', 'keyboard' or None")
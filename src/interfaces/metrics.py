@@ -0,0 +1,58 @@
+import logging
+import threading
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class MetricsServer():
+    def __init__(self, host: str = "127.0.0.1", port: int = 9110):
+        """ Serves the metrics in the Prometheus text format on http://<host>:<port>/metrics from a
+        background thread. Nothing is collected per request that the components do not count anyway
+
+        host (str): Address to listen on, the default only accepts local connections
+        port (int): Port to listen on
+        """
+        self.host = host
+        self.port = port
+        self.requests = 0
+        self._server = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, collect: Callable[[], str]):
+        """ Start serving, collect() returns the current metrics as text """
+        # Imported here, http.server takes longer to import than the first frame
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        metrics_server = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                metrics_server.requests += 1
+                body = collect().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # Scrapes would otherwise print a line every few seconds
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), MetricsHandler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True)
+        self._thread.start()
+        logger.info(f"Serving metrics on http://{self.host}:{self._server.server_port}/metrics")
+
+    def stop(self):
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+        self._server = None
@@ -1,34 +1,88 @@
-import os
-import threading
+import logging
 import json
+import time
 
-from dataclasses import dataclass
 from concurrent.futures import Future
-from typing import Callable
+from typing import Callable, Dict, List, Optional, Union
 
 from awsiot import mqtt5_client_builder
 from awscrt import mqtt5
 
-from src.utils.types import ComplianceState
+from src.interfaces.mqtt_batch import BatchDecoder, is_newer_sequence
+from src.interfaces.mqtt_loopback import topic_matches
+from src.interfaces.mqtt_recording import MessageRecorder
+from src.state.coalescer import StateCoalescer
+from src.state.fanout import StateFanOut
+from src.state.store import ComplianceStore, STATE_SLOT_INDEX
 import src.utils.constants as constants 
 import src.utils.types as types
 
+logger = logging.getLogger(__name__)
+
+
+def create_topic_slot_table(subscription_topic: str, id_to_state_mapping: Dict[int, str]) -> Dict[str, int]:
+    """ Map the full topic of every known id, e.g. "aws/bulb/31", to the slot of its state """
+    topic_prefix = subscription_topic.rstrip("+#")
+    return {f"{topic_prefix}{state_id}": STATE_SLOT_INDEX[state_name] for state_id, state_name in id_to_state_mapping.items()}
+
+
 class MqttClientInterface():
-    # TODO: Add types to update state callback
-    def __init__(self, global_compliance_state: ComplianceState, client_options: types.MqttClientOption, subscription_topic: str):
+    def __init__(self, 
+                 compliance_store: Union[ComplianceStore, StateCoalescer, StateFanOut], 
+                 client_options: types.MqttClientOption, 
+                 subscription_topic: str,
+                 batch_topic: Optional[str] = None,
+                 client_builder: Callable = mqtt5_client_builder.mtls_from_path,
+                 recorder: Optional[MessageRecorder] = None,
+                 log_messages: bool = False,
+                 log_interval: float = 1.0):
         """
-        global_compliance_state (ComplianceState): Global compliance state of the architecture
+        compliance_store (ComplianceStore): Store the received compliance of the architecture is published to,
+            a StateCoalescer in front of it or a StateFanOut to the states of several boards
         client_options (MqttClientOption): Configuration for the creation of MQTT5 client
         message_topic (str): Filter mask for topics to subscribe to, e.g. "test/topic"
+        batch_topic (str): Topic of messages with the compliance of several states, applied in one step, see
+            mqtt_batch.BatchDecoder. Subscribed to as well if the subscription topic does not cover it
+        client_builder (Callable): Builds the MQTT5 client, e.g. mqtt_loopback.loopback_client_builder to run offline
+        recorder (MessageRecorder): Optional recorder every received message is appended to
+        log_messages (bool): Print received messages, at most one per log_interval seconds
+        log_interval (float): Minimum number of seconds between two printed messages
         """
-        self.global_compliance_state = global_compliance_state
+        self.compliance_store = compliance_store
         self.subscription_topic = subscription_topic
-        self.timeout = 100
+        self.batch_topic = batch_topic
+        self.subscription_topics: List[str] = [subscription_topic]
+        if batch_topic and not topic_matches(subscription_topic, batch_topic):
+            self.subscription_topics.append(batch_topic)
+        self.recorder = recorder
+        self.log_messages = log_messages
+        self.log_interval = log_interval
+        self._last_log_time = -log_interval
+        self._suppressed_logs = 0
+        self.stats = types.MessageHandlerStats()
+        # Everything the receive callback needs is prepared once, it only does a dict lookup and a bytes compare
+        self.topic_slots = create_topic_slot_table(subscription_topic, constants.MQTT_ID_TO_STATE_MAPPING)
+        # Received messages per known topic, the keys never change so counting is a plain increment
+        self.topic_messages = dict.fromkeys(self.topic_slots, 0)
+        self.compliant_payload = constants.MQTT_CLIENT_SUBSCRIPTION_PAYLOAD_COMPLIANT.encode("utf-8")
+        self.batch_decoder = BatchDecoder(
+            {state_id: STATE_SLOT_INDEX[state_name] for state_id, state_name in constants.MQTT_ID_TO_STATE_MAPPING.items()},
+            constants.MQTT_CLIENT_SUBSCRIPTION_PAYLOAD_COMPLIANT)
+        if batch_topic:
+            self.topic_messages[batch_topic] = 0
+        # Sequence number of the last applied batch, None accepts any. Kept across reconnects, so a batch the broker
+        # delivers again afterwards is dropped. A restarted publisher marks its first batch, see mqtt_batch.BATCH_FLAG_RESTART
+        self.batch_sequence: Optional[int] = None
+        # Called with the name and data of every lifecycle event, from the awscrt event loop thread
+        self.lifecycle_listener: Optional[Callable[[str, object], None]] = None
+        self.connected = False
+        self.running = False
         self.future_stopped = Future()
         self.future_connection_success = Future()
 
-        # Create MQTT5 client
-        self.client: mqtt5.Client = mqtt5_client_builder.mtls_from_path(
+        # Create MQTT5 client, it only connects once start() or connect() is called
+        self.client_options = client_options
+        self.client: mqtt5.Client = client_builder(
             endpoint=client_options.endpoint,
             port=client_options.port,
             cert_filepath=str(client_options.cert_filepath),
@@ -37,90 +91,163 @@ class MqttClientInterface():
             on_publish_received=self._on_publish_received,
             on_lifecycle_stopped=self._on_lifecycle_stopped,
             on_lifecycle_connection_success=self._on_lifecycle_connection_success,
-            on_lifecycle_connection_failure=self._on_lifecycle_connection_failure
+            on_lifecycle_connection_failure=self._on_lifecycle_connection_failure,
+            on_lifecycle_disconnection=self._on_lifecycle_disconnection
         )
-        print("MQTT5 Client Created")
+        logger.info("MQTT5 Client Created")
 
-        print(f"Connecting to {client_options.endpoint} with client ID '{client_options.client_id}'...")
+    def start(self):
+        """ Start connecting without waiting for the connection, see lifecycle_listener """
+        self.future_stopped = Future()
+        self.future_connection_success = Future()
+        logger.info(f"Connecting to {self.client_options.endpoint} with client ID '{self.client_options.client_id}'...")
+        self.running = True
         self.client.start()
 
+    def subscribe_async(self) -> Future:
+        """ Subscribe to the subscription topics and return the future that resolves with the SUBACK """
+        logger.info(f"Subscribing to topics {self.subscription_topics}...")
+        return self.client.subscribe(subscribe_packet=mqtt5.SubscribePacket(
+            subscriptions=[mqtt5.Subscription(
+                topic_filter=topic_filter,
+                qos=mqtt5.QoS.AT_LEAST_ONCE) for topic_filter in self.subscription_topics]
+        ))
+
+    def connect(self, timeout: float = 100):
+        """ Connect and subscribe, blocks for up to timeout seconds per step """
+        self.start()
+
         # Wait for connection to be successful
-        lifecycle_connect_success_data = self.future_connection_success.result(self.timeout)
+        lifecycle_connect_success_data = self.future_connection_success.result(timeout)
         connack_packet = lifecycle_connect_success_data.connack_packet
-        negotiated_settings = lifecycle_connect_success_data.negotiated_settings
-        print(f"Connected to endpoint: {client_options.endpoint} with client ID '{client_options.client_id}' with reason_code:{repr(connack_packet.reason_code)}")
+        logger.info(f"Connected to endpoint: {self.client_options.endpoint} with client ID '{self.client_options.client_id}' with reason_code:{repr(connack_packet.reason_code)}")
 
         # Subscribe to the topic
-        print(f"Subscribing to topic '{self.subscription_topic}'...")
-        subscribe_future = self.client.subscribe(subscribe_packet=mqtt5.SubscribePacket(
-            subscriptions=[mqtt5.Subscription(
-                topic_filter=self.subscription_topic,
-                qos=mqtt5.QoS.AT_LEAST_ONCE)]
-        ))
-        suback = subscribe_future.result(self.timeout)
-        print("Subscribed with {}".format(suback.reason_codes))
-        
+        suback = self.subscribe_async().result(timeout)
+        logger.info("Subscribed with {}".format(suback.reason_codes))
+
+    def stop(self):
+        """ Stop the client without waiting, it can be started again afterwards """
+        self.client.stop()
+
+    def _notify(self, event: str, data):
+        if self.lifecycle_listener:
+            self.lifecycle_listener(event, data)
+
     # Callback for the lifecycle event Connection Success
     def _on_lifecycle_connection_success(self, lifecycle_connect_success_data: mqtt5.LifecycleConnectSuccessData):
-        print("Lifecycle Connection Success")
-        self.future_connection_success.set_result(lifecycle_connect_success_data)
+        logger.info("Lifecycle Connection Success")
+        self.connected = True
+        if not self.future_connection_success.done():
+            self.future_connection_success.set_result(lifecycle_connect_success_data)
+        self._notify("connection_success", lifecycle_connect_success_data)
 
     # Callback for the lifecycle event Connection Failure
     def _on_lifecycle_connection_failure(self, lifecycle_connection_failure: mqtt5.LifecycleConnectFailureData):
-        print("Lifecycle Connection Failure")
-        print(f"Connection failed with exception: {lifecycle_connection_failure.exception}")
-    
-    # Callback when any publish is received
+        logger.warning("Lifecycle Connection Failure", extra={"data": {"exception": repr(lifecycle_connection_failure.exception)}})
+        self._notify("connection_failure", lifecycle_connection_failure)
+
+    # Callback for the lifecycle event Disconnection
+    def _on_lifecycle_disconnection(self, lifecycle_disconnect_data: mqtt5.LifecycleDisconnectData):
+        logger.warning("Lifecycle Disconnection", extra={"data": {"exception": repr(lifecycle_disconnect_data.exception)}})
+        self.connected = False
+        self._notify("disconnection", lifecycle_disconnect_data)
+
+    # Callback when any publish is received, runs on the awscrt event loop thread
     def _on_publish_received(self, publish_packet_data):
         publish_packet = publish_packet_data.publish_packet
-        assert isinstance(publish_packet, mqtt5.PublishPacket)
-        print(f"Received message from topic {publish_packet.topic}:{publish_packet.payload}")
-        
-        # TODO: Make this conversion safe/work
-        # Message is /aws/bulb/<id>
-        architecture_component_id = int(publish_packet.topic.split('/')[-1])
-        acrchitecture_component_name = constants.MQTT_ID_TO_STATE_MAPPING.get(architecture_component_id)
-
-        decoded_payload = ""
-        if publish_packet and publish_packet.payload:
-            decoded_payload = publish_packet.payload.decode("utf-8")
-            print("Payload", decoded_payload)
-        else:
-            print("No payload attached. Stop processing received message")
+        topic = publish_packet.topic
+        payload = publish_packet.payload
+        if self.recorder:
+            self.recorder.record(topic, payload)
+        stats = self.stats
+        stats.received += 1
+
+        # Message is aws/bulb/<id>, unknown and malformed topics simply miss the table
+        slot = self.topic_slots.get(topic)
+        if slot is None:
+            if topic == self.batch_topic:
+                self._on_batch_received(topic, payload)
+                return
+            stats.unknown_topic += 1
+            self._log_message(topic, payload, "unknown topic")
+            return
+        self.topic_messages[topic] += 1
+        if not payload:
+            stats.empty_payload += 1
+            self._log_message(topic, payload, "no payload")
             return
 
-        is_architecture_component_compliant = False
-        if decoded_payload == constants.MQTT_CLIENT_SUBSCRIPTION_PAYLOAD_COMPLIANT:
-            is_architecture_component_compliant = True
-
-        if acrchitecture_component_name:
-            print(f"Architecture component {acrchitecture_component_name} is compliant: {is_architecture_component_compliant}")
-            setattr(self.global_compliance_state, acrchitecture_component_name, types.ServiceState(COMPLIANT=is_architecture_component_compliant))
-
+        is_architecture_component_compliant = payload == self.compliant_payload
+        self.compliance_store.set_state(slot, is_architecture_component_compliant)
+        stats.accepted += 1
+        self._log_message(topic, payload, f"compliant: {is_architecture_component_compliant}")
+
+    def _on_batch_received(self, topic: str, payload):
+        """ Apply the states of a batch in one step, batches that are malformed or older than the last one are dropped """
+        stats = self.stats
+        self.topic_messages[topic] += 1
+        stats.batches += 1
+        try:
+            batch = self.batch_decoder.decode(bytes(payload or b""))
+        except ValueError as error:
+            stats.batches_malformed += 1
+            self._log_message(topic, payload, str(error))
+            return
+        # QoS 1 may deliver a batch twice and a reconnect may deliver an older one after a newer one
+        if not batch.restart and not is_newer_sequence(batch.sequence, self.batch_sequence):
+            stats.batches_out_of_order += 1
+            self._log_message(topic, payload, f"sequence {batch.sequence} is not after {self.batch_sequence}")
+            return
+        self.batch_sequence = batch.sequence
+        self.compliance_store.set_states(batch.updates)
+        stats.accepted += 1
+        stats.batch_states_skipped += batch.skipped
+        self._log_message(topic, payload, f"sequence {batch.sequence} with {len(batch.updates)} states, {batch.skipped} skipped")
+
+    def _log_message(self, topic: str, payload, result: str):
+        """ Log at most one received message per log interval, and only if logging is enabled """
+        if not self.log_messages:
+            return
+        now = time.monotonic()
+        if now - self._last_log_time < self.log_interval:
+            self._suppressed_logs += 1
+            return
+        logger.info("Received message", extra={"data": {
+            "topic": topic, "payload": payload, "result": result, "not_logged": self._suppressed_logs}})
+        self._last_log_time = now
+        self._suppressed_logs = 0
 
     # Callback for the lifecycle event Stopped
     def _on_lifecycle_stopped(self, lifecycle_stopped_data: mqtt5.LifecycleStoppedData):
-        print("Lifecycle Stopped")
-        self.future_stopped.set_result(lifecycle_stopped_data)
-
-    def cleanup(self):
-        """ Remove subscription and stop the client """
-        print(f"Unsubscribing from topic {self.subscription_topic}")
-        unsubscribe_future = self.client.unsubscribe(unsubscribe_packet=mqtt5.UnsubscribePacket(
-            topic_filters=[self.subscription_topic]))
-        unsuback = unsubscribe_future.result(self.timeout)
-        print(f"Unsubscribed from topic {self.subscription_topic} with {unsuback.reason_codes}")
-        print("Stopping Client")
-        self.client.stop()
-        self.future_stopped.result(self.timeout)
-        print("Client Stopped!")
-
-    def publish_message(self, topic: str, message: str):
-        print(f"Publishing message to topic '{topic}': {message}")
-        publish_future = self.client.publish(mqtt5.PublishPacket(
+        logger.info("Lifecycle Stopped")
+        self.connected = False
+        self.running = False
+        if not self.future_stopped.done():
+            self.future_stopped.set_result(lifecycle_stopped_data)
+        self._notify("stopped", lifecycle_stopped_data)
+
+    def cleanup(self, timeout: float = 100):
+        """ Remove subscription and stop the client, blocks for up to timeout seconds per step """
+        if self.connected:
+            logger.info(f"Unsubscribing from topics {self.subscription_topics}")
+            unsubscribe_future = self.client.unsubscribe(unsubscribe_packet=mqtt5.UnsubscribePacket(
+                topic_filters=self.subscription_topics))
+            unsuback = unsubscribe_future.result(timeout)
+            logger.info(f"Unsubscribed from topics {self.subscription_topics} with {unsuback.reason_codes}")
+        if self.running:
+            logger.info("Stopping Client")
+            self.client.stop()
+            self.future_stopped.result(timeout)
+            logger.info("Client Stopped!")
+        if self.recorder:
+            self.recorder.close()
+
+    def publish_message_async(self, topic: str, message: str) -> Future:
+        """ Publish a message with QoS 1 and return the future that resolves with the PUBACK """
+        logger.info("Publishing message", extra={"data": {"topic": topic, "payload": message}})
+        return self.client.publish(mqtt5.PublishPacket(
             topic=topic,
             payload=json.dumps(message),
             qos=mqtt5.QoS.AT_LEAST_ONCE
         ))
-        publish_completion_data = publish_future.result(self.timeout)
-        print(f"PubAck received with {repr(publish_completion_data.puback.reason_code)}")
\ No newline at end of file
@@ -0,0 +1,84 @@
+import json
+import struct
+from typing import Dict, Optional
+
+import src.utils.types as types
+
+# Binary batch: magic, flags (uint8), sequence number (uint32), mask of the bulb ids the batch contains and mask of
+# the compliant ones among them (uint64 each, bit `id` stands for aws/bulb/<id>)
+BATCH_MAGIC = b"KB"
+BATCH = struct.Struct("<2sBIQQ")
+# Flag of the first batch after the publisher restarted, its sequence number starts over
+BATCH_FLAG_RESTART = 1
+# Sequence numbers wrap around, a number counts as newer if it is less than half the range ahead (RFC 1982)
+SEQUENCE_MODULO = 1 << 32
+
+
+def is_newer_sequence(sequence: int, last_sequence: Optional[int]) -> bool:
+    """ Whether the sequence number follows the last applied one, repeated and older numbers do not """
+    if last_sequence is None:
+        return True
+    return 0 < (sequence - last_sequence) % SEQUENCE_MODULO < SEQUENCE_MODULO // 2
+
+
+def encode_batch(sequence: int, states: Dict[int, bool], restart: bool = False) -> bytes:
+    """ Binary batch of the compliance of several bulb ids from 0 to 63, e.g. {31: True, 32: False}. restart marks
+    the first batch of a publisher whose sequence numbers start over """
+    id_mask = compliant_mask = 0
+    for bulb_id, compliant in states.items():
+        if not 0 <= bulb_id < 64:
+            raise ValueError(f"Bulb id {bulb_id} does not fit a binary batch, use a JSON batch")
+        id_mask |= 1 << bulb_id
+        if compliant:
+            compliant_mask |= 1 << bulb_id
+    return BATCH.pack(BATCH_MAGIC, BATCH_FLAG_RESTART if restart else 0, sequence % SEQUENCE_MODULO, id_mask, compliant_mask)
+
+
+class BatchDecoder():
+    def __init__(self, id_to_slot: Dict[int, int], compliant_payload: str):
+        """ Decodes the compliance of several states from one message, either the binary batch of encode_batch or
+        JSON like {"seq": 7, "states": {"31": "green", "32": "red"}}, with "restart": true on the first batch of a
+        restarted publisher. Entries with an id that is not a number or
+        has no mapped state are skipped, the rest of the batch is applied
+
+        id_to_slot (Dict[int, int]): Slot of the state of every known bulb id
+        compliant_payload (str): State value of a compliant bulb in JSON batches, e.g. "green"
+        """
+        self.id_to_slot = id_to_slot
+        self.compliant_payload = compliant_payload
+        # Bits of the binary masks that belong to a known id
+        self.known_mask = sum(1 << bulb_id for bulb_id in id_to_slot if 0 <= bulb_id < 64)
+
+    def decode(self, payload: bytes) -> types.StateBatch:
+        """ States of a batch, raises ValueError if the batch as a whole is malformed """
+        if payload[:len(BATCH_MAGIC)] == BATCH_MAGIC:
+            if len(payload) != BATCH.size:
+                raise ValueError(f"Binary batch has {len(payload)} bytes instead of {BATCH.size}")
+            _, flags, sequence, id_mask, compliant_mask = BATCH.unpack(payload)
+            skipped = bin(id_mask & ~self.known_mask).count("1")
+            id_mask &= self.known_mask
+            return types.StateBatch(sequence, bool(flags & BATCH_FLAG_RESTART), [
+                (self.id_to_slot[bulb_id], bool(compliant_mask >> bulb_id & 1)) for bulb_id in self.id_to_slot if id_mask >> bulb_id & 1], skipped)
+        try:
+            batch = json.loads(payload)
+            sequence = batch["seq"]
+            states = batch["states"]
+            restart = batch.get("restart", False)
+        except (KeyError, TypeError, ValueError) as error:
+            # json.JSONDecodeError and UnicodeDecodeError are ValueErrors as well
+            raise ValueError(f"Malformed batch: {error!r}") from error
+        # bool is an int as well, but true is no sequence number
+        if not isinstance(sequence, int) or isinstance(sequence, bool) or not isinstance(states, dict) or not isinstance(restart, bool):
+            raise ValueError("Malformed batch: seq must be an integer, states an object and restart a boolean")
+        updates = []
+        skipped = 0
+        for bulb_id, value in states.items():
+            try:
+                slot = self.id_to_slot.get(int(bulb_id))
+            except ValueError:
+                slot = None
+            if slot is None:
+                skipped += 1
+                continue
+            updates.append((slot, value == self.compliant_payload))
+        return types.StateBatch(sequence % SEQUENCE_MODULO, restart, updates, skipped)
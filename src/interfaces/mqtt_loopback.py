@@ -0,0 +1,115 @@
+import threading
+from concurrent.futures import Future
+from typing import Callable, List, Optional
+
+from awscrt import mqtt5
+
+
+def topic_matches(topic_filter: str, topic: str) -> bool:
+    """ Check a topic against an MQTT topic filter with + and # wildcards """
+    filter_levels = topic_filter.split('/')
+    topic_levels = topic.split('/')
+    for index, level in enumerate(filter_levels):
+        if level == '#':
+            return True
+        if index >= len(topic_levels) or (level != '+' and level != topic_levels[index]):
+            return False
+    return len(filter_levels) == len(topic_levels)
+
+
+class LoopbackMqttClient():
+    def __init__(self,
+                 on_publish_received: Optional[Callable] = None,
+                 on_lifecycle_stopped: Optional[Callable] = None,
+                 on_lifecycle_connection_success: Optional[Callable] = None,
+                 on_lifecycle_connection_failure: Optional[Callable] = None,
+                 on_lifecycle_disconnection: Optional[Callable] = None,
+                 client_id: str = "loopback"):
+        """ Local stand-in for awscrt's mqtt5.Client. Nothing leaves the process: subscriptions and
+        publishes are answered immediately and published messages are delivered back to matching
+        subscriptions. deliver() injects messages as if they were received from the broker,
+        drop_connection() and connect_failures simulate an unreliable network.
+        """
+        self.on_publish_received = on_publish_received
+        self.on_lifecycle_stopped = on_lifecycle_stopped
+        self.on_lifecycle_connection_success = on_lifecycle_connection_success
+        self.on_lifecycle_connection_failure = on_lifecycle_connection_failure
+        self.on_lifecycle_disconnection = on_lifecycle_disconnection
+        self.client_id = client_id
+        # Number of upcoming start() calls that fail to connect
+        self.connect_failures = 0
+        self.subscriptions: List[str] = []
+        self.published: List[mqtt5.PublishPacket] = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self.connect_failures > 0:
+            self.connect_failures -= 1
+            if self.on_lifecycle_connection_failure:
+                self.on_lifecycle_connection_failure(mqtt5.LifecycleConnectFailureData(
+                    exception=ConnectionError("Simulated connection failure")))
+            return
+        if self.on_lifecycle_connection_success:
+            self.on_lifecycle_connection_success(mqtt5.LifecycleConnectSuccessData(
+                connack_packet=mqtt5.ConnackPacket(reason_code=mqtt5.ConnectReasonCode.SUCCESS),
+                negotiated_settings=mqtt5.NegotiatedSettings(client_id=self.client_id)))
+
+    def drop_connection(self):
+        """ Lose the connection like a network failure would, the session and its subscriptions are gone """
+        with self._lock:
+            self.subscriptions.clear()
+        if self.on_lifecycle_disconnection:
+            self.on_lifecycle_disconnection(mqtt5.LifecycleDisconnectData(exception=ConnectionError("Simulated connection loss")))
+
+    def stop(self):
+        with self._lock:
+            self.subscriptions.clear()
+        if self.on_lifecycle_stopped:
+            self.on_lifecycle_stopped(mqtt5.LifecycleStoppedData())
+
+    def subscribe(self, subscribe_packet: mqtt5.SubscribePacket) -> Future:
+        with self._lock:
+            self.subscriptions.extend(subscription.topic_filter for subscription in subscribe_packet.subscriptions)
+        return self._completed(mqtt5.SubackPacket(
+            reason_codes=[mqtt5.SubackReasonCode.GRANTED_QOS_1] * len(subscribe_packet.subscriptions)))
+
+    def unsubscribe(self, unsubscribe_packet: mqtt5.UnsubscribePacket) -> Future:
+        with self._lock:
+            for topic_filter in unsubscribe_packet.topic_filters:
+                if topic_filter in self.subscriptions:
+                    self.subscriptions.remove(topic_filter)
+        return self._completed(mqtt5.UnsubackPacket(
+            reason_codes=[mqtt5.UnsubackReasonCode.SUCCESS] * len(unsubscribe_packet.topic_filters)))
+
+    def publish(self, publish_packet: mqtt5.PublishPacket) -> Future:
+        with self._lock:
+            self.published.append(publish_packet)
+        payload = publish_packet.payload
+        self.deliver(publish_packet.topic, payload.encode("utf-8") if isinstance(payload, str) else payload)
+        return self._completed(mqtt5.PublishCompletionData(
+            puback=mqtt5.PubackPacket(reason_code=mqtt5.PubackReasonCode.SUCCESS)))
+
+    def deliver(self, topic: str, payload: bytes):
+        """ Hand a message to the publish received callback if a subscription matches its topic """
+        with self._lock:
+            subscribed = any(topic_matches(topic_filter, topic) for topic_filter in self.subscriptions)
+        if subscribed and self.on_publish_received:
+            self.on_publish_received(mqtt5.PublishReceivedData(publish_packet=mqtt5.PublishPacket(
+                payload=payload, qos=mqtt5.QoS.AT_LEAST_ONCE, topic=topic)))
+
+    @staticmethod
+    def _completed(result) -> Future:
+        future = Future()
+        future.set_result(result)
+        return future
+
+
+def loopback_client_builder(**kwargs) -> LoopbackMqttClient:
+    """ Drop-in replacement for mqtt5_client_builder.mtls_from_path, connection options are ignored """
+    return LoopbackMqttClient(
+        on_publish_received=kwargs.get("on_publish_received"),
+        on_lifecycle_stopped=kwargs.get("on_lifecycle_stopped"),
+        on_lifecycle_connection_success=kwargs.get("on_lifecycle_connection_success"),
+        on_lifecycle_connection_failure=kwargs.get("on_lifecycle_connection_failure"),
+        on_lifecycle_disconnection=kwargs.get("on_lifecycle_disconnection"),
+        client_id=kwargs.get("client_id", "loopback"))
@@ -0,0 +1,118 @@
+import struct
+import threading
+import time
+from typing import BinaryIO, Callable, Iterable, Iterator, List, Optional
+
+from src.interfaces.mqtt_batch import encode_batch
+import src.utils.types as types
+
+# Every record is a header followed by the topic and the payload bytes
+# receive timestamp (float64, seconds), topic length (uint16), payload length (uint32)
+RECORD_HEADER = struct.Struct("<dHI")
+
+
+class MessageRecorder():
+    def __init__(self, path: str):
+        """ Appends every received message to a compact binary log
+
+        path (str): Log file, created if it does not exist and appended to otherwise
+        """
+        self.path = path
+        self._file: BinaryIO = open(path, "ab")
+        self._lock = threading.Lock()
+        self.nb_records = 0
+
+    def record(self, topic: str, payload: Optional[bytes], timestamp: Optional[float] = None):
+        topic_bytes = topic.encode("utf-8")
+        payload = payload or b""
+        header = RECORD_HEADER.pack(time.time() if timestamp is None else timestamp, len(topic_bytes), len(payload))
+        with self._lock:
+            self._file.write(header + topic_bytes + payload)
+            self.nb_records += 1
+
+    def flush(self):
+        with self._lock:
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def read_messages(path: str) -> Iterator[types.RecordedMessage]:
+    """ Read all messages of a log written by MessageRecorder, a truncated last record is ignored """
+    with open(path, "rb") as log_file:
+        while True:
+            header = log_file.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            timestamp, topic_length, payload_length = RECORD_HEADER.unpack(header)
+            body = log_file.read(topic_length + payload_length)
+            if len(body) < topic_length + payload_length:
+                return
+            yield types.RecordedMessage(timestamp, body[:topic_length].decode("utf-8"), body[topic_length:])
+
+
+def generate_messages(rate: float, duration: float, ids: List[int], compliant_payload: bytes = b"green", 
+                      non_compliant_payload: bytes = b"red", topic_prefix: str = "aws/bulb/") -> List[types.RecordedMessage]:
+    """ Synthetic burst of messages, cycling through the ids and alternating compliant and non-compliant
+
+    rate (float): Messages per second
+    duration (float): Seconds the burst lasts
+    ids (List[int]): Bulb ids the messages are sent to
+    """
+    nb_messages = int(rate * duration)
+    topics = [f"{topic_prefix}{bulb_id}" for bulb_id in ids]
+    return [types.RecordedMessage(
+                timestamp=index / rate,
+                topic=topics[index % len(topics)],
+                payload=non_compliant_payload if (index // len(topics)) % 2 == 0 else compliant_payload)
+            for index in range(nb_messages)]
+
+
+def generate_batch_messages(rate: float, duration: float, ids: List[int], topic: str = "aws/bulb/batch") -> List[types.RecordedMessage]:
+    """ Synthetic burst of binary batches with consecutive sequence numbers from 0 on, the first one marked as restart
+    so a running board takes it. Every batch contains all ids and alternates between all non-compliant and all compliant
+
+    rate (float): Messages per second
+    duration (float): Seconds the burst lasts
+    ids (List[int]): Bulb ids every batch contains
+    """
+    return [types.RecordedMessage(
+                timestamp=index / rate,
+                topic=topic,
+                payload=encode_batch(index, dict.fromkeys(ids, index % 2 == 1), restart=index == 0))
+            for index in range(int(rate * duration))]
+
+
+class MessageReplayer():
+    def __init__(self, deliver: Callable[[str, bytes], None]):
+        """
+        deliver (Callable): Injects one message, e.g. LoopbackMqttClient.deliver
+        """
+        self.deliver = deliver
+
+    def replay(self, messages: Iterable[types.RecordedMessage], speed: Optional[float] = 1.0,
+               on_delivered: Optional[Callable[[types.RecordedMessage, float], None]] = None) -> int:
+        """ Feed the messages to deliver, keeping their original spacing divided by speed
+
+        speed (float): 1 for real time, N for N times faster, None for as fast as possible
+        on_delivered (Callable): Called with every message and the seconds its delivery took
+        Returns the number of delivered messages
+        """
+        nb_delivered = 0
+        first_timestamp = None
+        start = time.monotonic()
+        for message in messages:
+            if speed is not None:
+                if first_timestamp is None:
+                    first_timestamp = message.timestamp
+                wait = (message.timestamp - first_timestamp) / speed - (time.monotonic() - start)
+                if wait > 0:
+                    time.sleep(wait)
+            delivered_at = time.perf_counter()
+            self.deliver(message.topic, message.payload)
+            if on_delivered:
+                on_delivered(message, time.perf_counter() - delivered_at)
+            nb_delivered += 1
+        return nb_delivered
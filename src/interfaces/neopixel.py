@@ -1,9 +1,13 @@
-import time
-import neopixel
-import random
-import math
+from typing import Optional
 from enum import Enum
 
+from src.interfaces.backends import StripBackend
+from src.render.compositor import FrameCompositor
+from src.render.effects import EffectEvaluator
+from src.render.tables import AnimationTables
+from src.render.plan import RenderPlan
+from src.render.framebuffer import FrameBuffer
+from src.render.output import OutputStage
 import src.utils.types as types
 
 class IntensityWheelValues(Enum):
@@ -26,74 +30,52 @@ class IntensityWheelValues(Enum):
     OFF2 = 0
     
 class NeopixelInterface():
-    def __init__(self, port: int, nb_pixels: int):
-        self.port = port
-        self.nb_pixels = nb_pixels
-        # The order of the pixel colors - RGB or GRB. Some NeoPixels have red and green reversed!
-        # For RGBW NeoPixels, simply change the ORDER to RGBW or GRBW.
-        self.neopixel_client: neopixel.NeoPixel = neopixel.NeoPixel(port, nb_pixels, brightness=1, auto_write=False, pixel_order=neopixel.RGB)
+    def __init__(self, backend: StripBackend, pulse_period: float = 2.0, chase_speed: float = 20,
+                 table_capacity: int = 64, table_max_bytes: int = 4 * 1024 * 1024, output_stage: Optional[OutputStage] = None):
+        """
+        backend (StripBackend): LED stripe the frames are shown on, see backends.create_strip_backend
+        pulse_period (float): Duration of one pulse in seconds, for effects that do not set their own
+        chase_speed (float): Number of intensity wheel steps the chase moves per second, for effects that do not set their own
+        table_capacity (int): Maximum number of precomputed animation tables kept
+        table_max_bytes (int): Maximum memory of the precomputed animation tables in bytes
+        output_stage (OutputStage): Gamma, brightness and power budget applied to every frame, None to show frames as composed
+        """
+        self.backend = backend
+        self.nb_pixels = backend.nb_pixels
+        # The render plan is composited into the frame buffer, which is only pushed to the stripe if it changed
+        self.frame_buffer = FrameBuffer(backend, output_stage)
         self.int_values = [intensity.value * 0.05 for intensity in IntensityWheelValues] 
         self.len_int_values = len(self.int_values)
-        self.max_pulse_value = 255
-        self.min_pulse_value = 50
-        self.current_cycle_step = 0
-        self.cycle_length = 100
-        self.amplitude = (self.max_pulse_value - self.min_pulse_value) / 2
-        self.offset = (self.max_pulse_value + self.min_pulse_value) / 2
-        self.current_intensity = int(self.amplitude * math.sin(2 * math.pi * self.current_cycle_step / self.cycle_length) + self.offset)
+        # Defaults of effects that do not set their own period or speed
+        self.pulse_period = pulse_period
+        self.chase_speed = chase_speed
+        # Colors of every effect are precomputed per animation phase, a frame only looks them up
+        self.tables = AnimationTables(table_capacity, table_max_bytes)
+        self.evaluator = EffectEvaluator([value / 255.0 for value in self.int_values], chase_speed, pulse_period,
+                                         min_pulse_value=50, max_pulse_value=255, tables=self.tables)
+        self.compositor = FrameCompositor(self.frame_buffer.pixels, self.evaluator)
+        # Animations are driven by the elapsed time of the frame, not by the number of rendered frames,
+        # so they look the same independent of the frame rate
+        self.frame_time = 0.0
 
+    def update_animation(self, frame_time: float):
+        """ Advance all effects to the given time in seconds. Call once at the start of every frame """
+        self.frame_time = frame_time
 
-    def update_outgoing_pixels(self, pixels: list[int], compliance_state: types.ServiceState):
-        if not compliance_state.COMPLIANT:
-            for idx, pixel in enumerate(pixels):
-                self.neopixel_client[pixel] = (0,0,0)
-            return
-        
-        base_color = (255, 255, 255) if compliance_state.COMPLIANT else (100, 255, 0)  # white for compliant, red for non-compliant
-        c_time = time.time()
-        for idx, pixel in enumerate(pixels):
-            # Create a moving effect using the intensity wheel and time
-            # Add idx to make it "move" in the other direction
-            intensity_factor = self.int_values[int((c_time * 20 - idx) % self.len_int_values)] / 255.0  # multipled time with 2 to speed up movement
-            adjusted_color = tuple(int(value * intensity_factor) for value in base_color)
-            self.neopixel_client[pixel] = adjusted_color
+    def load_plan(self, plan: RenderPlan):
+        """ Set the compiled render plan of all architecture components """
+        self.compositor.load_plan(plan)
 
-    def update_ingoing_pixels(self, pixels: list[int], compliance_state: types.ServiceState):
-        if compliance_state.COMPLIANT:
-            return
-        
-        base_color = (0, 0, 255) if compliance_state.COMPLIANT else (0, 255, 0)  # white for compliant, red for non-compliant
-        base_color = (base_color[0] * self.current_intensity / 255, base_color[1] * self.current_intensity / 255, base_color[2] * self.current_intensity / 255 )
-        
-        for idx, pixel in enumerate(pixels):
-            self.neopixel_client[pixel] = base_color
+    def update_states(self, snapshot: types.ComplianceSnapshot):
+        """ Take over the compliance snapshot the next frame is rendered with """
+        self.compositor.set_states(snapshot)
 
-    def update_component_pixels(self, pixels: list[int], compliance_state: types.ServiceState):
-        base_color = (255, 0, 0) if compliance_state.COMPLIANT else (0, 255, 0)  # white for compliant, red for non-compliant
-
-        if not compliance_state.COMPLIANT:
-            base_color = (base_color[0] * self.current_intensity / 255, base_color[1] * self.current_intensity / 255, base_color[2] * self.current_intensity / 255 )
-        
-        for pixel in pixels:
-            self.neopixel_client[pixel] = base_color
-
-    def update_component_pixels_orange(self, pixels: list[int], compliance_state: types.ServiceState):
-        base_color = (255, 0, 0) if compliance_state.COMPLIANT else (50, 255, 0)  #
-
-        if not compliance_state.COMPLIANT:
-            base_color = (base_color[0] * self.current_intensity / 255, base_color[1] * self.current_intensity / 255, base_color[2] * self.current_intensity / 255 )
-        
-        for pixel in pixels:
-            self.neopixel_client[pixel] = base_color
-
-    def show_changes(self):
-        """ Move changes to the actual hardware """
-        self.neopixel_client.show()
-        self.current_cycle_step = self.current_cycle_step + 1
-        if self.current_cycle_step == self.cycle_length - 1:
-            self.current_cycle_step = 0
-        self.current_intensity = int(self.amplitude * math.sin(2 * math.pi * self.current_cycle_step / self.cycle_length) + self.offset)
+    def show_changes(self) -> bool:
+        """ Composite the render plan and move changes to the actual hardware, skipped if the frame did not change.
+        Returns False if it was skipped """
+        self.compositor.compose(self.frame_time)
+        return self.frame_buffer.flush()
 
     def cleanup(self):
         """ Celan up """
-        self.neopixel_client.deinit()
+        self.backend.cleanup()
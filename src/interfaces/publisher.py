@@ -0,0 +1,155 @@
+import concurrent.futures
+import logging
+import threading
+import time
+from collections import deque
+from typing import Deque, Optional, Tuple
+
+from src.utils.metrics import LATENCY_BUCKETS, Histogram
+import src.utils.types as types
+
+logger = logging.getLogger(__name__)
+
+
+class OutboundPublisher():
+    def __init__(self, 
+                 mqtt_client, 
+                 max_queue_size: int = 16, 
+                 overflow_policy: types.OverflowPolicy = types.OverflowPolicy.DROP_OLDEST,
+                 max_retries: int = 3,
+                 puback_timeout: float = 10.0,
+                 retry_backoff: float = 0.5):
+        """ Bounded queue of outgoing messages drained by a dedicated sender thread, so callers
+        (e.g. the GPIO callback thread) never wait for the broker.
+
+        mqtt_client (MqttClientInterface): Client used to publish the messages
+        max_queue_size (int): Maximum number of messages waiting to be published
+        overflow_policy (OverflowPolicy): What to do with a new message while the queue is full
+        max_retries (int): Number of further PUBACK timeouts a message is waited for. The client keeps a message
+            without PUBACK in flight and sends it again itself, with the DUP flag after a reconnect, so a late PUBACK
+            never delivers it twice. Only idempotent messages are published again if the publish failed
+        puback_timeout (float): Seconds to wait for the PUBACK of a message
+        retry_backoff (float): Seconds to wait before the first retry, doubled for every further retry
+        """
+        if max_queue_size < 1:
+            raise ValueError(f"Queue size has to be at least 1, got {max_queue_size}")
+        self.mqtt_client = mqtt_client
+        self.max_queue_size = max_queue_size
+        self.overflow_policy = overflow_policy
+        self.max_retries = max_retries
+        self.puback_timeout = puback_timeout
+        self.retry_backoff = retry_backoff
+        self.stats = types.PublisherStats()
+        self.puback_latencies = Histogram(LATENCY_BUCKETS)
+        # (topic, message, enqueue timestamp, idempotent)
+        self._queue: Deque[Tuple[str, str, float, bool]] = deque()
+        self._condition = threading.Condition()
+        self._running = True
+        # Monotonic time until which the queue is flushed after stop(), None flushes all of it
+        self._deadline: Optional[float] = None
+        self._thread = threading.Thread(target=self._run, name="mqtt-publisher", daemon=True)
+        self._thread.start()
+
+    def publish(self, topic: str, message: str, idempotent: bool = False) -> bool:
+        """ Queue a message without blocking. Returns False if it was rejected because the queue is full
+
+        idempotent (bool): Whether receiving the message twice does no harm, only those are published again after a
+            failed publish. Starting the chaos is not idempotent, asking for a resync is
+        """
+        with self._condition:
+            if len(self._queue) >= self.max_queue_size:
+                if self.overflow_policy == types.OverflowPolicy.REJECT_NEWEST:
+                    self.stats.rejected += 1
+                    return False
+                self._queue.popleft()
+                self.stats.dropped += 1
+            self._queue.append((topic, message, time.monotonic(), idempotent))
+            self.stats.enqueued += 1
+            self.stats.queue_depth = len(self._queue)
+            self.stats.max_queue_depth = max(self.stats.max_queue_depth, self.stats.queue_depth)
+            self._condition.notify()
+        return True
+
+    def stop(self, timeout: Optional[float] = None):
+        """ Publish the queued messages for up to timeout seconds, then stop the sender thread. Messages still queued
+        by then are dropped and logged """
+        with self._condition:
+            self._running = False
+            self._deadline = None if timeout is None else time.monotonic() + timeout
+            self._condition.notify()
+        self._thread.join(timeout)
+        with self._condition:
+            remaining = len(self._queue)
+            self._queue.clear()
+            self.stats.dropped += remaining
+            self.stats.queue_depth = 0
+        if remaining:
+            logger.warning(f"Dropped {remaining} queued messages that were not published before the shutdown")
+
+    def _expired(self) -> bool:
+        """ Whether the publisher was stopped and the time to flush the queue is over """
+        return not self._running and self._deadline is not None and time.monotonic() >= self._deadline
+
+    def _wait_time(self) -> float:
+        if self._running or self._deadline is None:
+            return self.puback_timeout
+        return max(0.0, min(self.puback_timeout, self._deadline - time.monotonic()))
+
+    def _next_message(self) -> Optional[Tuple[str, str, float, bool]]:
+        with self._condition:
+            while self._running and not self._queue:
+                self._condition.wait()
+            if not self._queue or self._expired():
+                return None
+            item = self._queue.popleft()
+            self.stats.queue_depth = len(self._queue)
+            return item
+
+    def _run(self):
+        while True:
+            item = self._next_message()
+            if item is None:
+                return
+            self._send(*item)
+
+    def _send(self, topic: str, message: str, enqueued_at: float, idempotent: bool):
+        backoff = self.retry_backoff
+        publish_future = None
+        sent_at = time.monotonic()
+        for attempt in range(self.max_retries + 1):
+            try:
+                if publish_future is None:
+                    if attempt:
+                        self.stats.retried += 1
+                        time.sleep(backoff)
+                        backoff *= 2
+                    sent_at = time.monotonic()
+                    publish_future = self.mqtt_client.publish_message_async(topic, message)
+                publish_completion_data = publish_future.result(self._wait_time())
+            except concurrent.futures.TimeoutError:
+                # Not the builtin TimeoutError before Python 3.11
+                # Still in flight, a new packet would deliver the message twice once the late PUBACK arrives
+                self.stats.puback_timeouts += 1
+                logger.warning("No PUBACK in time, waiting for it again", extra={"data": {"topic": topic, "attempt": attempt + 1}})
+                if self._expired():
+                    break
+                continue
+            except Exception as exception:
+                logger.warning("Publishing message failed", extra={"data": {"topic": topic, "attempt": attempt + 1, "exception": repr(exception)}})
+                # The broker may have received it before the publish failed
+                if not idempotent or self._expired():
+                    break
+                publish_future = None
+                continue
+            now = time.monotonic()
+            stats = self.stats
+            stats.published += 1
+            stats.last_puback_latency = now - sent_at
+            stats.max_puback_latency = max(stats.max_puback_latency, stats.last_puback_latency)
+            self.puback_latencies.observe(stats.last_puback_latency)
+            stats.last_queue_latency = sent_at - enqueued_at
+            logger.info("PubAck received", extra={"data": {
+                "reason_code": repr(publish_completion_data.puback.reason_code), "latency": round(stats.last_puback_latency, 4)}})
+            return
+        self.stats.failed += 1
+        logger.warning("Message given up", extra={"data": {"topic": topic, "idempotent": idempotent}})
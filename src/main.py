@@ -1,204 +1,246 @@
 #!/usr/bin/env python3
-import signal
-import sys
+import asyncio
+import logging
 import os
 import time
-import keyboard
+from typing import Dict, List
 
-from typing import List
-from uuid import uuid4
-import RPi.GPIO as GPIO
-
-import src.interfaces.button as button_interface
-import src.interfaces.mqtt as mqtt_interface
+# Only what the first frame needs is imported here, awscrt, awsiot and keyboard are imported once the stripe is lit
+import src.interfaces.backends as backends
+import src.interfaces.input as input_interface
+import src.interfaces.metrics as metrics_interface
 import src.interfaces.neopixel as neopixel_interface
+import src.interfaces.publisher as publisher_interface
 import src.utils.constants as constants
-import src.architecture.component as architecture
+import src.architecture.topology as topology
+import src.game.engine as game_engine
+import src.game.leaderboard as leaderboard
+import src.render.output as output
+import src.render.plan as render_plan_compiler
+import src.render.recorder as recorder
+import src.render.scheduler as scheduler
+import src.state.coalescer as coalescer
+import src.state.store as store
+import src.state.fanout as fanout
+import src.state.persistence as persistence
+import src.supervisor as supervisor
+import src.board as board_interface
+import src.utils.boot as boot
+import src.utils.logs as logs
 import src.utils.types as types
 
-global_compliance_state: types.ComplianceState = types.ComplianceState(
-    igw_compliant = types.ServiceState(), # Not yet part of experiment
-    alb_sec_group_compliant = types.ServiceState(),
-    alb_compliant = types.ServiceState(), # Not yet part of experiment
-    cloud_trail_compliant = types.ServiceState(),
-    asg_sec_group_compliant = types.ServiceState(),
-    ec2_instance_2a_compliant = types.ServiceState(),
-    ec2_instance_2a_sec_group = types.ServiceState(), # Not yet part of experiment
-    ec2_instance_2b_compliant = types.ServiceState(),
-    ec2_instance_2b_sec_group = types.ServiceState(), # Not yet part of experiment
-    rds_db_compliant = types.ServiceState(),
-    rds_sec_group_compliant = types.ServiceState(),
-    rds_replication_compliant = types.ServiceState(), # Not yet part of experiment
-    s3_bucket_compliant = types.ServiceState(),
-    general_connection = types.ServiceState() # General connection that will not be updated by experiment
-)
-
-def create_signal_handler(
-        mqtt_client: mqtt_interface.MqttClientInterface, 
-        neopixel_client : neopixel_interface.NeopixelInterface):
-    """ Wrapper to provide signal_handler with references to objects needed to be shut down. """
-    def signal_handler(sig, frame):
-        """ Called when Ctl + C is pressed """
-        mqtt_client.cleanup()
-        neopixel_client.cleanup()
-        GPIO.cleanup()
-        sys.exit(0)
-    return signal_handler
-
-last_click_timestamp = 0  # initializing the timestamp at the start
-def on_button_clicked_callback(value):
-    global last_click_timestamp
-
-    current_time = time.time()
-    
-    # Check if the difference between the current time and the last click timestamp is more than 10 seconds
-    if current_time - last_click_timestamp >= 10:
-        print("Pressed button")
-        mqtt_client.publish_message(
-            constants.MQTT_CLIENT_PUBLISHING_TOPIC,
-            constants.MQTT_CLIENT_PUBLISHING_MESSAGE)
-        
-        # Update the timestamp
-        last_click_timestamp = current_time
-    else:
-        print("Button pressed too quickly. Please wait for 10 seconds between presses.")
-
-button_client: button_interface.ButtonInterface = button_interface.ButtonInterface(
-    constants.BUTTON_PORT, 
-    on_button_clicked_callback)
-
-mqtt_client_options: types.MqttClientOption = types.MqttClientOption(
-    endpoint=constants.MQTT_CLIENT_ENDPOINT,
-    port=constants.MQTT_CLIENT_PORT,
-    cert_filepath=constants.MQTT_CLIENT_CERT_FILEPATH,
-    pri_key_filepath=constants.MQTT_CLIENT_PRI_KEY_FILEPATH,
-    client_id=constants.MQTT_CLIENT_CLIENT_ID)
-
-mqtt_client: mqtt_interface.MqttClientInterface = mqtt_interface.MqttClientInterface(
-    global_compliance_state,
-    mqtt_client_options,
-    constants.MQTT_CLIENT_SUBSCRIPTION_TOPIC)
-
-neopixel_client : neopixel_interface.NeopixelInterface = neopixel_interface.NeopixelInterface(
-    port=constants.NEOPIXEL_PORT,
-    nb_pixels=constants.NEOPIXEL_NB_PIXELS)
-
-"""
-A: 1, 2, 3, 100, 99, 98
-B: 4-15 (RDS AZ1 <-> RDS AZ2)
-C: 16, 17, 18, 19, 20, 112, 110
-D: 35-21 (EC2 AZ1 -> RDS AZ2)
-E: 36-39, 106 (EC2 AZ1)
-F: 50-40 (ALB -> EC2 AZ1)
-G: 51, 52, 53, 54, 69 (ALB)
-H: 55, 54 (IGW -> ALB)
-I: 56, 57, 58, 59 (IGW)
-J: 60, 61, 62, 63 (Cloud Trail)
-K: 64, 65, 66, 67 (S3)
-L: 70-78 (ALB -> EC2 AZ2)
-M: 79-84 (EC2 AZ2)
-N: 85-97 (EC2 AZ2 -> RDS AZ1)
-O: 105-101 (EC2 AZ1 -> RDS AZ1)
-P: 107-110 (EC2 AZ2 -> RDS AZ2)
-"""
-# TODO: Set up all of the connections and components
-s3_component : architecture.ArchitectureComponent = architecture.ArchitectureComponent(
-    neopixel_client = neopixel_client,
-    component_connections=[types.ConnectionComponent("s3_bucket_compliant", [64, 65, 66, 67])],
-    ingoing_connections=[],
-    outgoing_connections=[],
-)
-
-cloudtrail_component : architecture.ArchitectureComponent = architecture.ArchitectureComponent(
-    neopixel_client = neopixel_client,
-    component_connections=[types.ConnectionComponent("cloud_trail_compliant", [60, 61, 62, 63])],
-    ingoing_connections=[],
-    outgoing_connections=[],
-)
-
-igw_component : architecture.ArchitectureComponent = architecture.ArchitectureComponent(
-    neopixel_client = neopixel_client,
-    component_connections=[types.ConnectionComponent("igw_compliant", [56, 57, 58, 59])],
-    ingoing_connections=[],
-    outgoing_connections=[types.ConnectionComponent("general_connection", [55, 54])],
-)
-
-alb_component : architecture.ArchitectureComponent = architecture.ArchitectureComponent(
-    neopixel_client = neopixel_client,
-    component_connections=[types.ConnectionComponent("alb_compliant", [50, 51, 52, 53, 68])],
-    ingoing_connections=[types.ConnectionComponent("alb_sec_group_compliant", [55, 54])], # Added 55
-    outgoing_connections=[types.ConnectionComponent("general_connection", [49, 48, 47, 46, 45, 44, 43, 42, 41, 40]), # (ALB -> EC2 AZ1)
-                          types.ConnectionComponent("general_connection", [69, 70, 71, 72, 73, 74, 75, 76, 77, 78 ])] # (ALB -> EC2 AZ2)
-)
-
-ec2_az1_component : architecture.ArchitectureComponent = architecture.ArchitectureComponent(
-    neopixel_client = neopixel_client,
-    component_connections=[types.ConnectionComponent("ec2_instance_2a_compliant", [36, 37, 38, 39, 105])],
-    ingoing_connections=[types.ConnectionComponent("ec2_instance_2a_sec_group", [41, 40])],
-    outgoing_connections=[types.ConnectionComponent("general_connection", [104, 103, 102, 101]), # (EC2 AZ1 -> RDS AZ1)
-                          types.ConnectionComponent("general_connection", [35, 34, 33, 32, 31, 30, 29, 28, 27,26, 25, 24, 23, 22, 21])] # (EC2 AZ1 -> RDS AZ2)
-)
-
-ec2_az2_component : architecture.ArchitectureComponent = architecture.ArchitectureComponent(
-    neopixel_client = neopixel_client,
-    component_connections=[types.ConnectionComponent("ec2_instance_2b_compliant", [79, 80, 81, 82, 83, 106])],
-    ingoing_connections=[types.ConnectionComponent("ec2_instance_2b_sec_group", [77, 78])],
-    outgoing_connections=[types.ConnectionComponent("general_connection", [107, 108, 109, 110]), # (EC2 AZ2 -> RDS AZ2)
-                          types.ConnectionComponent("general_connection", [85, 86, 87, 88, 89, 90, 91, 92, 93, 94, 95, 96, 97])] # (EC2 AZ2 -> RDS AZ1)
-)
-
-rds_az1_component : architecture.ArchitectureComponent = architecture.ArchitectureComponent(
-    neopixel_client = neopixel_client,
-    component_connections=[types.ConnectionComponent("rds_db_compliant", [1, 2, 3, 100, 99, 98])],
-    ingoing_connections=[types.ConnectionComponent("rds_sec_group_compliant", [102, 101]),
-                         types.ConnectionComponent("rds_sec_group_compliant", [96, 97])],       
-    outgoing_connections=[types.ConnectionComponent("rds_replication_compliant", [4, 5, 6, 7, 8, 9, 10])]
-)
-
-rds_az2_component : architecture.ArchitectureComponent = architecture.ArchitectureComponent(
-    neopixel_client = neopixel_client,
-    component_connections=[types.ConnectionComponent("rds_db_compliant", [16, 17, 18, 19, 20, 112, 111])],
-    ingoing_connections=[types.ConnectionComponent("rds_sec_group_compliant", [109, 110]),
-                         types.ConnectionComponent("rds_sec_group_compliant", [22, 21])],
-    outgoing_connections=[types.ConnectionComponent("rds_replication_compliant", [15, 14, 13, 12, 11, 10])]
-)
-
-# TODO: Fix this with global per Connection Component State or something. Per connection we can
-# specify the behaviour we want
-# Dirty hack to overwrite all of the connections when replication is off.
-rds_no_replication_component: architecture.ArchitectureComponent = architecture.ArchitectureComponent(
-    neopixel_client = neopixel_client,
-    component_connections=[],
-    ingoing_connections=[types.ConnectionComponent("rds_sec_group_compliant", [109, 110]),
-                         types.ConnectionComponent("rds_sec_group_compliant", [22, 21]),
-                         types.ConnectionComponent("rds_replication_compliant", [16, 17, 18, 19, 20, 112, 111])],
-    outgoing_connections=[types.ConnectionComponent("rds_replication_compliant", [107, 108, 109, 110]),
-                          types.ConnectionComponent("rds_replication_compliant", [35, 34, 33, 32, 31, 30, 29, 28, 27,26, 25, 24, 23, 22, 21])]
-)
-
-#
-architecture_components: List[architecture.ArchitectureComponent] = [
-    s3_component,
-    cloudtrail_component,
-    igw_component,
-    alb_component,
-    ec2_az1_component,
-    ec2_az2_component,
-    rds_az1_component,
-    rds_az2_component,
-    rds_no_replication_component,
-]
-
-
-signal.signal(signal.SIGINT, create_signal_handler(mqtt_client, neopixel_client))
-signal.signal(signal.SIGTERM, create_signal_handler(mqtt_client, neopixel_client))
-
-current_time = time.time()
-while True:
-    for architecture_component in architecture_components:
-        architecture_component.update(global_compliance_state)
-    neopixel_client.show_changes()
-
-    if keyboard.is_pressed("ctrl") and keyboard.is_pressed("q"):
-        print("Stopping script execution")
-        os.kill(os.getpid(), signal.SIGTERM)
+logger = logging.getLogger(__name__)
+
+
+def create_compliance_state() -> types.ComplianceState:
+    return types.ComplianceState(
+        igw_compliant = types.ServiceState(), # Not yet part of experiment
+        alb_sec_group_compliant = types.ServiceState(),
+        alb_compliant = types.ServiceState(), # Not yet part of experiment
+        cloud_trail_compliant = types.ServiceState(),
+        asg_sec_group_compliant = types.ServiceState(),
+        ec2_instance_2a_compliant = types.ServiceState(),
+        ec2_instance_2a_sec_group = types.ServiceState(), # Not yet part of experiment
+        ec2_instance_2b_compliant = types.ServiceState(),
+        ec2_instance_2b_sec_group = types.ServiceState(), # Not yet part of experiment
+        rds_db_compliant = types.ServiceState(),
+        rds_sec_group_compliant = types.ServiceState(),
+        rds_replication_compliant = types.ServiceState(), # Not yet part of experiment
+        s3_bucket_compliant = types.ServiceState(),
+        general_connection = types.ServiceState() # General connection that will not be updated by experiment
+    )
+
+
+def create_input_kinds(bindings: Dict[str, str]) -> Dict[str, types.InputEventKind]:
+    return {key: types.InputEventKind(kind) for key, kind in bindings.items()}
+
+
+def create_board_configs(boards: List[Dict[str, object]]) -> List[types.BoardConfig]:
+    return [types.BoardConfig(
+        name=board["name"],
+        topology_filepath=board["topology"],
+        backend=board["backend"],
+        port=board["port"],
+        nb_pixels=board["nb_pixels"]) for board in boards]
+
+
+def create_render_settings() -> Dict[str, object]:
+    """ Settings that decide how a frame looks, saved with every recorded session so the replay renders it alike """
+    return {
+        "pulse_period": constants.NEOPIXEL_PULSE_PERIOD,
+        "chase_speed": constants.NEOPIXEL_CHASE_SPEED,
+        "gamma": constants.NEOPIXEL_GAMMA,
+        "brightness": constants.NEOPIXEL_BRIGHTNESS,
+        "power_budget_ma": constants.NEOPIXEL_POWER_BUDGET_MA,
+        "channel_current_ma": constants.NEOPIXEL_CHANNEL_CURRENT_MA,
+        "idle_current_ma": constants.NEOPIXEL_IDLE_CURRENT_MA}
+
+
+def create_neopixel_client(backend: backends.StripBackend, render_settings: Dict[str, object]) -> neopixel_interface.NeopixelInterface:
+    return neopixel_interface.NeopixelInterface(
+        backend=backend,
+        pulse_period=render_settings["pulse_period"],
+        chase_speed=render_settings["chase_speed"],
+        table_capacity=constants.NEOPIXEL_TABLE_CAPACITY,
+        table_max_bytes=constants.NEOPIXEL_TABLE_MAX_BYTES,
+        output_stage=output.OutputStage(
+            gamma=render_settings["gamma"],
+            brightness=render_settings["brightness"],
+            power_budget_ma=render_settings["power_budget_ma"],
+            channel_current_ma=render_settings["channel_current_ma"],
+            idle_current_ma=render_settings["idle_current_ma"]))
+
+
+def create_board(config: types.BoardConfig) -> board_interface.Board:
+    """ Create the stripe, render plans and compliance of one board """
+    render_settings = create_render_settings()
+    neopixel_client = create_neopixel_client(backends.create_strip_backend(config.backend, config.port, config.nb_pixels), render_settings)
+
+    # The board layout is described in the topology file, see src/architecture/topologies
+    render_plan = topology.load_render_plan(
+        config.topology_filepath,
+        config.nb_pixels,
+        constants.TOPOLOGY_CACHE_PATH)
+    for overlap in render_plan.overlaps:
+        logger.info(overlap)
+
+    # The last known compliance is shown from the first frame on, until the broker sends the current one
+    state_persistence = None
+    persisted = None
+    if constants.STATE_PERSISTENCE_PATH:
+        state_persistence = persistence.StatePersistence(
+            os.path.join(constants.STATE_PERSISTENCE_PATH, f"{config.name}.state"),
+            sync_interval=constants.STATE_SYNC_INTERVAL,
+            max_records=constants.STATE_MAX_RECORDS)
+        persisted = state_persistence.load()
+        if persisted:
+            logger.info(f"Restored the compliance of {config.name} saved {time.time() - persisted.saved_at:.0f}s ago")
+
+    # MQTT thread publishes new snapshots of the compliance here, the render thread reads one per frame
+    compliance_store = store.ComplianceStore(create_compliance_state(), persisted.compliant_mask if persisted else None)
+    if state_persistence:
+        compliance_store.listeners.append(state_persistence.record)
+        state_persistence.start()
+    # Bursts of updates of the same state are merged before they reach the store
+    state_coalescer = coalescer.StateCoalescer(compliance_store, constants.MQTT_STATE_SETTLE_WINDOW)
+    return board_interface.Board(
+        config.name,
+        neopixel_client,
+        scheduler.RenderScheduler(constants.RENDER_TARGET_FPS),
+        state_coalescer,
+        board_plan=render_plan,
+        connecting_plan=render_plan_compiler.compile_status_plan(config.nb_pixels),
+        state_persistence=state_persistence,
+        session_recorder=recorder.SessionRecorder(
+            config.nb_pixels,
+            max_bytes=constants.SESSION_RECORDING_MAX_BYTES,
+            max_events=constants.SESSION_RECORDING_MAX_EVENTS,
+            meta={"board": config.name, "topology": config.topology_filepath, "render": render_settings}) if constants.SESSION_RECORDING_PATH else None)
+
+
+def create_clients(state_fan_out: fanout.StateFanOut, input_queue: input_interface.InputQueue):
+    """ Create the MQTT client, the publisher of the button presses and the input sources. Imports the AWS SDK,
+    which takes longer than everything up to the first frame, so the supervisor only calls it after the first frame """
+    from awsiot import mqtt5_client_builder
+
+    import src.interfaces.mqtt as mqtt_interface
+    import src.interfaces.mqtt_loopback as mqtt_loopback
+    import src.interfaces.mqtt_recording as mqtt_recording
+
+    mqtt_client_options = types.MqttClientOption(
+        endpoint=constants.MQTT_CLIENT_ENDPOINT,
+        port=constants.MQTT_CLIENT_PORT,
+        cert_filepath=constants.MQTT_CLIENT_CERT_FILEPATH,
+        pri_key_filepath=constants.MQTT_CLIENT_PRI_KEY_FILEPATH,
+        client_id=constants.MQTT_CLIENT_CLIENT_ID)
+
+    # Only created here, the supervisor connects it
+    mqtt_client = mqtt_interface.MqttClientInterface(
+        state_fan_out,
+        mqtt_client_options,
+        constants.MQTT_CLIENT_SUBSCRIPTION_TOPIC,
+        batch_topic=constants.MQTT_CLIENT_BATCH_TOPIC,
+        client_builder=mqtt_loopback.loopback_client_builder if constants.MQTT_CLIENT_LOOPBACK else mqtt5_client_builder.mtls_from_path,
+        recorder=mqtt_recording.MessageRecorder(constants.MQTT_RECORDING_FILEPATH) if constants.MQTT_RECORDING_FILEPATH else None,
+        log_messages=constants.MQTT_LOG_MESSAGES,
+        log_interval=constants.MQTT_LOG_INTERVAL)
+
+    outbound_publisher = publisher_interface.OutboundPublisher(
+        mqtt_client,
+        max_queue_size=constants.MQTT_PUBLISH_QUEUE_SIZE,
+        overflow_policy=types.OverflowPolicy(constants.MQTT_PUBLISH_OVERFLOW_POLICY),
+        max_retries=constants.MQTT_PUBLISH_MAX_RETRIES,
+        puback_timeout=constants.MQTT_PUBLISH_PUBACK_TIMEOUT)
+
+    # Every input only posts an event, the supervisor handles it in the event loop
+    input_sources = [backends.create_button(
+        constants.HARDWARE_BACKEND,
+        constants.BUTTON_PORT,
+        input_queue.callback(types.InputEventKind.BUTTON, f"gpio{constants.BUTTON_PORT}"))]
+    if constants.RESET_BUTTON_PORT is not None:
+        input_sources.append(backends.create_button(
+            constants.HARDWARE_BACKEND,
+            constants.RESET_BUTTON_PORT,
+            input_queue.callback(types.InputEventKind.RESET, f"gpio{constants.RESET_BUTTON_PORT}")))
+    key_source = input_interface.create_key_source(
+        constants.INPUT_KEY_SOURCE,
+        input_queue,
+        create_input_kinds(constants.INPUT_TERMINAL_KEYS),
+        create_input_kinds(constants.INPUT_KEYBOARD_HOTKEYS))
+    if key_source:
+        input_sources.append(key_source)
+    return mqtt_client, outbound_publisher, input_sources
+
+
+def main():
+    # Everything before this line is reported as the interpreter and import phase
+    boot_profiler = boot.BootProfiler(constants.BOOT_METRICS_FILEPATH)
+    # Callback threads only queue their records, a background thread writes and rotates the log file
+    log_pipeline = logs.LogPipeline(
+        filepath=constants.LOG_FILEPATH,
+        max_bytes=constants.LOG_MAX_BYTES,
+        backup_count=constants.LOG_BACKUP_COUNT,
+        console=constants.LOG_TO_CONSOLE,
+        level=logging.getLevelName(constants.LOG_LEVEL),
+        rate_limit_interval=constants.LOG_RATE_LIMIT_INTERVAL,
+        rate_limit_burst=constants.LOG_RATE_LIMIT_BURST,
+        rate_limited_loggers=constants.LOG_RATE_LIMITED_LOGGERS,
+        queue_size=constants.LOG_QUEUE_SIZE)
+
+    # Buttons and keys post here, repeated presses are debounced per kind of event
+    input_queue = input_interface.InputQueue(
+        input_interface.DebouncePolicy({types.InputEventKind(kind): interval for kind, interval in constants.INPUT_DEBOUNCE_INTERVALS.items()}),
+        max_size=constants.INPUT_QUEUE_SIZE)
+
+    boards = [create_board(config) for config in create_board_configs(constants.BOARDS)]
+    boot_profiler.mark("boards")
+    # One subscription for all boards, every update is handed to the state of each board
+    state_fan_out = fanout.StateFanOut([board.state_coalescer for board in boards])
+
+    app_supervisor = supervisor.Supervisor(
+        boards,
+        lambda: create_clients(state_fan_out, input_queue),
+        input_queue,
+        connect_timeout=constants.MQTT_CONNECT_TIMEOUT,
+        reconnect_min_delay=constants.MQTT_RECONNECT_MIN_DELAY,
+        reconnect_max_delay=constants.MQTT_RECONNECT_MAX_DELAY,
+        game_engine=game_engine.GameEngine(
+            constants.GAME_DIFFICULTIES,
+            difficulty=constants.GAME_DIFFICULTY,
+            timeout=constants.GAME_SESSION_TIMEOUT),
+        leaderboard=leaderboard.Leaderboard(constants.GAME_LEADERBOARD_FILEPATH) if constants.GAME_LEADERBOARD_FILEPATH else None,
+        resync_message=(constants.MQTT_CLIENT_RESYNC_TOPIC, constants.MQTT_CLIENT_RESYNC_MESSAGE) if constants.MQTT_CLIENT_RESYNC_TOPIC else None,
+        boot_profiler=boot_profiler,
+        metrics_server=metrics_interface.MetricsServer(constants.METRICS_HOST, constants.METRICS_PORT) if constants.METRICS_PORT is not None else None,
+        session_directory=constants.SESSION_RECORDING_PATH,
+        session_keep=constants.SESSION_RECORDING_KEEP)
+    try:
+        asyncio.run(app_supervisor.run())
+    finally:
+        if log_pipeline.dropped:
+            logger.warning(f"Dropped {log_pipeline.dropped} log records because the writer fell behind")
+        log_pipeline.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from src.render.effects import STATIC_EFFECTS, EffectEvaluator
+from src.render.plan import RenderPlan
+from src.state.store import STATE_SLOTS
+import src.utils.types as types
+
+
+class FrameCompositor():
+    def __init__(self, frame: np.ndarray, evaluator: EffectEvaluator):
+        """
+        frame (np.ndarray): (nb_pixels, 3) uint8 array the composited frame is written to
+        evaluator (EffectEvaluator): Provides the precomputed frames of the effects and the phase to show
+        """
+        self.frame = frame
+        self.nb_pixels = frame.shape[0]
+        self.evaluator = evaluator
+        # Compliance per state slot, see store.STATE_SLOTS
+        self.states = np.ones(len(STATE_SLOTS), dtype=bool)
+        self.plan = None
+        # Generation of the compliance snapshot the visible entries were resolved for, None forces a rebuild
+        self.generation = None
+
+    def load_plan(self, plan: RenderPlan):
+        if plan.nb_pixels != self.nb_pixels:
+            raise ValueError(f"Render plan for {plan.nb_pixels} pixels does not fit the stripe with {self.nb_pixels} pixels")
+        self.plan = plan
+        self.static_effects = np.array([effect.kind in STATIC_EFFECTS for effect in plan.effects], dtype=bool)
+        self.generation = None
+
+    def set_states(self, snapshot: types.ComplianceSnapshot):
+        """ Take over the compliance snapshot. Visible entries are only resolved again if it changed """
+        if snapshot.generation == self.generation:
+            return
+        mask = snapshot.compliant_mask
+        self.states[:] = [mask >> slot & 1 for slot in range(len(STATE_SLOTS))]
+        self.generation = snapshot.generation
+        if self.plan is not None:
+            self._resolve()
+
+    def _resolve(self):
+        """ Find the visible layers per pixel, draw every pixel that does not move and lay out the ones that do """
+        plan = self.plan
+        nb_entries = len(plan.entry_pixel)
+        compliant = self.states[plan.entry_slot].astype(np.intp)
+        effect = plan.entry_effect[np.arange(nb_entries), compliant]
+        active = effect >= 0
+
+        # Everything below the highest active replacing entry of a pixel is covered, blending entries above it stay
+        replacing = np.flatnonzero(active & (plan.entry_blend == types.BlendMode.REPLACE.value))
+        base = np.full(self.nb_pixels, -1, dtype=np.intp)
+        np.maximum.at(base, plan.entry_pixel[replacing], replacing)
+        visible = np.flatnonzero(active & (np.arange(nb_entries) >= base[plan.entry_pixel]))
+
+        # Layer of every visible entry within its pixel, 0 for the lowest
+        by_pixel = visible[np.argsort(plan.entry_pixel[visible], kind="stable")]
+        pixels = plan.entry_pixel[by_pixel]
+        first = np.flatnonzero(np.r_[True, pixels[1:] != pixels[:-1]])
+        depth = np.arange(len(by_pixel)) - np.repeat(first, np.diff(np.r_[first, len(by_pixel)]))
+
+        # A pixel is moving if any of its visible layers is, moving pixels are composited every frame
+        moving = np.zeros(self.nb_pixels, dtype=bool)
+        moving[pixels[~self.static_effects[effect[by_pixel]]]] = True
+        is_moving = moving[pixels]
+
+        self.frame[plan.entry_pixel] = 0
+        groups, passes, colors = self._layout(by_pixel[~is_moving], depth[~is_moving], effect)
+        self._draw(groups, passes, colors, 0.0)
+
+        groups, self._passes, self._colors = self._layout(by_pixel[is_moving], depth[is_moving], effect)
+        # Static layers below or above moving ones only need to be evaluated once per snapshot
+        self._groups = [group for group in groups if group[0].kind not in STATIC_EFFECTS]
+        self._draw([group for group in groups if group[0].kind in STATIC_EFFECTS],
+                   None if self._passes is None else [], self._colors, 0.0)
+
+    def _layout(self, entries: np.ndarray, depth: np.ndarray, effect: np.ndarray) -> Tuple[list, Optional[list], np.ndarray]:
+        """ Sort the entries by effect, so every effect is looked up once from its precomputed frames into a
+        contiguous span of the color buffer, and split them into passes that each write every pixel at most once. Without blending every
+        pixel has one entry and passes is None, the effects are then written straight into the frame """
+        plan = self.plan
+        order = np.argsort(effect[entries], kind="stable")
+        entries, depth = entries[order], depth[order]
+        entry_effect = effect[entries]
+
+        groups: List[Tuple[types.EffectSpec, slice, np.ndarray, np.ndarray]] = []
+        starts = np.flatnonzero(np.r_[True, entry_effect[1:] != entry_effect[:-1]]) if len(entries) else []
+        for start, end in zip(starts, list(starts[1:]) + [len(entries)]):
+            span = slice(int(start), int(end))
+            effect_spec = plan.effects[entry_effect[start]]
+            frames = self.evaluator.frames(effect_spec, plan.entry_position[entries[span]], plan.entry_fraction[entries[span]])
+            groups.append((effect_spec, span, frames, plan.entry_pixel[entries[span]]))
+        if not depth.any():
+            return groups, None, np.zeros((0, 3), dtype=np.uint8)
+
+        passes: List[Tuple[int, np.ndarray, np.ndarray]] = []
+        blend = plan.entry_blend[entries]
+        for layer in range(int(depth.max()) + 1 if len(depth) else 0):
+            in_layer = depth == layer
+            # The lowest layer is drawn onto black, so blending it is the same as replacing
+            modes = [types.BlendMode.REPLACE.value] if layer == 0 else np.unique(blend[in_layer])
+            for mode in modes:
+                indices = np.flatnonzero(in_layer if layer == 0 else in_layer & (blend == mode))
+                passes.append((int(mode), plan.entry_pixel[entries[indices]], indices))
+        return groups, passes, np.zeros((len(entries), 3), dtype=np.uint8)
+
+    def _draw(self, groups: list, passes: Optional[list], colors: np.ndarray, frame_time: float):
+        for effect, span, frames, pixels in groups:
+            if passes is None:
+                self.frame[pixels] = frames[self.evaluator.phase(effect, frame_time)]
+            else:
+                colors[span] = frames[self.evaluator.phase(effect, frame_time)]
+        for mode, pixels, indices in passes or []:
+            if mode == types.BlendMode.REPLACE.value:
+                self.frame[pixels] = colors[indices]
+            elif mode == types.BlendMode.ADD.value:
+                self.frame[pixels] = np.minimum(self.frame[pixels].astype(np.uint16) + colors[indices], 255)
+            else:
+                self.frame[pixels] = np.maximum(self.frame[pixels], colors[indices])
+
+    def compose(self, frame_time: float):
+        """ Draw the moving parts of the frame for the current time in seconds """
+        if self.plan is None or self.generation is None:
+            return
+        if self._groups:
+            self._draw(self._groups, self._passes, self._colors, frame_time)
@@ -0,0 +1,83 @@
+import math
+from typing import Optional
+
+import numpy as np
+
+from src.render.tables import AnimationTables
+import src.utils.types as types
+
+# Effects that only change with the compliance state, they are drawn once per snapshot instead of every frame
+STATIC_EFFECTS = frozenset((types.EffectKind.NONE, types.EffectKind.OFF, types.EffectKind.SOLID, types.EffectKind.GRADIENT))
+# Steps one pulse period is sampled with, far more than frames are rendered per period
+PULSE_TABLE_PHASES = 1024
+
+
+class EffectEvaluator():
+    def __init__(self, chase_wheel: np.ndarray, chase_speed: float = 20, pulse_period: float = 2.0,
+                 min_pulse_value: int = 50, max_pulse_value: int = 255, tables: Optional[AnimationTables] = None):
+        """
+        chase_wheel (np.ndarray): Intensity factors between 0 and 1 the chase effect cycles through
+        chase_speed (float): Default number of intensity wheel steps the chase moves per second
+        pulse_period (float): Default duration of one pulse or blink in seconds
+        min_pulse_value (int): Lowest intensity of a pulse, between 0 and 255
+        max_pulse_value (int): Highest intensity of a pulse, between 0 and 255
+        tables (AnimationTables): Cache of the precomputed color tables, a default sized one if None
+        """
+        self.chase_wheel = np.asarray(chase_wheel, dtype=np.float64)
+        self.len_chase_wheel = len(self.chase_wheel)
+        self.chase_speed = chase_speed
+        self.pulse_period = pulse_period
+        self.tables = tables or AnimationTables()
+        amplitude = (max_pulse_value - min_pulse_value) / 2
+        offset = (max_pulse_value + min_pulse_value) / 2
+        # Intensity of the pulse over one period
+        self.pulse_curve = np.array([int(amplitude * math.sin(2 * math.pi * phase / PULSE_TABLE_PHASES) + offset)
+                                     for phase in range(PULSE_TABLE_PHASES)], dtype=np.float64)
+
+    def pulse_intensity(self, period: float, frame_time: float) -> int:
+        """ Pulse intensity between min_pulse_value and max_pulse_value at the given time """
+        return int(self.pulse_curve[int(frame_time / period * PULSE_TABLE_PHASES) % PULSE_TABLE_PHASES])
+
+    def phase(self, effect: types.EffectSpec, frame_time: float) -> int:
+        """ Row of the frames of the effect to show at the given time in seconds """
+        kind = effect.kind
+        if kind == types.EffectKind.CHASE:
+            return int(frame_time * (self.chase_speed if effect.speed is None else effect.speed)) % self.len_chase_wheel
+        if kind == types.EffectKind.PULSE:
+            return int(frame_time / (self.pulse_period if effect.period is None else effect.period) * PULSE_TABLE_PHASES) % PULSE_TABLE_PHASES
+        if kind == types.EffectKind.BLINK:
+            period = self.pulse_period if effect.period is None else effect.period
+            return 0 if frame_time % period < effect.duty * period else 1
+        return 0
+
+    def frames(self, effect: types.EffectSpec, positions: np.ndarray, fractions: np.ndarray) -> np.ndarray:
+        """ Ready to copy uint8 colors of the effect per phase, see phase(). Effects that color all pixels the
+        same have one (3,) row per phase, the others one (n, 3) frame per phase
+
+        positions (np.ndarray): Position of every pixel in its connection
+        fractions (np.ndarray): Position of every pixel in its connection between 0 (first) and 1 (last pixel)
+        """
+        if effect.kind == types.EffectKind.CHASE:
+            palette = self.tables.get((effect,), lambda: self._palette(effect))
+            # The wheel index of a pixel is (step - position) % wheel length, so every step is one frame of the span
+            return self.tables.get((effect, positions.tobytes()), lambda: palette[
+                (np.arange(self.len_chase_wheel)[:, None] - positions[None, :].astype(np.intp)) % self.len_chase_wheel])
+        if effect.kind == types.EffectKind.GRADIENT:
+            return self.tables.get((effect, fractions.tobytes()), lambda: self._gradient(effect, fractions))
+        return self.tables.get((effect,), lambda: self._palette(effect))
+
+    def _palette(self, effect: types.EffectSpec) -> np.ndarray:
+        color = np.array(effect.color, dtype=np.float64)
+        kind = effect.kind
+        if kind == types.EffectKind.CHASE:
+            return (color * self.chase_wheel[:, None]).astype(np.uint8)
+        if kind == types.EffectKind.PULSE:
+            return (color * self.pulse_curve[:, None] / 255).astype(np.uint8)
+        if kind == types.EffectKind.BLINK:
+            return np.array([effect.color, (0, 0, 0)], dtype=np.uint8)
+        return np.array([effect.color if kind == types.EffectKind.SOLID else (0, 0, 0)], dtype=np.uint8)
+
+    def _gradient(self, effect: types.EffectSpec, fractions: np.ndarray) -> np.ndarray:
+        color = np.array(effect.color, dtype=np.float64)
+        end_color = np.array(effect.end_color or effect.color, dtype=np.float64)
+        return (color + (end_color - color) * fractions[:, None]).astype(np.uint8)[None]
@@ -0,0 +1,53 @@
+import time
+from typing import Optional
+
+import numpy as np
+
+from src.interfaces.backends import StripBackend
+from src.render.output import OutputStage
+from src.utils.metrics import SHOW_TIME_BUCKETS, Histogram
+import src.utils.types as types
+
+
+class FrameBuffer():
+    def __init__(self, backend: StripBackend, output_stage: Optional[OutputStage] = None):
+        """
+        backend (StripBackend): LED stripe the buffer is flushed to
+        output_stage (OutputStage): Gamma, brightness and power budget applied before the frame is shown, None to show it as composed
+        """
+        self.backend = backend
+        self.nb_pixels = backend.nb_pixels
+        # Frame that is currently composed and the frame the stripe is showing right now.
+        # The stripe starts with all pixels off.
+        self.pixels = np.zeros((self.nb_pixels, 3), dtype=np.uint8)
+        self.shown = np.zeros((self.nb_pixels, 3), dtype=np.uint8)
+        # Frame as it is sent to the stripe, after the output stage
+        self.output_stage = output_stage
+        self.output = np.zeros((self.nb_pixels, 3), dtype=np.uint8) if output_stage else self.pixels
+        self.stats = types.FrameBufferStats()
+        # Duration of backend.show(), for the Neopixels the time the frame takes on the wire
+        self.show_times = Histogram(SHOW_TIME_BUCKETS)
+        # The stripe may still show the content of a previous run, so always push the first frame
+        self._force_show = True
+
+    def flush(self) -> bool:
+        """ Write the frame to the backend and show it. Returns False if show() was skipped """
+        if self.output_stage:
+            self.output_stage.apply(self.pixels, self.output)
+        changed = np.flatnonzero((self.output != self.shown).any(axis=1))
+        stats = self.stats
+        stats.pixel_writes += len(changed)
+        stats.pixel_writes_skipped += self.nb_pixels - len(changed)
+
+        if not changed.size and not self._force_show:
+            stats.shows_skipped += 1
+            return False
+
+        self.backend.write(self.output, changed)
+        self.shown[:] = self.output
+        show_start = time.perf_counter()
+        self.backend.show()
+        self.show_times.observe(time.perf_counter() - show_start)
+        stats.shows += 1
+        self._force_show = False
+        return True
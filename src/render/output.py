@@ -0,0 +1,59 @@
+from typing import Optional
+
+import numpy as np
+
+import src.utils.types as types
+
+
+class OutputStage():
+    def __init__(self, gamma: float = 1.0, brightness: float = 1.0, power_budget_ma: Optional[float] = None,
+                 channel_current_ma: float = 20.0, idle_current_ma: float = 1.0, voltage: float = 5.0):
+        """
+        gamma (float): Gamma the channel values are corrected with, 1 leaves them unchanged
+        brightness (float): Global brightness between 0 and 1
+        power_budget_ma (float): Current the stripe may draw in milliamps, frames above it are dimmed. None for no limit
+        channel_current_ma (float): Current of one channel at full intensity in milliamps
+        idle_current_ma (float): Current of one pixel with all channels off in milliamps
+        voltage (float): Supply voltage of the stripe, only used to report the power
+        """
+        if not 0 <= brightness <= 1:
+            raise ValueError(f"Brightness has to be between 0 and 1, got {brightness}")
+        self.power_budget_ma = power_budget_ma
+        self.channel_current_ma = channel_current_ma
+        self.idle_current_ma = idle_current_ma
+        self.voltage = voltage
+        # Gamma and brightness are one lookup per channel value
+        values = np.arange(256, dtype=np.float64) / 255
+        self.lut = np.round(255 * values ** gamma * brightness).astype(np.uint8)
+        self.identity = bool((self.lut == np.arange(256)).all())
+        self.stats = types.OutputStats()
+
+    def estimate_current(self, frame: np.ndarray) -> float:
+        """ Current the stripe draws for the frame in milliamps """
+        return (len(frame) * self.idle_current_ma
+                + int(frame.sum(dtype=np.uint32)) * self.channel_current_ma / 255)
+
+    def apply(self, frame: np.ndarray, output: np.ndarray):
+        """ Write the frame as it is sent to the stripe into output: gamma corrected, dimmed to the
+        brightness and scaled down as a whole if it would draw more than the power budget """
+        if self.identity:
+            np.copyto(output, frame)
+        else:
+            np.take(self.lut, frame, out=output)
+
+        current = self.estimate_current(output)
+        stats = self.stats
+        stats.frames += 1
+        stats.last_scale = 1.0
+        if self.power_budget_ma is not None and current > self.power_budget_ma:
+            idle_current = len(output) * self.idle_current_ma
+            # Only the lit channels can be dimmed, the idle current stays
+            scale = max(self.power_budget_ma - idle_current, 0.0) / (current - idle_current)
+            np.multiply(output, scale, out=output, casting="unsafe")
+            current = self.estimate_current(output)
+            stats.frames_limited += 1
+            stats.last_scale = scale
+
+        stats.last_current_ma = current
+        stats.max_current_ma = max(stats.max_current_ma, current)
+        stats.last_power_w = current * self.voltage / 1000
@@ -0,0 +1,135 @@
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from src.architecture.component import ArchitectureComponent
+from src.state.store import STATE_SLOT_INDEX
+import src.utils.types as types
+
+# Effects of a connection that does not set its own, per direction as (compliant, non-compliant) effect
+DEFAULT_EFFECTS = {
+    # White chase for compliant, off for non-compliant
+    "outgoing": (types.EffectSpec(types.EffectKind.CHASE, (255, 255, 255)), types.EffectSpec(types.EffectKind.OFF)),
+    # Untouched for compliant, pulsing red for non-compliant
+    "ingoing": (types.EffectSpec(types.EffectKind.NONE), types.EffectSpec(types.EffectKind.PULSE, (0, 255, 0))),
+    # Green for compliant, pulsing red for non-compliant
+    "component": (types.EffectSpec(types.EffectKind.SOLID, (255, 0, 0)), types.EffectSpec(types.EffectKind.PULSE, (0, 255, 0))),
+}
+
+# Shown over the whole stripe while the board has no connection to the broker
+CONNECTING_EFFECT = types.EffectSpec(types.EffectKind.CHASE, (0, 0, 255))
+
+
+class PixelOverlap():
+    """ Pixel that is drawn by more than one connection """
+    __slots__ = ("pixel", "writers", "compliant_visible", "non_compliant_visible")
+
+    def __init__(self, pixel: int, writers: List[str], compliant_visible: List[bool], non_compliant_visible: List[bool]):
+        self.pixel = pixel
+        # Connections drawing the pixel, from the lowest to the highest layer
+        self.writers = writers
+        # Whether the connection draws anything while its state is compliant or non-compliant
+        self.compliant_visible = compliant_visible
+        self.non_compliant_visible = non_compliant_visible
+
+    @property
+    def winner(self) -> str:
+        """ Connection that is visible while all states are compliant """
+        for writer, visible in zip(reversed(self.writers), reversed(self.compliant_visible)):
+            if visible:
+                return writer
+        return "nothing"
+
+    def __repr__(self) -> str:
+        description = f"Pixel {self.pixel} is drawn by {', '.join(self.writers)}. {self.winner} wins while compliant"
+        if self.writers[-1] != self.winner and self.non_compliant_visible[-1]:
+            description += f", {self.writers[-1]} wins while its state is non-compliant"
+        return description
+
+
+class RenderPlan():
+    """ Flat, integer indexed description of everything drawn per frame
+
+    Every drawn pixel is one entry. Entries are sorted by layer and draw order, so an entry is drawn over
+    all entries before it. Effects are interned, entries refer to them by their index in effects.
+    """
+    __slots__ = ("nb_pixels", "entry_pixel", "entry_slot", "entry_position", "entry_fraction", "entry_effect",
+                 "entry_blend", "effects", "overlaps")
+
+    def __init__(self, nb_pixels: int, records: List[tuple], effects: List[types.EffectSpec], overlaps: List[PixelOverlap]):
+        """
+        nb_pixels (int): Number of pixels of the LED stripe
+        records (List): (layer, slot, pixel, position, fraction, non-compliant effect, compliant effect, blend) per
+            drawn pixel, in draw order. Effects are indices into effects, -1 for transparent
+        effects (List[EffectSpec]): Distinct effects of the plan
+        overlaps (List[PixelOverlap]): Pixels drawn by more than one connection
+        """
+        self.nb_pixels = nb_pixels
+        self.effects = effects
+        self.overlaps = overlaps
+        order = sorted(range(len(records)), key=lambda index: (records[index][0], index))
+        self.entry_slot = np.array([records[index][1] for index in order], dtype=np.intp)
+        self.entry_pixel = np.array([records[index][2] for index in order], dtype=np.intp)
+        self.entry_position = np.array([records[index][3] for index in order], dtype=np.float64)
+        self.entry_fraction = np.array([records[index][4] for index in order], dtype=np.float64)
+        # Column 0 is the effect while non-compliant, column 1 while compliant
+        self.entry_effect = np.array([records[index][5:7] for index in order], dtype=np.intp).reshape(-1, 2)
+        self.entry_blend = np.array([records[index][7] for index in order], dtype=np.intp)
+
+
+def compile_render_plan(architecture_components: list, nb_pixels: int) -> RenderPlan:
+    """ Compile the components into a render plan. Connections are drawn by layer, within a layer components
+    and their connections are drawn in order, outgoing connections first, then ingoing connections and the
+    component itself last """
+    records = []
+    effects: List[types.EffectSpec] = []
+    effect_index: Dict[types.EffectSpec, int] = {}
+    writers: Dict[int, List[Tuple[int, int, str, bool, bool]]] = {}
+
+    def intern(effect: types.EffectSpec) -> int:
+        if effect.kind == types.EffectKind.NONE:
+            return -1
+        if effect not in effect_index:
+            effect_index[effect] = len(effects)
+            effects.append(effect)
+        return effect_index[effect]
+
+    def add(component_name: str, direction: str, connection: types.ConnectionComponent):
+        slot = STATE_SLOT_INDEX.get(connection.state_id)
+        if slot is None:
+            raise ValueError(f"Unknown state id '{connection.state_id}'")
+        compliant_effect, non_compliant_effect = DEFAULT_EFFECTS[direction]
+        compliant = intern(connection.compliant_effect or compliant_effect)
+        non_compliant = intern(connection.non_compliant_effect or non_compliant_effect)
+        writer = f"{component_name} {direction} {connection.state_id}"
+        last_position = max(len(connection.pixels) - 1, 1)
+        for position, pixel in enumerate(connection.pixels):
+            if not 0 <= pixel < nb_pixels:
+                raise ValueError(f"Pixel {pixel} of {component_name} is outside of the stripe with {nb_pixels} pixels")
+            writers.setdefault(pixel, []).append((connection.layer, len(records), writer, compliant >= 0, non_compliant >= 0))
+            records.append((connection.layer, slot, pixel, position, position / last_position,
+                            non_compliant, compliant, connection.blend.value))
+
+    for index, component in enumerate(architecture_components):
+        name = component.name or f"component {index}"
+        for connection in component.outgoing_connections or []:
+            add(name, "outgoing", connection)
+        for connection in component.ingoing_connections or []:
+            add(name, "ingoing", connection)
+        for connection in component.component_connections or []:
+            add(name, "component", connection)
+
+    overlaps = []
+    for pixel, pixel_writers in sorted(writers.items()):
+        if len(pixel_writers) > 1:
+            # Sorted by layer and draw order, the first two columns only order the writers
+            columns = [list(column) for column in zip(*sorted(pixel_writers))]
+            overlaps.append(PixelOverlap(pixel, *columns[2:]))
+    return RenderPlan(nb_pixels, records, effects, overlaps)
+
+
+def compile_status_plan(nb_pixels: int, effect: types.EffectSpec = CONNECTING_EFFECT) -> RenderPlan:
+    """ Render plan that shows one effect over the whole stripe, independent of the compliance """
+    connection = types.ConnectionComponent("general_connection", list(range(nb_pixels)), effect, effect)
+    return compile_render_plan([ArchitectureComponent(
+        component_connections=[], ingoing_connections=[], outgoing_connections=[connection], name="status")], nb_pixels)
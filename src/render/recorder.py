@@ -0,0 +1,126 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+import src.utils.types as types
+
+# Inputs of one frame, enough to render it again: the elapsed time the animations were drawn at,
+# the compliance and whether the connected or the connecting plan was loaded
+FRAME_RECORD = np.dtype([
+    ("frame_time", "<f8"),
+    ("generation", "<u8"),
+    ("compliant_mask", "<u8"),
+    ("connected", "?"),
+    ("shown", "?")])
+
+
+class SessionRecorder():
+    def __init__(self,
+                 nb_pixels: int,
+                 max_bytes: int = 4 * 1024 * 1024,
+                 max_events: int = 1024,
+                 meta: Optional[Dict[str, object]] = None,
+                 clock: Callable[[], float] = time.time):
+        """ Keeps the last minutes of a board in preallocated ring buffers: the inputs of every frame, the shown
+        frames and the events that caused them. A frame only writes one record and copies the shown frame,
+        the frames are compressed when the session is saved
+
+        nb_pixels (int): Number of pixels of a frame
+        max_bytes (int): Memory of both ring buffers, a quarter holds the inputs and the rest the shown frames
+        max_events (int): Number of events kept, older ones are dropped
+        meta (Dict[str, object]): Saved with the session, e.g. the topology needed to render it again
+        clock (Callable): Wall clock returning seconds, stored with the session
+        """
+        self.nb_pixels = nb_pixels
+        self.meta = meta or {}
+        self.clock = clock
+        self.records = np.zeros(max(1, max_bytes // 4 // FRAME_RECORD.itemsize), dtype=FRAME_RECORD)
+        self.frames = np.zeros((max(1, max_bytes * 3 // 4 // (nb_pixels * 3)), nb_pixels, 3), dtype=np.uint8)
+        # Index of the record that showed each frame in the frame ring buffer
+        self.frame_records = np.full(len(self.frames), -1, dtype=np.int64)
+        self.events: Deque[types.SessionEvent] = deque(maxlen=max_events)
+        self.nb_records = 0
+        self.nb_frames = 0
+        self.started_at: Optional[float] = None
+        self._save_lock = threading.Lock()
+
+    @property
+    def nb_bytes(self) -> int:
+        return self.records.nbytes + self.frames.nbytes + self.frame_records.nbytes
+
+    def record_frame(self, frame_time: float, snapshot: types.ComplianceSnapshot, connected: bool, shown: Optional[np.ndarray]):
+        """ Record the inputs of a rendered frame, shown is the frame sent to the stripe or None if show() was skipped.
+        Called by the render thread only """
+        index = self.nb_records
+        if not index:
+            self.started_at = self.clock() - frame_time
+        self.records[index % len(self.records)] = (frame_time, snapshot.generation, snapshot.compliant_mask, connected, shown is not None)
+        if shown is not None:
+            slot = self.nb_frames % len(self.frames)
+            self.frames[slot] = shown
+            self.frame_records[slot] = index
+            self.nb_frames += 1
+        self.nb_records = index + 1
+
+    def record_event(self, kind: str, data: Optional[Dict[str, object]] = None):
+        """ Record an event before the next frame, safe to call from any thread """
+        self.events.append(types.SessionEvent(frame_index=self.nb_records, kind=kind, data=data or {}))
+
+    def save(self, path: str) -> int:
+        """ Write the recorded session as compressed numpy archive. Returns the number of saved frames """
+        with self._save_lock:
+            end = self.nb_records
+            records = self.records.copy()
+            frames = self.frames.copy()
+            frame_records = self.frame_records.copy()
+            events = list(self.events)
+            # Records overwritten by the render thread while copying are left out
+            start = max(0, self.nb_records - len(records))
+        order = [index % len(records) for index in range(start, end)]
+        stored = (frame_records >= start) & (frame_records < end)
+        meta = {**self.meta, "nb_pixels": self.nb_pixels, "started_at": self.started_at, "saved_at": self.clock(), "first_record": start}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "wb") as session_file:
+            np.savez_compressed(
+                session_file,
+                meta=np.array(json.dumps(meta)),
+                records=records[order],
+                frames=frames[stored],
+                frame_records=frame_records[stored],
+                events=np.array(json.dumps([(event.frame_index, event.kind, event.data) for event in events], default=str)))
+        return int(stored.sum())
+
+
+def load_session(path: str) -> types.RecordedSession:
+    """ Read a session written by SessionRecorder.save, frame indices are relative to the first saved record """
+    with np.load(path) as archive:
+        meta = json.loads(str(archive["meta"]))
+        first_record = meta["first_record"]
+        return types.RecordedSession(
+            meta=meta,
+            records=archive["records"],
+            frames={int(index) - first_record: frame for index, frame in zip(archive["frame_records"], archive["frames"])},
+            events=[types.SessionEvent(frame_index=max(0, frame_index - first_record), kind=kind, data=data)
+                    for frame_index, kind, data in json.loads(str(archive["events"])) if frame_index >= first_record])
+
+
+def session_frames(session: types.RecordedSession, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[int, np.void, types.ComplianceSnapshot]]:
+    """ (index, record, snapshot) of every recorded frame from start to end """
+    for index in range(start, len(session.records) if end is None else min(end, len(session.records))):
+        record = session.records[index]
+        yield index, record, types.ComplianceSnapshot(generation=int(record["generation"]), compliant_mask=int(record["compliant_mask"]))
+
+
+def prune_sessions(directory: str, keep: int):
+    """ Delete the oldest saved sessions in the directory, so only keep of them are left """
+    try:
+        paths = sorted((os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".npz")), key=os.path.getmtime)
+    except FileNotFoundError:
+        return
+    for path in paths[:max(0, len(paths) - keep)]:
+        os.remove(path)
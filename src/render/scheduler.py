@@ -0,0 +1,90 @@
+import time
+from typing import Callable, Optional
+
+from src.utils.metrics import FRAME_TIME_BUCKETS, Histogram
+import src.utils.types as types
+
+
+class RenderScheduler():
+    def __init__(self, 
+                 target_fps: float, 
+                 clock: Callable[[], float] = time.monotonic, 
+                 sleep: Callable[[float], None] = time.sleep):
+        """
+        target_fps (float): Number of frames per second the scheduler tries to hold
+        clock (Callable): Monotonic clock returning seconds, injectable for deterministic runs
+        sleep (Callable): Function used to wait until the next frame deadline
+        """
+        if target_fps <= 0:
+            raise ValueError(f"Target FPS has to be positive, got {target_fps}")
+        self.target_fps = target_fps
+        self.frame_budget = 1.0 / target_fps
+        self.clock = clock
+        self.sleep = sleep
+        self.stats = types.RenderStats()
+        self.frame_times = Histogram(FRAME_TIME_BUCKETS)
+        self.running = False
+        # Number of frames and start of the current one second window used to measure the achieved FPS
+        self._fps_window_frames = 0
+        self._fps_window_start = 0.0
+
+    def stop(self):
+        """ Let the scheduler return after the frame that is currently rendered """
+        self.running = False
+
+    def run(self, render_frame: Callable[[float], None], max_frames: Optional[int] = None):
+        """ Call render_frame once per frame budget until stop() is called
+
+        render_frame (Callable): Renders one frame, gets the seconds elapsed since the scheduler started
+        max_frames (int): Optional number of frames after which the scheduler returns
+        """
+        self.running = True
+        start_time = self.clock()
+        next_deadline = start_time
+        self._fps_window_start = start_time
+        self._fps_window_frames = 0
+
+        try:
+            while self.running:
+                frame_start = self.clock()
+                render_frame(frame_start - start_time)
+                frame_end = self.clock()
+                self._record_frame(frame_start, frame_end)
+
+                if max_frames is not None and self.stats.frames_rendered >= max_frames:
+                    break
+
+                next_deadline += self.frame_budget
+                if frame_end <= next_deadline:
+                    self.sleep(next_deadline - frame_end)
+                    continue
+
+                # We are behind. Animations are driven by elapsed time, so instead of rendering a burst of
+                # frames to catch up we drop the deadlines we missed and continue with the next free slot.
+                self.stats.missed_deadlines += 1
+                frames_behind = int((frame_end - next_deadline) / self.frame_budget) + 1
+                self.stats.frames_skipped += frames_behind
+                next_deadline += frames_behind * self.frame_budget
+                self.sleep(max(0.0, next_deadline - self.clock()))
+        finally:
+            self.running = False
+
+    def _record_frame(self, frame_start: float, frame_end: float):
+        frame_time = frame_end - frame_start
+        stats = self.stats
+        stats.frames_rendered += 1
+        stats.last_frame_time = frame_time
+        # Exponential moving average, smooth enough to read but still reacts within a second
+        if stats.frames_rendered == 1:
+            stats.average_frame_time = frame_time
+        else:
+            stats.average_frame_time += 0.05 * (frame_time - stats.average_frame_time)
+        stats.max_frame_time = max(stats.max_frame_time, frame_time)
+        self.frame_times.observe(frame_time)
+
+        self._fps_window_frames += 1
+        window = frame_end - self._fps_window_start
+        if window >= 1.0:
+            stats.achieved_fps = self._fps_window_frames / window
+            self._fps_window_frames = 0
+            self._fps_window_start = frame_end
@@ -0,0 +1,50 @@
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+import numpy as np
+
+import src.utils.types as types
+
+
+class AnimationTables():
+    def __init__(self, capacity: int = 64, max_bytes: int = 4 * 1024 * 1024):
+        """
+        capacity (int): Maximum number of tables kept, the least recently used one is dropped first
+        max_bytes (int): Maximum memory of all kept tables in bytes
+        """
+        self.capacity = capacity
+        self.max_bytes = max_bytes
+        self.tables: "OrderedDict[Hashable, np.ndarray]" = OrderedDict()
+        self.nb_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, build: Callable[[], np.ndarray]) -> np.ndarray:
+        """ Table for the key, built with build() if it is not cached yet """
+        table = self.tables.get(key)
+        if table is not None:
+            self.hits += 1
+            self.tables.move_to_end(key)
+            return table
+
+        self.misses += 1
+        table = build()
+        table.setflags(write=False)
+        self.tables[key] = table
+        self.nb_bytes += table.nbytes
+        # Always keep the newest table, even if it is larger than max_bytes on its own
+        while len(self.tables) > 1 and (len(self.tables) > self.capacity or self.nb_bytes > self.max_bytes):
+            _, evicted = self.tables.popitem(last=False)
+            self.nb_bytes -= evicted.nbytes
+            self.evictions += 1
+        return table
+
+    @property
+    def stats(self) -> types.AnimationTableStats:
+        return types.AnimationTableStats(
+            tables=len(self.tables),
+            nb_bytes=self.nb_bytes,
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions)
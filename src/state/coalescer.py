@@ -0,0 +1,92 @@
+import threading
+import time
+from typing import Callable, Dict, Iterable, Tuple
+
+from src.state.store import ComplianceStore, STATE_SLOTS
+import src.utils.types as types
+
+
+class StateCoalescer():
+    def __init__(self, 
+                 compliance_store: ComplianceStore, 
+                 settle_window: float, 
+                 clock: Callable[[], float] = time.monotonic):
+        """ Coalesces bursts of updates per state before they reach the compliance store.
+
+        The first update of a state opens a settle window. Updates within the window replace each other
+        (last writer wins) and only the value left at the end of the window is applied, so a green/red/green
+        flap never reaches the store. Due windows are applied by flush(), which the render loop calls once
+        per frame.
+
+        compliance_store (ComplianceStore): Store the coalesced updates are applied to
+        settle_window (float): Seconds a state has to settle before its update is applied, 0 applies right away
+        clock (Callable): Monotonic clock returning seconds, injectable for deterministic runs
+        """
+        self.compliance_store = compliance_store
+        self.settle_window = settle_window
+        self.clock = clock
+        self.stats = types.CoalescerStats()
+        # slot -> (latest compliant value, end of the settle window)
+        self._pending: Dict[int, Tuple[bool, float]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def snapshot(self) -> types.ComplianceSnapshot:
+        return self.compliance_store.snapshot
+
+    def set_state(self, slot: int, compliant: bool) -> types.ComplianceSnapshot:
+        """ Queue an update of the state slot. Returns the current snapshot of the store """
+        self.stats.received += 1
+        if self.settle_window <= 0:
+            return self._apply(((slot, compliant),), self.clock())
+
+        with self._lock:
+            pending = self._pending.get(slot)
+            if pending is None:
+                self._pending[slot] = (compliant, self.clock() + self.settle_window)
+            else:
+                self.stats.merged += 1
+                self._pending[slot] = (compliant, pending[1])
+        return self.compliance_store.snapshot
+
+    def set_states(self, updates: Iterable[Tuple[int, bool]]) -> types.ComplianceSnapshot:
+        """ Apply several (slot, compliant) updates in one step without a settle window, e.g. a batch the publisher
+        already settled. Pending updates of the same states are older and dropped. Returns the current snapshot """
+        updates = list(updates)
+        self.stats.received += len(updates)
+        with self._lock:
+            for slot, _ in updates:
+                if self._pending.pop(slot, None) is not None:
+                    self.stats.merged += 1
+        return self._apply(updates, self.clock())
+
+    def flush(self) -> types.ComplianceSnapshot:
+        """ Apply all updates whose settle window ended. Returns the current snapshot of the store """
+        if not self._pending:
+            return self.compliance_store.snapshot
+        now = self.clock()
+        with self._lock:
+            due = [(slot, compliant, deadline) for slot, (compliant, deadline) in self._pending.items() if deadline <= now]
+            for slot, _, _ in due:
+                del self._pending[slot]
+        if not due:
+            return self.compliance_store.snapshot
+        # Every window opened with the first update of its state
+        received_at = min(deadline for _, _, deadline in due) - self.settle_window
+        return self._apply([(slot, compliant) for slot, compliant, _ in due], received_at)
+
+    def reset(self) -> types.ComplianceSnapshot:
+        """ Drop all pending updates and mark every state compliant. Returns the current snapshot of the store """
+        with self._lock:
+            self._pending.clear()
+        return self.compliance_store.set_states(((slot, True) for slot in range(len(STATE_SLOTS))), self.clock())
+
+    def _apply(self, updates, received_at: float) -> types.ComplianceSnapshot:
+        snapshot = self.compliance_store.snapshot
+        changed = [(slot, compliant) for slot, compliant in updates if snapshot.is_compliant(slot) != compliant]
+        # Windows that ended on the value the store already has were flaps or repeats
+        self.stats.dropped += len(updates) - len(changed)
+        if not changed:
+            return snapshot
+        self.stats.applied += len(changed)
+        return self.compliance_store.set_states(changed, received_at)
@@ -0,0 +1,32 @@
+from typing import Iterable, List, Tuple
+
+from src.state.coalescer import StateCoalescer
+import src.utils.types as types
+
+
+class StateFanOut():
+    def __init__(self, targets: List[StateCoalescer]):
+        """ Hands every state update of the one MQTT subscription to the independent state of every board
+
+        targets (List[StateCoalescer]): State of every board, the first one is reported as snapshot
+        """
+        if not targets:
+            raise ValueError("State fan out needs at least one target")
+        self.targets = targets
+
+    @property
+    def snapshot(self) -> types.ComplianceSnapshot:
+        return self.targets[0].snapshot
+
+    def set_state(self, slot: int, compliant: bool) -> types.ComplianceSnapshot:
+        """ Queue the update of the state slot for every board. Returns the snapshot of the first board """
+        for target in self.targets:
+            target.set_state(slot, compliant)
+        return self.targets[0].snapshot
+
+    def set_states(self, updates: Iterable[Tuple[int, bool]]) -> types.ComplianceSnapshot:
+        """ Apply several updates in one step for every board. Returns the snapshot of the first board """
+        updates = list(updates)
+        for target in self.targets:
+            target.set_states(updates)
+        return self.targets[0].snapshot
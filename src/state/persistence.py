@@ -0,0 +1,150 @@
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import BinaryIO, Callable, Optional
+
+from src.state.store import STATE_SLOTS
+import src.utils.types as types
+
+logger = logging.getLogger(__name__)
+
+# The file starts with the magic and the checksum of the slot names, so a file written with another
+# set of states is not applied to the wrong slots
+FILE_MAGIC = b"KCS1"
+FILE_HEADER = struct.Struct("<4sI")
+# Every record is the save time (float64, wall clock seconds), the compliant mask (uint64) and the
+# checksum of both (uint32), a record torn by a power cut fails the checksum
+RECORD = struct.Struct("<dQI")
+RECORD_BODY = struct.Struct("<dQ")
+
+
+def slot_layout_checksum() -> int:
+    return zlib.crc32(",".join(STATE_SLOTS).encode("utf-8"))
+
+
+class StatePersistence():
+    def __init__(self,
+                 filepath: str,
+                 sync_interval: float = 1.0,
+                 max_records: int = 4096,
+                 clock: Callable[[], float] = time.time):
+        """ Keeps the compliance of a board in an append-only file, so a restart shows the last known state
+        from the first frame on. record() only hands the snapshot over, a writer thread appends at most one
+        record and one fsync per sync_interval, so bursts of changes do not wear out the SD card
+
+        filepath (str): State file, created if it does not exist
+        sync_interval (float): Minimum seconds between two writes and syncs of the file
+        max_records (int): Records after which the file is rewritten with only the last one
+        clock (Callable): Wall clock returning seconds, stored with every record
+        """
+        self.filepath = filepath
+        self.sync_interval = sync_interval
+        self.max_records = max_records
+        self.clock = clock
+        self.stats = types.PersistenceStats()
+        self._pending: Optional[int] = None
+        self._written: Optional[int] = None
+        self._file: Optional[BinaryIO] = None
+        self._nb_records = 0
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def load(self) -> Optional[types.PersistedCompliance]:
+        """ Last valid record of the state file, None if there is none or it belongs to another set of states """
+        try:
+            with open(self.filepath, "rb") as state_file:
+                data = state_file.read()
+        except FileNotFoundError:
+            return None
+        except OSError as error:
+            logger.warning(f"Could not read the state file {self.filepath}: {error}")
+            return None
+        if len(data) < FILE_HEADER.size or FILE_HEADER.unpack_from(data) != (FILE_MAGIC, slot_layout_checksum()):
+            logger.warning(f"Ignoring the state file {self.filepath}, it was written for other states")
+            return None
+        # Walk back from the last complete record to the first one with a valid checksum
+        nb_records = (len(data) - FILE_HEADER.size) // RECORD.size
+        for index in range(nb_records - 1, -1, -1):
+            offset = FILE_HEADER.size + index * RECORD.size
+            saved_at, compliant_mask, checksum = RECORD.unpack_from(data, offset)
+            if zlib.crc32(data[offset:offset + RECORD_BODY.size]) == checksum:
+                self._written = compliant_mask
+                return types.PersistedCompliance(compliant_mask=compliant_mask, saved_at=saved_at)
+        return None
+
+    def start(self):
+        """ Start the writer thread, the first write compacts the records of the previous run into one """
+        os.makedirs(os.path.dirname(self.filepath), exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="state-persistence", daemon=True)
+        self._thread.start()
+
+    def record(self, snapshot: types.ComplianceSnapshot):
+        """ Save the compliance of the snapshot with the next sync, safe to call from any thread and never blocks """
+        self.stats.changes += 1
+        self._pending = snapshot.compliant_mask
+        self._wake.set()
+
+    def close(self):
+        """ Write the last change and stop the writer thread """
+        self._stopped.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait()
+            self._wake.clear()
+            self._write_pending()
+            # Changes until the end of the interval share the next record and sync
+            self._stopped.wait(self.sync_interval)
+        self._write_pending()
+
+    def _write_pending(self):
+        compliant_mask = self._pending
+        if compliant_mask is None or compliant_mask == self._written:
+            return
+        start = time.perf_counter()
+        try:
+            if self._nb_records >= self.max_records or self._file is None:
+                self._compact(compliant_mask)
+            else:
+                self._file.write(self._pack(compliant_mask))
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._nb_records += 1
+        except OSError as error:
+            logger.warning(f"Could not write the state file {self.filepath}: {error}")
+            return
+        self._written = compliant_mask
+        self.stats.records += 1
+        self.stats.syncs += 1
+        self.stats.last_sync_time = time.perf_counter() - start
+
+    def _compact(self, compliant_mask: int):
+        """ Replace the file with the header and a single record, then keep appending to it """
+        if self._file:
+            self._file.close()
+            self._file = None
+        # Written next to the file first, so a power cut leaves either the old or the new file behind
+        temporary_path = f"{self.filepath}.tmp"
+        with open(temporary_path, "wb") as state_file:
+            state_file.write(FILE_HEADER.pack(FILE_MAGIC, slot_layout_checksum()) + self._pack(compliant_mask))
+            state_file.flush()
+            os.fsync(state_file.fileno())
+        os.replace(temporary_path, self.filepath)
+        self._file = open(self.filepath, "ab")
+        self._nb_records = 1
+        self.stats.compactions += 1
+
+    def _pack(self, compliant_mask: int) -> bytes:
+        body = RECORD_BODY.pack(self.clock(), compliant_mask)
+        return body + struct.pack("<I", zlib.crc32(body))
@@ -0,0 +1,61 @@
+import dataclasses
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import src.utils.types as types
+
+# Slot of every compliance state, bit `slot` of a snapshot mask is set while the state is compliant
+STATE_SLOTS: Tuple[str, ...] = tuple(field.name for field in dataclasses.fields(types.ComplianceState))
+STATE_SLOT_INDEX: Dict[str, int] = {state_id: slot for slot, state_id in enumerate(STATE_SLOTS)}
+
+
+class ComplianceStore():
+    def __init__(self, global_compliance_state: types.ComplianceState, compliant_mask: Optional[int] = None):
+        """ Holds the compliance of all states as an immutable, versioned snapshot.
+
+        Writers (e.g. the MQTT callback thread) build a new snapshot and publish it by replacing the
+        snapshot reference, which is atomic. Readers (e.g. the render loop) read `snapshot` once and work
+        on a consistent view without taking a lock.
+
+        global_compliance_state (ComplianceState): Initial compliance of all states
+        compliant_mask (int): Compliance restored from a previous run, replaces global_compliance_state
+        """
+        if compliant_mask is None:
+            compliant_mask = 0
+            for slot, state_id in enumerate(STATE_SLOTS):
+                if getattr(global_compliance_state, state_id).COMPLIANT:
+                    compliant_mask |= 1 << slot
+        self.snapshot = types.ComplianceSnapshot(generation=0, compliant_mask=compliant_mask)
+        # Called from the writing thread with every new snapshot, e.g. to persist it
+        self.listeners: List[Callable[[types.ComplianceSnapshot], None]] = []
+        # Only serializes writers against each other, readers never take it
+        self._write_lock = threading.Lock()
+
+    def set_state(self, slot: int, compliant: bool) -> types.ComplianceSnapshot:
+        """ Publish a new snapshot with the given state slot changed. Returns the current snapshot """
+        snapshot = self.snapshot
+        # Most messages repeat the current state, those neither take the lock nor allocate a snapshot
+        if (snapshot.compliant_mask >> slot & 1) == compliant:
+            return snapshot
+        return self.set_states(((slot, compliant),))
+
+    def set_states(self, updates: Iterable[Tuple[int, bool]], received_at: float = 0.0) -> types.ComplianceSnapshot:
+        """ Apply several (slot, compliant) updates in one step. Returns the current snapshot
+
+        received_at (float): Monotonic time the oldest of the updates was received at, 0 if unknown
+        """
+        with self._write_lock:
+            snapshot = self.snapshot
+            compliant_mask = snapshot.compliant_mask
+            for slot, compliant in updates:
+                if compliant:
+                    compliant_mask |= 1 << slot
+                else:
+                    compliant_mask &= ~(1 << slot)
+            if compliant_mask == snapshot.compliant_mask:
+                return snapshot
+            self.snapshot = types.ComplianceSnapshot(generation=snapshot.generation + 1, compliant_mask=compliant_mask, received_at=received_at)
+            # Under the lock, so the listeners see the snapshots in order. They must not block
+            for listener in self.listeners:
+                listener(self.snapshot)
+            return self.snapshot
@@ -0,0 +1,435 @@
+import asyncio
+import logging
+import os
+import random
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, List, Optional, Set, Tuple
+
+from src.board import Board
+from src.game.engine import GameEngine
+from src.game.leaderboard import Leaderboard
+from src.interfaces.input import InputQueue
+from src.interfaces.metrics import MetricsServer
+from src.interfaces.publisher import OutboundPublisher
+from src.render.recorder import prune_sessions
+from src.state.store import STATE_SLOTS
+from src.utils.boot import BootProfiler
+from src.utils.metrics import format_histogram, format_metric
+import src.utils.types as types
+
+if TYPE_CHECKING:
+    # Imports awscrt, which is only loaded after the first frame
+    from src.interfaces.mqtt import MqttClientInterface
+
+logger = logging.getLogger(__name__)
+
+
+class Supervisor():
+    def __init__(self,
+                 boards: List[Board],
+                 create_clients: Callable[[], Tuple["MqttClientInterface", OutboundPublisher, List[object]]],
+                 input_queue: InputQueue,
+                 connect_timeout: float = 30,
+                 reconnect_min_delay: float = 1.0,
+                 reconnect_max_delay: float = 60.0,
+                 game_engine: Optional[GameEngine] = None,
+                 leaderboard: Optional[Leaderboard] = None,
+                 resync_message: Optional[Tuple[str, str]] = None,
+                 boot_profiler: Optional[BootProfiler] = None,
+                 metrics_server: Optional[MetricsServer] = None,
+                 session_directory: Optional[str] = None,
+                 session_keep: int = 10):
+        """ Runs all components from one asyncio event loop: every board renders in its own thread and starts right
+        away with the connecting animation, MQTT connects concurrently and reconnects with exponential backoff.
+        SIGINT and SIGTERM shut everything down in order.
+        The clients are only created once every board showed its first frame, so the stripes light up before awscrt is imported.
+
+        boards (List[Board]): Boards rendered by this process, all of them get the compliance of the one subscription
+        create_clients (Callable): Creates the not yet started MQTT client receiving the compliance, the publisher of
+            the button presses and the input sources (buttons, keys) posting to input_queue. Called in a worker thread
+            after the first frame
+        input_queue (InputQueue): Local controls, taken once per frame by the render thread of the first board and
+            handled in the event loop
+        connect_timeout (float): Seconds to wait for the connection and the subscription
+        reconnect_min_delay (float): Seconds to wait before the first reconnect
+        reconnect_max_delay (float): Maximum seconds to wait between two reconnects
+        game_engine (GameEngine): Starts a game session on every button press and publishes the message of its
+            difficulty, None to publish nothing. Follows the compliance of the first board
+        leaderboard (Leaderboard): Stores the finished game sessions, None to only log them
+        resync_message (Tuple[str, str]): Topic and message published after every subscription to ask for the current
+            compliance of all states, None to rely on retained messages
+        boot_profiler (BootProfiler): Receives the first frame, client creation and connection phases of the startup
+        metrics_server (MetricsServer): Serves metrics() once the first frame is shown, None to not serve them
+        session_directory (str): The recorded sessions of the boards are saved here on the save input and on shutdown
+        session_keep (int): Number of saved sessions kept in session_directory, older ones are deleted
+        """
+        if not boards:
+            raise ValueError("Supervisor needs at least one board")
+        self.boards = boards
+        self.create_clients = create_clients
+        self.input_queue = input_queue
+        self.mqtt_client: Optional["MqttClientInterface"] = None
+        self.outbound_publisher: Optional[OutboundPublisher] = None
+        self.input_sources: List[object] = []
+        self.connect_timeout = connect_timeout
+        self.reconnect_min_delay = reconnect_min_delay
+        self.reconnect_max_delay = reconnect_max_delay
+        self.game_engine = game_engine
+        self.leaderboard = leaderboard
+        self.resync_message = resync_message
+        self.boot_profiler = boot_profiler
+        self.metrics_server = metrics_server
+        self.session_directory = session_directory
+        self.session_keep = session_keep
+        self.stats = types.SupervisorStats()
+        self._waiting_boards = len(boards)
+        self._start_time = 0.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stop_event: Optional[asyncio.Event] = None
+        self._events: Optional["asyncio.Queue[Tuple[str, object]]"] = None
+        self._first_frame: Optional[asyncio.Event] = None
+        self._clients: Optional[asyncio.Future] = None
+        self._save_task: Optional[asyncio.Task] = None
+        # Tasks storing finished game sessions, kept until they are done
+        self._game_tasks: Set[asyncio.Task] = set()
+
+    def stop(self):
+        """ Shut down after the current frame. Has to be called from the event loop thread """
+        if self._stop_event:
+            self._stop_event.set()
+
+    async def run(self):
+        self._loop = asyncio.get_running_loop()
+        self._stop_event = asyncio.Event()
+        self._events = asyncio.Queue()
+        self._first_frame = asyncio.Event()
+        self._start_time = time.monotonic()
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            self._loop.add_signal_handler(signal_number, self.stop)
+        # Posted from the threads of the sources, taken by the render loop of the first board and handled in the event loop
+        self.boards[0].input_queue = self.input_queue
+        self.boards[0].on_inputs = lambda events: self._loop.call_soon_threadsafe(self._handle_inputs, events)
+        for board in self.boards:
+            board.on_first_frame = lambda shown_at, board=board: self._loop.call_soon_threadsafe(self._on_first_frame, board, shown_at)
+        if self.game_engine:
+            # Transitions are settled by the coalescer of the first board, the game takes them in the event loop
+            compliance_store = self.boards[0].state_coalescer.compliance_store
+            self.game_engine.update(compliance_store.snapshot)
+            compliance_store.listeners.append(lambda snapshot: self._loop.call_soon_threadsafe(self._update_game, snapshot))
+
+        # A thread per board, composing a frame takes microseconds and show() releases the GIL while it waits for the stripe
+        executor = ThreadPoolExecutor(max_workers=len(self.boards), thread_name_prefix="render")
+        render_task = asyncio.gather(*(self._loop.run_in_executor(executor, board.run) for board in self.boards))
+        mqtt_task = asyncio.create_task(self._run_mqtt())
+        stop_task = asyncio.create_task(self._stop_event.wait())
+        done, _ = await asyncio.wait((render_task, mqtt_task, stop_task), return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task is not stop_task and task.exception():
+                logger.error(f"Stopping after an unexpected error: {task.exception()!r}")
+
+        for board in self.boards:
+            board.stop()
+        for task in (mqtt_task, stop_task):
+            task.cancel()
+        await asyncio.gather(render_task, mqtt_task, stop_task, return_exceptions=True)
+        executor.shutdown()
+        self.boards[0].on_inputs = None
+        await self._shutdown()
+
+    def _on_first_frame(self, board: Board, shown_at: float):
+        """ Called in the event loop once per board, the clients are created after the last board lit up """
+        logger.info(f"First frame of {board.name} after {(shown_at - self._start_time) * 1000:.0f}ms")
+        self._waiting_boards -= 1
+        if self._waiting_boards:
+            return
+        self.stats.time_to_first_frame = shown_at - self._start_time
+        if self.boot_profiler:
+            self.boot_profiler.first_frame()
+            self.stats.power_on_to_first_frame = self.boot_profiler.power_on_to_first_frame or 0.0
+        self._first_frame.set()
+
+    def _handle_inputs(self, events: List[types.InputEvent]):
+        for event in events:
+            self._handle_input(event)
+
+    def _handle_input(self, event: types.InputEvent):
+        for board in self.boards:
+            if board.session_recorder:
+                board.session_recorder.record_event(event.kind.value, {"source": event.source})
+        if event.kind == types.InputEventKind.STOP:
+            logger.info("Stopping script execution")
+            self.stop()
+        elif event.kind == types.InputEventKind.RESET:
+            logger.info("Marking all states compliant")
+            if self.game_engine and self.game_engine.abort():
+                logger.info("Game session aborted by the reset")
+            for board in self.boards:
+                board.state_coalescer.reset()
+        elif event.kind == types.InputEventKind.BUTTON:
+            logger.info("Pressed button", extra={"data": {"source": event.source}})
+            if self.game_engine:
+                self._start_game()
+        elif event.kind == types.InputEventKind.DIFFICULTY and self.game_engine:
+            logger.info(f"Difficulty of the next game session: {self.game_engine.next_difficulty()}")
+        elif event.kind == types.InputEventKind.SAVE:
+            self._save_task = self._loop.create_task(asyncio.to_thread(self._save_sessions))
+
+    def _start_game(self):
+        if self.outbound_publisher is None:
+            logger.warning("Publisher is not created yet, button press is dropped")
+            return
+        # Only queues the message, the publisher thread waits for the broker
+        if not self.outbound_publisher.publish(*self.game_engine.message):
+            logger.warning("Publish queue is full, button press is dropped")
+            return
+        # Every press starts the chaos again, a running session ends without a result
+        if self.game_engine.session:
+            logger.info("Game session aborted by a new one")
+        session = self.game_engine.start()
+        logger.info("Game session started", extra={"data": {"difficulty": session.difficulty}})
+        self._loop.call_later(self.game_engine.timeout, self._expire_game)
+
+    def _update_game(self, snapshot: types.ComplianceSnapshot):
+        session = self.game_engine.update(snapshot)
+        if session:
+            self._finish_game(session)
+
+    def _expire_game(self):
+        session = self.game_engine.expire()
+        if session:
+            self._finish_game(session)
+
+    def _finish_game(self, session: types.GameSession):
+        times = {remediation.state_id: round(remediation.time_to_remediate, 1)
+                 for remediation in session.remediations.values() if remediation.time_to_remediate is not None}
+        logger.info(f"Game session {'completed' if session.completed else 'timed out'} after {session.duration:.1f}s",
+                    extra={"data": {"difficulty": session.difficulty, "time_to_remediate": times}})
+        if self.leaderboard:
+            task = self._loop.create_task(self._store_game(session))
+            self._game_tasks.add(task)
+            task.add_done_callback(self._game_tasks.discard)
+
+    async def _store_game(self, session: types.GameSession):
+        """ Store the session and log its place on the leaderboard, the queries run in the thread of the leaderboard """
+        try:
+            session_id = await asyncio.wrap_future(self.leaderboard.add_session(session))
+            if session.completed:
+                rank = await asyncio.wrap_future(self.leaderboard.rank(session_id))
+                logger.info(f"Place {rank} of the {session.difficulty} leaderboard")
+        except Exception as exception:
+            logger.warning(f"Could not store the game session: {exception!r}")
+
+    def _save_sessions(self):
+        """ Save the recorded session of every board, called in a worker thread """
+        if not self.session_directory:
+            return
+        timestamp = time.strftime("%Y%m%d-%H%M%S")
+        for board in self.boards:
+            if not board.session_recorder:
+                continue
+            path = os.path.join(self.session_directory, f"{board.name}-{timestamp}.npz")
+            try:
+                nb_frames = board.session_recorder.save(path)
+            except OSError as error:
+                logger.warning(f"Could not save the session of {board.name}: {error}")
+                continue
+            logger.info(f"Saved the session of {board.name} to {path}", extra={"data": {"frames": nb_frames, "records": board.session_recorder.nb_records}})
+        prune_sessions(self.session_directory, self.session_keep)
+
+    async def _run_mqtt(self):
+        """ Connect and subscribe, and do it again with exponential backoff whenever it fails or the connection is lost """
+        await self._first_frame.wait()
+        if self.metrics_server:
+            await asyncio.to_thread(self.metrics_server.start, self.metrics)
+        # Shielded, so clients created while shutting down are still cleaned up
+        self._clients = asyncio.ensure_future(asyncio.to_thread(self.create_clients))
+        self.mqtt_client, self.outbound_publisher, self.input_sources = await asyncio.shield(self._clients)
+        if self.boot_profiler:
+            self.boot_profiler.mark("clients")
+        # Lifecycle events arrive on the awscrt thread and are handed over to the event loop
+        self.mqtt_client.lifecycle_listener = lambda event, data: self._loop.call_soon_threadsafe(self._events.put_nowait, (event, data))
+
+        delay = self.reconnect_min_delay
+        while True:
+            self._drain_events()
+            self.stats.connection_attempts += 1
+            self.mqtt_client.start()
+            if await self._connect():
+                self.stats.connections += 1
+                if not self.stats.time_to_connected:
+                    self.stats.time_to_connected = time.monotonic() - self._start_time
+                    if self.boot_profiler:
+                        self.boot_profiler.connected()
+                        self.boot_profiler.complete()
+                for board in self.boards:
+                    board.show_connected(True)
+                # The compliance restored at boot or kept while disconnected may be outdated
+                if self.resync_message and not self.outbound_publisher.publish(*self.resync_message, idempotent=True):
+                    logger.warning("Publish queue is full, resync request is dropped")
+                delay = self.reconnect_min_delay
+                await self._next_event({"disconnection", "stopped"})
+                self.stats.connection_losses += 1
+                logger.warning("Connection to the broker lost")
+                for board in self.boards:
+                    board.show_connected(False)
+
+            # Stop the client so it does not retry on its own schedule, then back off
+            if self.mqtt_client.running:
+                self.mqtt_client.stop()
+                try:
+                    await asyncio.wait_for(self._next_event({"stopped"}), self.connect_timeout)
+                except asyncio.TimeoutError:
+                    logger.warning("MQTT client did not confirm the stop, reconnecting anyway")
+            wait = delay * random.uniform(0.8, 1.2)
+            logger.info(f"Reconnecting in {wait:.1f}s")
+            await asyncio.sleep(wait)
+            delay = min(delay * 2, self.reconnect_max_delay)
+
+    async def _connect(self) -> bool:
+        """ Wait for the connection of the started client and subscribe, False if either fails """
+        try:
+            event, data = await asyncio.wait_for(self._next_event({"connection_success", "connection_failure"}), self.connect_timeout)
+            if event != "connection_success":
+                return False
+            logger.info(f"Connected with reason_code:{repr(data.connack_packet.reason_code)}")
+            # A new session has no subscriptions, so subscribe on every connect
+            suback = await asyncio.wait_for(asyncio.wrap_future(self.mqtt_client.subscribe_async()), self.connect_timeout)
+            logger.info(f"Subscribed with {suback.reason_codes}")
+            return True
+        except asyncio.TimeoutError:
+            logger.warning(f"No connection after {self.connect_timeout}s")
+        except Exception as exception:
+            logger.warning(f"Subscribing failed: {exception!r}")
+        return False
+
+    async def _next_event(self, names: Set[str]) -> Tuple[str, object]:
+        while True:
+            event, data = await self._events.get()
+            if event in names:
+                return event, data
+
+    def _drain_events(self):
+        while not self._events.empty():
+            self._events.get_nowait()
+
+    async def _shutdown(self):
+        """ Print the statistics and clean up all components, blocking cleanups run in a worker thread """
+        if self._clients is not None:
+            try:
+                self.mqtt_client, self.outbound_publisher, self.input_sources = await self._clients
+            except Exception:
+                # Already reported when the MQTT task failed
+                pass
+        if self.boot_profiler:
+            self.boot_profiler.complete()
+        logger.info(f"Supervisor stats: {self.stats}, input stats: {self.input_queue.stats}")
+        for board in self.boards:
+            frame_buffer = board.neopixel_client.frame_buffer
+            logger.info(f"Render stats of {board.name}: {board.render_scheduler.stats}")
+            logger.info(f"Frame buffer stats of {board.name}: {frame_buffer.stats}")
+            logger.info(f"Animation table stats of {board.name}: {board.neopixel_client.tables.stats}")
+            if frame_buffer.output_stage:
+                logger.info(f"Output stats of {board.name}: {frame_buffer.output_stage.stats}")
+            logger.info(f"Coalescer stats of {board.name}: {board.state_coalescer.stats}")
+            if board.state_persistence:
+                logger.info(f"Persistence stats of {board.name}: {board.state_persistence.stats}")
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            self._loop.remove_signal_handler(signal_number)
+        if self.metrics_server:
+            await asyncio.to_thread(self.metrics_server.stop)
+        if self.outbound_publisher:
+            logger.info(f"Publisher stats: {self.outbound_publisher.stats}")
+            await asyncio.to_thread(self.outbound_publisher.stop, self.outbound_publisher.puback_timeout)
+        if self.mqtt_client:
+            logger.info(f"Message stats: {self.mqtt_client.stats}")
+            self.mqtt_client.lifecycle_listener = None
+            await asyncio.to_thread(self.mqtt_client.cleanup)
+        await asyncio.to_thread(self._save_sessions)
+        if self.game_engine:
+            logger.info(f"Game stats: {self.game_engine.stats}")
+        if self._game_tasks:
+            await asyncio.gather(*self._game_tasks, return_exceptions=True)
+        if self.leaderboard:
+            await asyncio.to_thread(self.leaderboard.close)
+        for board in self.boards:
+            board.neopixel_client.cleanup()
+            if board.state_persistence:
+                await asyncio.to_thread(board.state_persistence.close)
+        for input_source in self.input_sources:
+            input_source.cleanup()
+
+    def metrics(self) -> str:
+        """ Current metrics of all components in the Prometheus text format. Only reads counters the components
+        keep anyway, called from the thread of the metrics server. Metrics of a board are labeled with its name """
+        boards = [({"board": board.name}, board) for board in self.boards]
+        snapshots = [(labels, board.state_coalescer.snapshot) for labels, board in boards]
+        persistences = [(labels, board.state_persistence) for labels, board in boards if board.state_persistence]
+        output_stages = [(labels, board.neopixel_client.frame_buffer.output_stage) for labels, board in boards
+                         if board.neopixel_client.frame_buffer.output_stage]
+        lines = [
+            *format_histogram("kitty_frame_seconds", "Time to render one frame.", [(labels, board.render_scheduler.frame_times) for labels, board in boards]),
+            *format_metric("kitty_frames_rendered_total", "counter", "Frames rendered.", [(labels, board.render_scheduler.stats.frames_rendered) for labels, board in boards]),
+            *format_metric("kitty_frames_skipped_total", "counter", "Frame slots dropped because rendering fell behind.", [(labels, board.render_scheduler.stats.frames_skipped) for labels, board in boards]),
+            *format_metric("kitty_achieved_fps", "gauge", "Frames per second over the last full second.", [(labels, board.render_scheduler.stats.achieved_fps) for labels, board in boards]),
+            *format_histogram("kitty_show_seconds", "Time to show one frame on the stripe.", [(labels, board.neopixel_client.frame_buffer.show_times) for labels, board in boards]),
+            *format_metric("kitty_shows_total", "counter", "Frames shown on the stripe.", [(labels, board.neopixel_client.frame_buffer.stats.shows) for labels, board in boards]),
+            *format_metric("kitty_shows_skipped_total", "counter", "Frames not shown because no pixel changed.", [(labels, board.neopixel_client.frame_buffer.stats.shows_skipped) for labels, board in boards]),
+            *format_metric("kitty_animation_table_bytes", "gauge", "Memory of the precomputed animation tables.", [(labels, board.neopixel_client.tables.nb_bytes) for labels, board in boards]),
+            *format_histogram("kitty_message_to_pixel_seconds", "Time from receiving a compliance change to the frame showing it.", [(labels, board.message_latencies) for labels, board in boards]),
+            *format_metric("kitty_compliance_mask", "gauge", "Bit slot is set while the state in that slot is compliant.", [(labels, snapshot.compliant_mask) for labels, snapshot in snapshots]),
+            *format_metric("kitty_compliance_changes_total", "counter", "Changes of the compliance.", [(labels, snapshot.generation) for labels, snapshot in snapshots]),
+            *format_metric("kitty_state_compliant", "gauge", "1 while the state is compliant.",
+                           [({**labels, "state": state_id}, int(snapshot.is_compliant(slot))) for labels, snapshot in snapshots for slot, state_id in enumerate(STATE_SLOTS)]),
+            *format_metric("kitty_input_events_total", "counter", "Input events handled.", [(None, self.input_queue.stats.handled)]),
+            *format_metric("kitty_input_events_debounced_total", "counter", "Input events ignored by the debounce.", [(None, self.input_queue.stats.debounced)]),
+            *format_metric("kitty_mqtt_connection_attempts_total", "counter", "Times the MQTT client was started.", [(None, self.stats.connection_attempts)]),
+            *format_metric("kitty_mqtt_connections_total", "counter", "Successful connections including the subscription.", [(None, self.stats.connections)]),
+            *format_metric("kitty_mqtt_connection_losses_total", "counter", "Established connections that were lost.", [(None, self.stats.connection_losses)]),
+            *format_metric("kitty_time_to_first_frame_seconds", "gauge", "Time from the start of the supervisor to the first frame of every board.", [(None, self.stats.time_to_first_frame)]),
+            *format_metric("kitty_power_on_to_first_frame_seconds", "gauge", "Time from the boot of the system to the first frame of every board.", [(None, self.stats.power_on_to_first_frame)]),
+        ]
+        if self.game_engine:
+            game_stats = self.game_engine.stats
+            lines += [
+                *format_metric("kitty_game_sessions_started_total", "counter", "Game sessions started with the button.", [(None, game_stats.started)]),
+                *format_metric("kitty_game_sessions_total", "counter", "Finished game sessions by result.",
+                               [({"result": "completed"}, game_stats.completed), ({"result": "timed_out"}, game_stats.timed_out), ({"result": "aborted"}, game_stats.aborted)]),
+                *format_metric("kitty_game_session_running", "gauge", "1 while a game session is running.", [(None, int(self.game_engine.session is not None))]),
+                *format_histogram("kitty_game_remediation_seconds", "Time from an injected misconfiguration to its remediation.", [(None, self.game_engine.remediation_times)]),
+            ]
+        if persistences:
+            lines += [
+                *format_metric("kitty_state_file_syncs_total", "counter", "Writes and syncs of the state file.", [(labels, persistence.stats.syncs) for labels, persistence in persistences]),
+                *format_metric("kitty_state_file_changes_total", "counter", "Compliance changes handed to the state file.", [(labels, persistence.stats.changes) for labels, persistence in persistences]),
+            ]
+        if output_stages:
+            lines += [
+                *format_metric("kitty_current_milliamps", "gauge", "Estimated current of the last shown frame.", [(labels, output_stage.stats.last_current_ma) for labels, output_stage in output_stages]),
+                *format_metric("kitty_frames_power_limited_total", "counter", "Frames dimmed to stay within the power budget.", [(labels, output_stage.stats.frames_limited) for labels, output_stage in output_stages]),
+            ]
+        if self.mqtt_client:
+            message_stats = self.mqtt_client.stats
+            lines += [
+                *format_metric("kitty_mqtt_connected", "gauge", "1 while connected to the broker.", [(None, int(self.mqtt_client.connected))]),
+                *format_metric("kitty_mqtt_messages_total", "counter", "Received messages per topic id.",
+                               [({"topic_id": topic.rsplit("/", 1)[-1]}, count) for topic, count in self.mqtt_client.topic_messages.items()]),
+                *format_metric("kitty_mqtt_messages_unknown_topic_total", "counter", "Received messages on unknown topics.", [(None, message_stats.unknown_topic)]),
+                *format_metric("kitty_mqtt_messages_empty_total", "counter", "Received messages without payload.", [(None, message_stats.empty_payload)]),
+                *format_metric("kitty_mqtt_batches_dropped_total", "counter", "Received batches that were not applied.",
+                               [({"reason": "malformed"}, message_stats.batches_malformed), ({"reason": "out_of_order"}, message_stats.batches_out_of_order)]),
+                *format_metric("kitty_mqtt_batch_states_skipped_total", "counter", "Entries of batches with an invalid or unknown id.", [(None, message_stats.batch_states_skipped)]),
+            ]
+        if self.outbound_publisher:
+            publisher_stats = self.outbound_publisher.stats
+            lines += [
+                *format_histogram("kitty_publish_puback_seconds", "Time from publishing a message to its PUBACK.", [(None, self.outbound_publisher.puback_latencies)]),
+                *format_metric("kitty_publish_messages_total", "counter", "Outgoing messages by result.",
+                               [({"result": "published"}, publisher_stats.published), ({"result": "failed"}, publisher_stats.failed),
+                                ({"result": "dropped"}, publisher_stats.dropped), ({"result": "rejected"}, publisher_stats.rejected)]),
+                *format_metric("kitty_publish_retries_total", "counter", "Idempotent messages published again after a failed publish.", [(None, publisher_stats.retried)]),
+                *format_metric("kitty_publish_puback_timeouts_total", "counter", "PUBACKs that did not arrive in time and were waited for again.", [(None, publisher_stats.puback_timeouts)]),
+                *format_metric("kitty_publish_queue_depth", "gauge", "Messages waiting to be published.", [(None, publisher_stats.queue_depth)]),
+            ]
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+""" Benchmark of the frame pipeline and the MQTT handler.
+
+Renders frames of synthetic boards on a simulated stripe and reports the cost of every NeopixelInterface
+call of a frame: update_animation, update_states and show_changes. The per component
+ArchitectureComponent.update is gone since the components are compiled into one render plan, its work
+is the compose step of show_changes, so show_changes is also split into compose and flush. Then the
+MQTT receive callback is measured with a burst of synthetic messages. Results are written as JSON and
+can be compared against the results of a previous release.
+
+    python -m src.tools.benchmark --pixels 200 2000 --components 9 90 --output bench.json
+    python -m src.tools.benchmark --compare bench-previous.json --tolerance 0.2 --min-delta 2
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+from typing import Dict, List
+
+import numpy as np
+
+import src.architecture.component as architecture
+import src.interfaces.backends as backends
+import src.interfaces.mqtt_recording as mqtt_recording
+import src.interfaces.neopixel as neopixel_interface
+import src.render.plan as render_plan_compiler
+import src.state.store as store
+import src.utils.constants as constants
+import src.utils.types as types
+from src.tools.mqtt_load import percentile, run as run_mqtt_load
+
+# Calls of NeopixelInterface per frame, show_changes is the sum of its steps
+FRAME_PHASES = ("update_animation", "update_states", "show_changes")
+SHOW_CHANGES_STEPS = ("compose", "flush")
+
+
+def create_components(nb_components: int, nb_pixels: int) -> List[architecture.ArchitectureComponent]:
+    """ Synthetic board: the stripe is split evenly into components with one outgoing, ingoing and component
+    connection each. States are assigned round robin, neighbouring connections share two pixels """
+    pixels_per_component = nb_pixels // nb_components
+    if pixels_per_component < 6:
+        raise ValueError(f"{nb_pixels} pixels are not enough for {nb_components} components")
+    components = []
+    for index in range(nb_components):
+        start = index * pixels_per_component
+        third = pixels_per_component // 3
+        state_id = store.STATE_SLOTS[index % len(store.STATE_SLOTS)]
+        components.append(architecture.ArchitectureComponent(
+            component_connections=[types.ConnectionComponent(state_id, list(range(start + 2 * third, start + pixels_per_component)))],
+            ingoing_connections=[types.ConnectionComponent(state_id, list(range(start + third - 2, start + 2 * third)))],
+            outgoing_connections=[types.ConnectionComponent("general_connection", list(range(start, start + third)))],
+            name=f"component {index}"))
+    return components
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    return {
+        "mean_us": float(np.mean(samples)) * 1e6 if samples else 0.0,
+        "p50_us": percentile(samples, 0.5) * 1e6,
+        "p99_us": percentile(samples, 0.99) * 1e6,
+    }
+
+
+def benchmark_frames(nb_pixels: int, nb_components: int, nb_frames: int, state_change_interval: int) -> dict:
+    """ Render nb_frames frames, flipping one state every state_change_interval frames """
+    components = create_components(nb_components, nb_pixels)
+    compile_start = time.perf_counter()
+    plan = render_plan_compiler.compile_render_plan(components, nb_pixels)
+    compile_time = time.perf_counter() - compile_start
+
+    neopixel_client = neopixel_interface.NeopixelInterface(backends.SimulatedStripBackend(nb_pixels, history=1))
+    neopixel_client.load_plan(plan)
+    compliance_store = store.ComplianceStore(types.ComplianceState(
+        **{state_id: types.ServiceState() for state_id in store.STATE_SLOTS}))
+    samples: Dict[str, List[float]] = {phase: [] for phase in FRAME_PHASES + SHOW_CHANGES_STEPS + ("frame",)}
+    frame_period = 1 / constants.RENDER_TARGET_FPS
+
+    for frame in range(nb_frames):
+        if state_change_interval and frame % state_change_interval == 0:
+            slot = (frame // state_change_interval) % len(store.STATE_SLOTS)
+            compliance_store.set_state(slot, not compliance_store.snapshot.is_compliant(slot))
+        timestamps = [time.perf_counter()]
+        neopixel_client.update_animation(frame * frame_period)
+        timestamps.append(time.perf_counter())
+        neopixel_client.update_states(compliance_store.snapshot)
+        timestamps.append(time.perf_counter())
+        # show_changes() timed step by step, it is compose() followed by flush()
+        neopixel_client.compositor.compose(neopixel_client.frame_time)
+        timestamps.append(time.perf_counter())
+        neopixel_client.frame_buffer.flush()
+        timestamps.append(time.perf_counter())
+        for phase, start, end in zip(FRAME_PHASES[:2] + SHOW_CHANGES_STEPS, timestamps, timestamps[1:]):
+            samples[phase].append(end - start)
+        samples["show_changes"].append(timestamps[-1] - timestamps[2])
+        samples["frame"].append(timestamps[-1] - timestamps[0])
+
+    result = {
+        "pixels": nb_pixels,
+        "components": nb_components,
+        "frames": nb_frames,
+        "plan_entries": len(plan.entry_pixel),
+        "compile_ms": compile_time * 1e3,
+        "shows_skipped": neopixel_client.frame_buffer.stats.shows_skipped,
+        "table_bytes": neopixel_client.tables.stats.nb_bytes,
+    }
+    for phase, phase_samples in samples.items():
+        result[phase] = summarize(phase_samples)
+    return result
+
+
+def benchmark_mqtt(nb_messages: int) -> dict:
+    ids = list(constants.MQTT_ID_TO_STATE_MAPPING)
+    messages = mqtt_recording.generate_messages(rate=nb_messages, duration=1, ids=ids)
+    return run_mqtt_load(messages, speed=None)
+
+
+def compare(results: dict, baseline: dict, tolerance: float, min_delta_us: float = 2.0) -> List[str]:
+    """ List every p50 frame cost and the handler throughput that got worse by more than tolerance. Frame costs
+    also have to get slower by at least min_delta_us, sub-microsecond phases jitter by more than any tolerance """
+    regressions = []
+    baseline_frames = {(entry["pixels"], entry["components"]): entry for entry in baseline.get("frames", [])}
+    for entry in results["frames"]:
+        previous = baseline_frames.get((entry["pixels"], entry["components"]))
+        if previous is None:
+            continue
+        for phase in FRAME_PHASES + SHOW_CHANGES_STEPS + ("frame",):
+            # Results of older releases may not have the phase
+            if phase not in previous:
+                continue
+            before, after = previous[phase]["p50_us"], entry[phase]["p50_us"]
+            if before and after > before * (1 + tolerance) and after - before >= min_delta_us:
+                regressions.append(f"{entry['pixels']} pixels / {entry['components']} components {phase}: p50 {before:.1f}us -> {after:.1f}us")
+    before = baseline.get("mqtt", {}).get("handler_throughput_msg_per_s")
+    after = results["mqtt"]["handler_throughput_msg_per_s"]
+    if before and after < before * (1 - tolerance):
+        regressions.append(f"MQTT handler throughput: {before:.0f} -> {after:.0f} messages/s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pixels", type=int, nargs="+", default=[constants.NEOPIXEL_NB_PIXELS], help="Pixel counts to benchmark")
+    parser.add_argument("--components", type=int, nargs="+", default=[9], help="Component counts to benchmark")
+    parser.add_argument("--frames", type=int, default=2000, help="Frames rendered per configuration")
+    parser.add_argument("--state-change-interval", type=int, default=50, help="Flip one state every N frames, 0 never")
+    parser.add_argument("--messages", type=int, default=20000, help="Messages sent through the MQTT handler")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--compare", help="JSON results of a previous run to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Relative slowdown that counts as regression")
+    parser.add_argument("--min-delta", type=float, default=2.0, help="Microseconds a frame cost has to get slower by to count as regression")
+    args = parser.parse_args()
+
+    results = {
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "numpy": np.__version__,
+        "frames": [],
+    }
+    for nb_pixels in args.pixels:
+        for nb_components in args.components:
+            if nb_pixels // nb_components < 6:
+                print(f"Skipping {nb_pixels} pixels with {nb_components} components, not enough pixels per component")
+                continue
+            entry = benchmark_frames(nb_pixels, nb_components, args.frames, args.state_change_interval)
+            results["frames"].append(entry)
+            print(f"{nb_pixels} pixels, {nb_components} components: frame p50 {entry['frame']['p50_us']:.1f}us, "
+                  f"p99 {entry['frame']['p99_us']:.1f}us ("
+                  + ", ".join(f"{phase} {entry[phase]['p50_us']:.1f}us" for phase in FRAME_PHASES + SHOW_CHANGES_STEPS)
+                  + f"), animation tables {entry['table_bytes'] / 1024:.1f}KiB")
+    results["mqtt"] = benchmark_mqtt(args.messages)
+    print(f"MQTT handler: {results['mqtt']['handler_throughput_msg_per_s']:.0f} messages/s, "
+          f"p50 {results['mqtt']['handler_latency_p50_us']:.1f}us, p99 {results['mqtt']['handler_latency_p99_us']:.1f}us")
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance, args.min_delta)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
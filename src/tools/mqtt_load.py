@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+""" Offline load generator for the subscribe path.
+
+Feeds recorded or synthetic aws/bulb/<id> messages or batches through MqttClientInterface._on_publish_received
+using a local stand-in for the awscrt client, and measures handler throughput and the latency from
+message to composited LED frame.
+
+    python -m src.tools.mqtt_load replay logs/messages.bin --speed 10
+    python -m src.tools.mqtt_load generate --rate 5000 --duration 2 --speed max
+    python -m src.tools.mqtt_load generate --rate 1000 --duration 2 --batch
+"""
+import argparse
+import time
+from typing import List
+
+import numpy as np
+
+import src.architecture.component as architecture
+import src.interfaces.mqtt as mqtt_interface
+import src.interfaces.mqtt_loopback as mqtt_loopback
+import src.interfaces.mqtt_recording as mqtt_recording
+import src.render.compositor as compositor
+import src.render.effects as effects
+import src.render.plan as render_plan_compiler
+import src.state.coalescer as coalescer
+import src.state.store as store
+import src.utils.constants as constants
+import src.utils.types as types
+
+PIXELS_PER_STATE = 4
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def create_compositor() -> compositor.FrameCompositor:
+    """ Compositor for a synthetic board with one component per state that can be reached over MQTT """
+    components = [
+        architecture.ArchitectureComponent(
+            component_connections=[types.ConnectionComponent(state_id, list(range(index * PIXELS_PER_STATE, (index + 1) * PIXELS_PER_STATE)))],
+            ingoing_connections=[],
+            outgoing_connections=[],
+            name=state_id)
+        for index, state_id in enumerate(constants.MQTT_ID_TO_STATE_MAPPING.values())]
+    nb_pixels = len(components) * PIXELS_PER_STATE
+    frame_compositor = compositor.FrameCompositor(np.zeros((nb_pixels, 3), dtype=np.uint8), effects.EffectEvaluator(np.linspace(0, 1, 16)))
+    frame_compositor.load_plan(render_plan_compiler.compile_render_plan(components, nb_pixels))
+    return frame_compositor
+
+
+def run(messages: List[types.RecordedMessage], speed, settle_window: float = 0.0) -> dict:
+    compliance_store = store.ComplianceStore(types.ComplianceState(
+        **{state_id: types.ServiceState() for state_id in store.STATE_SLOTS}))
+    state_coalescer = coalescer.StateCoalescer(compliance_store, settle_window)
+    mqtt_client = mqtt_interface.MqttClientInterface(
+        state_coalescer,
+        types.MqttClientOption(endpoint="loopback", port=0, cert_filepath="", pri_key_filepath="", client_id="mqtt-load"),
+        constants.MQTT_CLIENT_SUBSCRIPTION_TOPIC,
+        batch_topic=constants.MQTT_CLIENT_BATCH_TOPIC,
+        client_builder=mqtt_loopback.loopback_client_builder)
+    mqtt_client.connect()
+    frame_compositor = create_compositor()
+    frame_compositor.set_states(compliance_store.snapshot)
+
+    handler_latencies: List[float] = []
+    led_latencies: List[float] = []
+
+    def on_delivered(message: types.RecordedMessage, handler_time: float):
+        handler_latencies.append(handler_time)
+        render_start = time.perf_counter()
+        snapshot = state_coalescer.flush()
+        if snapshot.generation != frame_compositor.generation:
+            frame_compositor.set_states(snapshot)
+            frame_compositor.compose(0.0)
+        led_latencies.append(handler_time + time.perf_counter() - render_start)
+
+    replayer = mqtt_recording.MessageReplayer(mqtt_client.client.deliver)
+    start = time.perf_counter()
+    nb_messages = replayer.replay(messages, speed, on_delivered)
+    wall_time = time.perf_counter() - start
+
+    handler_time = sum(handler_latencies)
+    return {
+        "messages": nb_messages,
+        "state_changes": compliance_store.snapshot.generation,
+        "wall_time_s": wall_time,
+        "handler_throughput_msg_per_s": nb_messages / handler_time if handler_time else 0.0,
+        "handler_latency_p50_us": percentile(handler_latencies, 0.5) * 1e6,
+        "handler_latency_p99_us": percentile(handler_latencies, 0.99) * 1e6,
+        "message_to_led_p50_us": percentile(led_latencies, 0.5) * 1e6,
+        "message_to_led_p99_us": percentile(led_latencies, 0.99) * 1e6,
+        "coalesced_merged": state_coalescer.stats.merged,
+        "coalesced_dropped": state_coalescer.stats.dropped,
+        "batches_out_of_order": mqtt_client.stats.batches_out_of_order,
+    }
+
+
+def parse_speed(value: str):
+    return None if value == "max" else float(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    replay_parser = subparsers.add_parser("replay", help="Replay a log written by the message recorder")
+    replay_parser.add_argument("log", help="Path of the message log")
+    generate_parser = subparsers.add_parser("generate", help="Generate a synthetic burst of messages")
+    generate_parser.add_argument("--rate", type=float, default=1000, help="Messages per second")
+    generate_parser.add_argument("--duration", type=float, default=5, help="Seconds the burst lasts")
+    generate_parser.add_argument("--ids", type=int, nargs="+", default=list(constants.MQTT_ID_TO_STATE_MAPPING), help="Bulb ids to send to")
+    generate_parser.add_argument("--batch", action="store_true", help="Send every message as one batch of all ids on the batch topic")
+    generate_parser.add_argument("--save", help="Also write the generated messages to this log")
+    for subparser in (replay_parser, generate_parser):
+        subparser.add_argument("--speed", type=parse_speed, default=1.0, help="1 for real time, N for N times faster, max for no waiting")
+        subparser.add_argument("--settle-window", type=float, default=0.0, help="Settle window of the state coalescer in seconds")
+    args = parser.parse_args()
+
+    if args.command == "replay":
+        messages = list(mqtt_recording.read_messages(args.log))
+    else:
+        if args.batch:
+            messages = mqtt_recording.generate_batch_messages(args.rate, args.duration, args.ids, constants.MQTT_CLIENT_BATCH_TOPIC)
+        else:
+            messages = mqtt_recording.generate_messages(args.rate, args.duration, args.ids)
+        if args.save:
+            recorder = mqtt_recording.MessageRecorder(args.save)
+            for message in messages:
+                recorder.record(message.topic, message.payload, message.timestamp)
+            recorder.close()
+
+    for name, value in run(messages, args.speed, args.settle_window).items():
+        print(f"{name}: {value:.2f}" if isinstance(value, float) else f"{name}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+""" Replays a session saved by the session recorder frame by frame.
+
+Every frame is rendered again from its recorded inputs (elapsed time, compliance and connection), so
+the animations look exactly as they did on the board. Frames that are still in the recorded ring
+buffer are compared against the replayed ones. The events (compliance changes, button presses,
+connection changes) are printed at the frame they happened before.
+
+    python -m src.tools.replay sessions/kitty-20261018-140000.npz --events
+    python -m src.tools.replay sessions/kitty-20261018-140000.npz --terminal --speed 1
+    python -m src.tools.replay sessions/kitty-20261018-140000.npz --start 600 --end 900 --png rds.png
+
+The gamma, brightness, power budget and animation defaults are the ones the session was recorded with,
+so changed settings in src/utils/constants.py do not show up as differences.
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+import src.architecture.topology as topology
+import src.interfaces.backends as backends
+import src.main as kitty
+import src.render.plan as render_plan_compiler
+import src.render.recorder as recorder
+
+
+def parse_speed(value: str):
+    return None if value == "max" else float(value)
+
+
+def format_time(session, frame_time: float) -> str:
+    started_at = session.meta.get("started_at")
+    if started_at is None:
+        return f"{frame_time:9.3f}s"
+    return datetime.fromtimestamp(started_at + frame_time).strftime("%H:%M:%S.%f")[:-3]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("session", help="Path of the saved session")
+    parser.add_argument("--start", type=int, default=0, help="First frame to replay")
+    parser.add_argument("--end", type=int, help="Frame to stop before, default is the last one")
+    parser.add_argument("--speed", type=parse_speed, default="max", help="1 for real time, N for N times faster, max for no waiting")
+    parser.add_argument("--terminal", action="store_true", help="Draw the replayed stripe in the terminal")
+    parser.add_argument("--png", help="Write the shown frames as image, one row per frame")
+    parser.add_argument("--events", action="store_true", help="Print the events of the session")
+    parser.add_argument("--topology", help="Topology file to render with, default is the one the session was recorded with")
+    parser.add_argument("--cache-dir", default=os.path.join(tempfile.gettempdir(), "kitty-replay"),
+                        help="Directory the compiled render plan is cached in, default is a temporary directory")
+    args = parser.parse_args()
+
+    session = recorder.load_session(args.session)
+    nb_pixels = session.meta["nb_pixels"]
+    end = len(session.records) if args.end is None else min(args.end, len(session.records))
+    board_plan = topology.load_render_plan(args.topology or session.meta["topology"], nb_pixels, args.cache_dir)
+    connecting_plan = render_plan_compiler.compile_status_plan(nb_pixels)
+    backend = backends.SimulatedStripBackend(nb_pixels, history=max(1, end - args.start), render_terminal=args.terminal, render_interval=0)
+    render_settings = session.meta.get("render")
+    if render_settings is None:
+        print("The session has no render settings, rendering with the current ones of src/utils/constants.py")
+        render_settings = kitty.create_render_settings()
+    neopixel_client = kitty.create_neopixel_client(backend, render_settings)
+    events = {}
+    for event in session.events:
+        events.setdefault(event.frame_index, []).append(event)
+    print(f"Session of {session.meta.get('board')}: {len(session.records)} frames, {len(session.frames)} of them shown "
+          f"frames still recorded, {len(session.events)} events")
+
+    # The terminal stripe is drawn without a line break, messages start on a new line
+    newline = "\n" if args.terminal else ""
+    loaded_plan = None
+    verified = mismatches = 0
+    replay_start = time.monotonic()
+    first_frame_time = None
+    for index, record, snapshot in recorder.session_frames(session, args.start, end):
+        frame_time = float(record["frame_time"])
+        if args.events:
+            for event in events.get(index, ()):
+                print(f"{newline}{format_time(session, frame_time)} frame {index:6d} {event.kind} {event.data}")
+        if args.speed is not None:
+            first_frame_time = frame_time if first_frame_time is None else first_frame_time
+            wait = (frame_time - first_frame_time) / args.speed - (time.monotonic() - replay_start)
+            if wait > 0:
+                time.sleep(wait)
+
+        plan = board_plan if record["connected"] else connecting_plan
+        if plan is not loaded_plan:
+            neopixel_client.load_plan(plan)
+            loaded_plan = plan
+        neopixel_client.update_animation(frame_time)
+        neopixel_client.update_states(snapshot)
+        neopixel_client.show_changes()
+        recorded = session.frames.get(index)
+        if recorded is not None:
+            verified += 1
+            if not np.array_equal(recorded, neopixel_client.frame_buffer.output):
+                mismatches += 1
+                print(f"{newline}Frame {index} differs from the recorded one in {int((recorded != neopixel_client.frame_buffer.output).any(axis=1).sum())} pixels")
+
+    if args.events and end == len(session.records):
+        for event in events.get(end, ()):
+            print(f"{newline}{' ' * 12} after the last frame {event.kind} {event.data}")
+    print(f"{newline}Replayed {end - args.start} frames, {verified} compared with the recording, {mismatches} differ")
+    if args.png:
+        backend.save_png(args.png)
+        print(f"Wrote {min(backend.nb_shown, backend.history)} shown frames to {args.png}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import json
+import logging
+import os
+import time
+from dataclasses import asdict
+from typing import List, Optional, Tuple
+
+import src.utils.types as types
+
+logger = logging.getLogger(__name__)
+
+
+def read_uptime() -> Optional[float]:
+    """ Seconds since the system booted, on the Raspberry Pi the time since power on. None without /proc """
+    try:
+        with open("/proc/uptime") as file:
+            return float(file.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def read_process_start() -> Optional[float]:
+    """ Seconds after the system boot the current process was started, None without /proc """
+    try:
+        with open("/proc/self/stat") as file:
+            # The command name in parentheses may contain spaces, the fields after it are fixed
+            fields = file.read().rsplit(")", 1)[1].split()
+        return int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class BootProfiler():
+    def __init__(self, metrics_filepath: Optional[str] = None):
+        """ Measures the phases of the startup from the start of the process to the first frame and the first connection.
+        Create it first thing in main(), the time before is reported as the interpreter and import phase
+
+        metrics_filepath (str): File every report is appended to as one JSON line, None to only print it
+        """
+        self.metrics_filepath = metrics_filepath
+        self.phases: List[Tuple[str, float]] = []
+        self.process_start = read_process_start()
+        self.power_on_to_first_frame: Optional[float] = None
+        self.power_on_to_connected: Optional[float] = None
+        self.completed = False
+        self._start = time.monotonic()
+        self._last = self._start
+        uptime = read_uptime()
+        if uptime is not None and self.process_start is not None:
+            self.phases.append(("interpreter and imports", uptime - self.process_start))
+
+    def mark(self, phase: str) -> float:
+        """ End the phase that started with the previous mark and return its duration in seconds """
+        now = time.monotonic()
+        duration = now - self._last
+        self.phases.append((phase, duration))
+        self._last = now
+        return duration
+
+    def first_frame(self):
+        self.mark("first frame")
+        self.power_on_to_first_frame = read_uptime()
+
+    def connected(self):
+        self.mark("connect")
+        self.power_on_to_connected = read_uptime()
+
+    def report(self) -> types.BootReport:
+        return types.BootReport(
+            phases=dict(self.phases),
+            process_start=self.process_start,
+            power_on_to_first_frame=self.power_on_to_first_frame,
+            power_on_to_connected=self.power_on_to_connected)
+
+    def complete(self):
+        """ Print the report and append it to the metrics file, only the first call has an effect """
+        if self.completed:
+            return
+        self.completed = True
+        report = self.report()
+        logger.info("Boot phases:")
+        for phase, duration in report.phases.items():
+            logger.info(f"  {phase:<24}{duration * 1000:8.0f}ms")
+        if report.power_on_to_first_frame is not None:
+            logger.info(f"Power on to first frame: {report.power_on_to_first_frame:.2f}s")
+        if not self.metrics_filepath:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.metrics_filepath), exist_ok=True)
+            with open(self.metrics_filepath, "a") as file:
+                file.write(json.dumps({"timestamp": time.time(), **asdict(report)}) + "\n")
+        except OSError as error:
+            logger.warning(f"Could not write the boot metrics to {self.metrics_filepath}: {error}")
@@ -1,17 +1,106 @@
 import os
-from uuid import uuid4
-import board
 
 DIR_PATH = os.path.dirname(os.path.abspath(__file__))
 CERTIFICATES_PATH = os.path.join(DIR_PATH, "certificates")
+ROOT_PATH = os.path.dirname(os.path.dirname(DIR_PATH))
+
+# Layout of the AWS architecture on the LED stripe
+TOPOLOGY_FILEPATH = os.path.join(ROOT_PATH, "src", "architecture", "topologies", "chaos_kitty.json")
+# Compiled topologies are cached here, so reboots skip validation and compilation
+TOPOLOGY_CACHE_PATH = os.path.join(ROOT_PATH, "cache")
+# Metrics in the Prometheus text format are served on http://<METRICS_HOST>:<METRICS_PORT>/metrics,
+# None disables the endpoint. The default host only accepts local connections
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9110
+# Every startup appends its boot phases and the time from power on to the first frame here, None to only print them
+BOOT_METRICS_FILEPATH = os.path.join(ROOT_PATH, "logs", "boot_metrics.jsonl")
+
+# Log records are written as JSON lines to this file by a background thread, None to not write a file
+LOG_FILEPATH = os.path.join(ROOT_PATH, "logs", "kitty.log")
+# The log file is rotated at this size in bytes, the rotated files beyond LOG_BACKUP_COUNT are deleted
+LOG_MAX_BYTES = 1024 * 1024
+LOG_BACKUP_COUNT = 3
+# Also log to stdout: True, False or None to only do it when started from a terminal
+LOG_TO_CONSOLE = None
+# Lowest level that is logged: "DEBUG", "INFO", "WARNING" or "ERROR"
+LOG_LEVEL = "INFO"
+# At most LOG_RATE_LIMIT_BURST records per line of code within LOG_RATE_LIMIT_INTERVAL seconds. Only the loggers of
+# the paths that run per message or key press are limited, all other records are always written
+LOG_RATE_LIMIT_INTERVAL = 1.0
+LOG_RATE_LIMIT_BURST = 5
+LOG_RATE_LIMITED_LOGGERS = ("src.interfaces.mqtt", "src.interfaces.publisher", "src.interfaces.input")
+# Records waiting for the writer thread, new ones are dropped while it is full
+LOG_QUEUE_SIZE = 1024
+
+# Hardware the kitty runs on: "neopixel" for the Raspberry Pi with LED stripe and GPIO button,
+# "simulated" for a stripe drawn in the terminal and a button without hardware
+HARDWARE_BACKEND = "neopixel"
 
 # Port for the button to start the game
 BUTTON_PORT = 16
+# Port of an optional second button that marks every state compliant again, None if there is none
+RESET_BUTTON_PORT = None
+
+# Local keys: "terminal" reads them from the terminal the script runs in and falls back to the global hotkeys without
+# a terminal (e.g. started by cron), "keyboard" always registers global hotkeys (needs root), None disables them.
+# SIGINT and SIGTERM always stop the script
+INPUT_KEY_SOURCE = "terminal"
+# Input event per key of the terminal, "\x11" is Ctrl+Q
+INPUT_TERMINAL_KEYS = {"\x11": "stop", "r": "reset", "s": "save", "d": "difficulty"}
+# Input event per global hotkey
+INPUT_KEYBOARD_HOTKEYS = {"ctrl+q": "stop", "ctrl+r": "reset", "ctrl+s": "save", "ctrl+d": "difficulty"}
+# Minimum seconds between two accepted input events of the same kind
+INPUT_DEBOUNCE_INTERVALS = {"button": 10.0, "reset": 1.0, "save": 1.0, "difficulty": 0.5}
+# Maximum number of input events waiting for the next frame
+INPUT_QUEUE_SIZE = 32
 
-# Port for Neopixel LED stripe
-NEOPIXEL_PORT = board.D18
+# Port for Neopixel LED stripe, name of the pin in the board module
+NEOPIXEL_PORT = "D18"
 # Number of LED pixels used for Neopixel stripe
 NEOPIXEL_NB_PIXELS = 200
+# Duration of one pulse of non-compliant components and connections in seconds
+NEOPIXEL_PULSE_PERIOD = 2.0
+# Number of intensity wheel steps the chase of outgoing connections moves per second
+NEOPIXEL_CHASE_SPEED = 20
+# Maximum number and memory in bytes of the precomputed animation tables, least recently used ones are dropped
+NEOPIXEL_TABLE_CAPACITY = 64
+NEOPIXEL_TABLE_MAX_BYTES = 4 * 1024 * 1024
+# Gamma correction of the channel values, 1 shows the colors unchanged. 2.2 matches the perceived brightness
+NEOPIXEL_GAMMA = 1.0
+# Global brightness between 0 and 1, applied by the output stage instead of the driver
+NEOPIXEL_BRIGHTNESS = 1.0
+# Current the LED stripe may draw from the 5V supply in milliamps, brighter frames are dimmed. None for no limit
+NEOPIXEL_POWER_BUDGET_MA = 3500
+# Current of one channel at full intensity and of a dark pixel in milliamps, WS2812B datasheet values
+NEOPIXEL_CHANNEL_CURRENT_MA = 20.0
+NEOPIXEL_IDLE_CURRENT_MA = 1.0
+
+# Boards driven by this process from the one MQTT subscription, each with its own compliance, topology and stripe.
+# "backend" is "neopixel", "simulated" or "wled", "port" the data pin or "host[:port]" of the WLED controller
+BOARDS = [
+    {"name": "kitty", "topology": TOPOLOGY_FILEPATH, "backend": HARDWARE_BACKEND, "port": NEOPIXEL_PORT, "nb_pixels": NEOPIXEL_NB_PIXELS},
+]
+
+# Frames per second the render loop tries to hold
+RENDER_TARGET_FPS = 60
+
+# The compliance of every board is saved to <name>.state in this directory and shown again from the first frame
+# after a restart. None to always start all compliant
+STATE_PERSISTENCE_PATH = os.path.join(ROOT_PATH, "persistence")
+# Minimum seconds between two writes and syncs of a state file, changes in between are saved together
+STATE_SYNC_INTERVAL = 1.0
+# Records after which a state file is rewritten with only the last one
+STATE_MAX_RECORDS = 4096
+
+# Every board records its last frames, their inputs and the events that caused them. The sessions are saved here
+# on the save key and on shutdown, see src/tools/replay.py. None to not record
+SESSION_RECORDING_PATH = os.path.join(ROOT_PATH, "sessions")
+# Memory of the recording per board in bytes, a quarter for the inputs of the frames and the rest for the shown frames
+SESSION_RECORDING_MAX_BYTES = 4 * 1024 * 1024
+# Number of events (compliance changes, inputs, connection changes) kept per board
+SESSION_RECORDING_MAX_EVENTS = 1024
+# Number of saved sessions kept, older ones are deleted
+SESSION_RECORDING_KEEP = 10
 
 # Mqtt client config
 MQTT_CLIENT_ENDPOINT = "a2f97hrgv6egz9-ats.iot.eu-central-1.amazonaws.com"
@@ -19,14 +108,52 @@ MQTT_CLIENT_PORT = 8883
 MQTT_CLIENT_CERT_FILEPATH = os.path.join(CERTIFICATES_PATH, "4cd4ee53ab6b0dff22c32f9acaa08221ad1dd4d58dbb34ba889b6a7f77b2b6d0-certificate.pem.crt")
 MQTT_CLIENT_PRI_KEY_FILEPATH = os.path.join(CERTIFICATES_PATH, "4cd4ee53ab6b0dff22c32f9acaa08221ad1dd4d58dbb34ba889b6a7f77b2b6d0-private.pem.key")
 MQTT_CLIENT_CLIENT_ID = f"Raspi4"
+# Use a local stand-in instead of AWS IoT Core, e.g. together with the simulated hardware backend
+MQTT_CLIENT_LOOPBACK = False
+# Seconds to wait for the connection and the subscription before the attempt is given up
+MQTT_CONNECT_TIMEOUT = 30
+# Delay before reconnecting in seconds, doubled after every failed attempt up to the maximum
+MQTT_RECONNECT_MIN_DELAY = 1.0
+MQTT_RECONNECT_MAX_DELAY = 60.0
 
 # Mqtt publish topic
 MQTT_CLIENT_PUBLISHING_TOPIC = "startChaosKitty/easy"
 MQTT_CLIENT_PUBLISHING_MESSAGE = ""
+# Topic and message that start the chaos per difficulty, the button starts the selected one and the difficulty key
+# switches to the next one
+GAME_DIFFICULTIES = {
+    "easy": (MQTT_CLIENT_PUBLISHING_TOPIC, MQTT_CLIENT_PUBLISHING_MESSAGE),
+    "medium": ("startChaosKitty/medium", MQTT_CLIENT_PUBLISHING_MESSAGE),
+    "hard": ("startChaosKitty/hard", MQTT_CLIENT_PUBLISHING_MESSAGE),
+}
+GAME_DIFFICULTY = "easy"
+# Seconds after which a game session ends even if not every injected misconfiguration was remediated
+GAME_SESSION_TIMEOUT = 1800
+# Finished game sessions and their times to remediate are stored here, None to only log them
+GAME_LEADERBOARD_FILEPATH = os.path.join(ROOT_PATH, "persistence", "leaderboard.sqlite")
+# Published after every subscription to ask the backend to send the compliance of all states again, None to rely on
+# retained messages of the aws/bulb/<id> topics
+MQTT_CLIENT_RESYNC_TOPIC = None
+MQTT_CLIENT_RESYNC_MESSAGE = ""
+# Outgoing messages wait in a bounded queue until the sender thread published them
+MQTT_PUBLISH_QUEUE_SIZE = 16
+MQTT_PUBLISH_OVERFLOW_POLICY = "drop_oldest" # or "reject_newest"
+MQTT_PUBLISH_MAX_RETRIES = 3
+MQTT_PUBLISH_PUBACK_TIMEOUT = 10
 
 # Mqtt subscription topic, + is a level 1 wildcard in mqtt
 MQTT_CLIENT_SUBSCRIPTION_TOPIC = "aws/bulb/+"
 MQTT_CLIENT_SUBSCRIPTION_PAYLOAD_COMPLIANT = 'green'
+# Topic of batches with the compliance of several states and a sequence number, applied in one step. aws/bulb/batch
+# is covered by the subscription aws/bulb/+, a topic outside of it is subscribed to separately. None to only accept aws/bulb/<id>
+MQTT_CLIENT_BATCH_TOPIC = "aws/bulb/batch"
+# Seconds a state has to settle before a received change is shown, filters green/red flaps. 0 disables it
+MQTT_STATE_SETTLE_WINDOW = 0.25
+# Print received messages, at most one per interval in seconds
+MQTT_LOG_MESSAGES = False
+MQTT_LOG_INTERVAL = 1.0
+# Append every received message to this file for replay with src.tools.mqtt_load, None to disable
+MQTT_RECORDING_FILEPATH = None
 
 # Mapping of ID of iot core messaging to aws architecture
 MQTT_ID_TO_STATE_MAPPING = {
@@ -0,0 +1,148 @@
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+
+class RateLimitFilter(logging.Filter):
+    def __init__(self,
+                 interval: float = 1.0,
+                 burst: int = 5,
+                 loggers: Iterable[str] = (),
+                 clock: Callable[[], float] = time.monotonic):
+        """ Lets at most burst records per call site of the hot path loggers through per interval, the others are
+        counted and reported with the first record of the call site in the next interval. Records of all other
+        loggers always pass
+
+        interval (float): Length of the window in seconds
+        burst (int): Number of records per call site and window
+        loggers (Iterable[str]): Names of the loggers that are limited, including their child loggers
+        clock (Callable): Monotonic clock returning seconds, injectable for deterministic runs
+        """
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        self.loggers = tuple(loggers)
+        self.clock = clock
+        # (file, line) -> [start of the window, records let through, records suppressed]
+        self._sites: Dict[Tuple[str, int], List] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not any(record.name == name or record.name.startswith(name + ".") for name in self.loggers):
+            return True
+        site = (record.pathname, record.lineno)
+        now = self.clock()
+        with self._lock:
+            window = self._sites.get(site)
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[2] if window else 0
+                self._sites[site] = [now, 1, 0]
+            elif window[1] < self.burst:
+                window[1] += 1
+                suppressed = 0
+            else:
+                window[2] += 1
+                return False
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, log_queue: queue.Queue):
+        """ Hands records to the writer thread, they are dropped instead of waiting while the queue is full """
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class StructuredFormatter(logging.Formatter):
+    """ One JSON object per line with the time, level, logger and message, the fields passed as
+    extra={"data": {...}} and the number of records suppressed by the rate limit before """
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()}
+        entry.update(getattr(record, "data", None) or {})
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            entry["suppressed"] = suppressed
+        return json.dumps(entry, default=str)
+
+
+class ConsoleFormatter(logging.Formatter):
+    """ The message followed by the fields as key=value, like the prints it replaces """
+    def format(self, record: logging.LogRecord) -> str:
+        message = record.getMessage()
+        data = getattr(record, "data", None)
+        if data:
+            message += " " + " ".join(f"{key}={value}" for key, value in data.items())
+        suppressed = getattr(record, "suppressed", 0)
+        return f"{message} ({suppressed} more suppressed)" if suppressed else message
+
+
+class LogPipeline():
+    def __init__(self,
+                 filepath: Optional[str] = None,
+                 max_bytes: int = 1024 * 1024,
+                 backup_count: int = 3,
+                 console: Optional[bool] = None,
+                 level: int = logging.INFO,
+                 rate_limit_interval: float = 1.0,
+                 rate_limit_burst: int = 5,
+                 rate_limited_loggers: Iterable[str] = (),
+                 queue_size: int = 1024):
+        """ Routes all loggers through a bounded queue to a writer thread, so the threads that log (render
+        loop, awscrt and GPIO callbacks) never wait for the SD card
+
+        filepath (str): JSON lines log file, rotated when it reaches max_bytes. None to not write a file
+        max_bytes (int): Size in bytes at which the log file is rotated
+        backup_count (int): Number of rotated log files kept, older ones are deleted
+        console (bool): Also write the messages to stdout, None to only do it when stdout is a terminal
+        level (int): Lowest level that is logged
+        rate_limit_interval (float): Window of the rate limit per call site in seconds
+        rate_limit_burst (int): Records per call site and window, the others are dropped and counted
+        rate_limited_loggers (Iterable[str]): Loggers of the hot paths the rate limit applies to, e.g. "src.interfaces.mqtt"
+        queue_size (int): Records waiting for the writer, new records are dropped while it is full
+        """
+        handlers: List[logging.Handler] = []
+        if filepath:
+            os.makedirs(os.path.dirname(filepath), exist_ok=True)
+            file_handler = logging.handlers.RotatingFileHandler(filepath, maxBytes=max_bytes, backupCount=backup_count, delay=True)
+            file_handler.setFormatter(StructuredFormatter())
+            handlers.append(file_handler)
+        if console if console is not None else sys.stdout.isatty():
+            console_handler = logging.StreamHandler(sys.stdout)
+            console_handler.setFormatter(ConsoleFormatter())
+            handlers.append(console_handler)
+
+        self.queue_handler = DroppingQueueHandler(queue.Queue(queue_size))
+        self.queue_handler.addFilter(RateLimitFilter(rate_limit_interval, rate_limit_burst, rate_limited_loggers))
+        self.listener = logging.handlers.QueueListener(self.queue_handler.queue, *handlers)
+        self.root = logging.getLogger()
+        self.root.setLevel(level)
+        self.root.addHandler(self.queue_handler)
+        self.listener.start()
+
+    @property
+    def dropped(self) -> int:
+        """ Number of records dropped because the writer fell behind """
+        return self.queue_handler.dropped
+
+    def stop(self):
+        """ Write the records that are still queued and stop the writer thread """
+        self.root.removeHandler(self.queue_handler)
+        self.listener.stop()
@@ -0,0 +1,68 @@
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Upper bounds in seconds of the histogram buckets, an implicit +Inf bucket follows the last one
+FRAME_TIME_BUCKETS = (0.0005, 0.001, 0.002, 0.004, 0.008, 0.016, 0.033, 0.066, 0.1)
+SHOW_TIME_BUCKETS = (0.0001, 0.0005, 0.001, 0.002, 0.004, 0.008, 0.016, 0.033)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram():
+    def __init__(self, buckets: Sequence[float]):
+        """ Fixed bucket histogram, observe() only increments preallocated counters. Every histogram has
+        one writer, readers may see an observation that is counted in a bucket but not yet in the sum
+
+        buckets (Sequence[float]): Sorted upper bounds of the buckets
+        """
+        self.buckets = tuple(buckets)
+        # Not cumulative, the last counter is the +Inf bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """ (upper bound, number of observations up to it) per bucket as exposed by Prometheus """
+        total = 0
+        result = []
+        for bound, count in zip([*map(format_value, self.buckets), "+Inf"], list(self.counts)):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+def format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def format_labels(labels: Optional[Dict[str, object]]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label(value)}"' for name, value in labels.items()) + "}"
+
+
+def escape_label(value: object) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_metric(name: str, kind: str, description: str,
+                  samples: Iterable[Tuple[Optional[Dict[str, object]], float]]) -> List[str]:
+    """ Lines of a counter or gauge in the Prometheus text format, one sample per label set """
+    lines = [f"# HELP {name} {description}", f"# TYPE {name} {kind}"]
+    lines.extend(f"{name}{format_labels(labels)} {format_value(value)}" for labels, value in samples)
+    return lines
+
+
+def format_histogram(name: str, description: str,
+                     samples: Iterable[Tuple[Optional[Dict[str, object]], Histogram]]) -> List[str]:
+    """ Lines of a histogram in the Prometheus text format, one histogram per label set """
+    lines = [f"# HELP {name} {description}", f"# TYPE {name} histogram"]
+    for labels, histogram in samples:
+        lines.extend(f"{name}_bucket{format_labels({**(labels or {}), 'le': bound})} {count}" for bound, count in histogram.cumulative())
+        lines.append(f"{name}_sum{format_labels(labels)} {format_value(histogram.sum)}")
+        lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+    return lines
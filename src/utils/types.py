@@ -1,6 +1,6 @@
 from enum import Enum
 from dataclasses import dataclass
-from typing import List
+from typing import Dict, List, Optional, Tuple
 
 
 @dataclass
@@ -40,17 +40,87 @@ class ComplianceState:
     # Helper connection that is not used for any specific state
     general_connection: ServiceState
 
-    _instance = None
-    
-    def __new__(cls, *args, **kwargs):
-        if not isinstance(cls._instance, cls):
-            cls._instance = super(ComplianceState, cls).__new__(cls)
-        return cls._instance
+
+@dataclass(frozen=True)
+class ComplianceSnapshot:
+    """Immutable view of the compliance of all states
+    Args:
+        generation (int): Incremented with every change of the compliance.
+        compliant_mask (int): Bit `slot` is set while the state in that slot is compliant.
+        received_at (float): Monotonic time the oldest update of this change was received at, 0 if unknown.
+    """
+    generation: int
+    compliant_mask: int
+    received_at: float = 0.0
+
+    def is_compliant(self, slot: int) -> bool:
+        return bool(self.compliant_mask >> slot & 1)
+
+
+class EffectKind(Enum):
+    """ Animation of a group of pixels """
+    # Transparent, the layers below stay visible
+    NONE = 0
+    # Black
+    OFF = 1
+    # Static color
+    SOLID = 2
+    # Static blend from color to end_color along the connection
+    GRADIENT = 3
+    # Intensity wheel moving along the connection
+    CHASE = 4
+    # Intensity of the color swelling up and down
+    PULSE = 5
+    # Color switched on and off
+    BLINK = 6
+
+
+class BlendMode(Enum):
+    """ How a layer is combined with the layers below it """
+    # Covers the layers below
+    REPLACE = 0
+    # Adds to the layers below, saturating at full intensity
+    ADD = 1
+    # Keeps the brighter value per channel
+    MAX = 2
+
+
+@dataclass(frozen=True)
+class EffectSpec:
+    """Named, parameterized effect of a connection
+    Args:
+        kind (EffectKind): Animation of the pixels.
+        color (Tuple[int, int, int]): Base color of the effect.
+        end_color (Tuple[int, int, int]): Color at the end of the connection, gradient only.
+        period (float): Duration of one pulse or blink in seconds, None for the default of the board.
+        speed (float): Intensity wheel steps the chase moves per second, None for the default of the board.
+        duty (float): Share of the period a blink is switched on.
+    """
+    kind: EffectKind
+    color: Tuple[int, int, int] = (0, 0, 0)
+    end_color: Optional[Tuple[int, int, int]] = None
+    period: Optional[float] = None
+    speed: Optional[float] = None
+    duty: float = 0.5
+
 
 @dataclass
 class ConnectionComponent:
+    """Group of pixels animated by one compliance state
+    Args:
+        state_id (str): Name of the state in ComplianceState.
+        pixels (List[int]): Pixel indices, in the direction of the animation.
+        compliant_effect (EffectSpec): Effect while the state is compliant, None for the default of the connection direction.
+        non_compliant_effect (EffectSpec): Effect while the state is non-compliant, None for the default of the connection direction.
+        layer (int): Z-order, higher layers are drawn over lower ones. Within a layer the draw order decides.
+        blend (BlendMode): How the connection is combined with the layers below it.
+    """
     state_id: str
     pixels: List[int]
+    compliant_effect: Optional[EffectSpec] = None
+    non_compliant_effect: Optional[EffectSpec] = None
+    layer: int = 0
+    blend: BlendMode = BlendMode.REPLACE
 
 
 @dataclass
@@ -69,4 +139,399 @@ class MqttClientOption:
     port: int
     cert_filepath: str
     pri_key_filepath: str
-    client_id: str
\ No newline at end of file
+    client_id: str
+
+@dataclass
+class RenderStats:
+    """Statistics collected by the render scheduler
+    Args:
+        frames_rendered (int): Number of frames rendered since the scheduler started.
+        frames_skipped (int): Number of frame slots dropped because rendering fell behind.
+        missed_deadlines (int): Number of frames that finished after their deadline.
+        achieved_fps (float): Frames per second measured over the last full second.
+        last_frame_time (float): Time in seconds it took to render the last frame.
+        average_frame_time (float): Moving average of the frame time in seconds.
+        max_frame_time (float): Longest frame time in seconds seen so far.
+    """
+    frames_rendered: int = 0
+    frames_skipped: int = 0
+    missed_deadlines: int = 0
+    achieved_fps: float = 0.0
+    last_frame_time: float = 0.0
+    average_frame_time: float = 0.0
+    max_frame_time: float = 0.0
+
+
+@dataclass
+class AnimationTableStats:
+    """Statistics of the precomputed animation tables
+    Args:
+        tables (int): Number of tables currently kept.
+        nb_bytes (int): Memory used by the kept tables in bytes.
+        hits (int): Number of lookups answered by a kept table.
+        misses (int): Number of lookups that had to build a table.
+        evictions (int): Number of tables dropped to stay within the limits.
+    """
+    tables: int = 0
+    nb_bytes: int = 0
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+
+@dataclass
+class FrameBufferStats:
+    """Statistics collected by the frame buffer in front of the LED stripe
+    Args:
+        pixel_writes (int): Number of pixels written to the driver.
+        pixel_writes_skipped (int): Number of pixel writes that were dropped because the value did not change.
+        shows (int): Number of frames pushed to the LED stripe.
+        shows_skipped (int): Number of frames not pushed because they were identical to the shown one.
+    """
+    pixel_writes: int = 0
+    pixel_writes_skipped: int = 0
+    shows: int = 0
+    shows_skipped: int = 0
+
+
+@dataclass
+class OutputStats:
+    """Statistics of the output stage in front of the LED stripe
+    Args:
+        frames (int): Number of frames that passed the output stage.
+        frames_limited (int): Number of frames dimmed to stay within the power budget.
+        last_scale (float): Factor the last frame was dimmed with, 1 if it was within the budget.
+        last_current_ma (float): Estimated current of the last frame in milliamps.
+        max_current_ma (float): Highest estimated current of a frame in milliamps.
+        last_power_w (float): Estimated power of the last frame in watts.
+    """
+    frames: int = 0
+    frames_limited: int = 0
+    last_scale: float = 1.0
+    last_current_ma: float = 0.0
+    max_current_ma: float = 0.0
+    last_power_w: float = 0.0
+
+
+class OverflowPolicy(Enum):
+    """ What a bounded queue does with a new item while it is full """
+    # Drop the oldest queued item to make room for the new one
+    DROP_OLDEST = "drop_oldest"
+    # Keep the queued items and reject the new one, the caller has to back off
+    REJECT_NEWEST = "reject_newest"
+
+
+@dataclass
+class PublisherStats:
+    """Statistics collected by the outbound publisher
+    Args:
+        enqueued (int): Number of messages accepted into the queue.
+        published (int): Number of messages acknowledged by the broker.
+        retried (int): Number of times an idempotent message was published again after a failed publish.
+        puback_timeouts (int): Number of times no PUBACK arrived in time and the same publish was waited for again.
+        failed (int): Number of messages given up after all retries.
+        dropped (int): Number of queued messages dropped to make room for newer ones or at the shutdown.
+        rejected (int): Number of new messages rejected because the queue was full.
+        queue_depth (int): Number of messages currently waiting.
+        max_queue_depth (int): Largest number of messages waiting at the same time.
+        last_puback_latency (float): Seconds between the last publish and its PUBACK.
+        max_puback_latency (float): Longest time in seconds between a publish and its PUBACK.
+        last_queue_latency (float): Seconds the last published message waited in the queue.
+    """
+    enqueued: int = 0
+    published: int = 0
+    retried: int = 0
+    puback_timeouts: int = 0
+    failed: int = 0
+    dropped: int = 0
+    rejected: int = 0
+    queue_depth: int = 0
+    max_queue_depth: int = 0
+    last_puback_latency: float = 0.0
+    max_puback_latency: float = 0.0
+    last_queue_latency: float = 0.0
+
+
+@dataclass
+class RecordedMessage:
+    """Message received from the broker, as written by the message recorder
+    Args:
+        timestamp (float): Unix time in seconds the message was received at.
+        topic (str): Topic the message was published to.
+        payload (bytes): Raw payload of the message.
+    """
+    timestamp: float
+    topic: str
+    payload: bytes
+
+
+@dataclass
+class StateBatch:
+    """Compliance of several states decoded from one batch message
+    Args:
+        sequence (int): Sequence number of the batch, counts up with every batch of the publisher.
+        restart (bool): First batch of a restarted publisher, its sequence number starts over.
+        updates (List[Tuple[int, bool]]): (slot, compliant) of every state of the batch.
+        skipped (int): Number of entries of the batch without a known state.
+    """
+    sequence: int
+    restart: bool
+    updates: List[Tuple[int, bool]]
+    skipped: int = 0
+
+
+@dataclass
+class MessageHandlerStats:
+    """Statistics collected by the MQTT receive callback
+    Args:
+        received (int): Number of received messages.
+        accepted (int): Number of messages passed on as state update, a batch counts once.
+        unknown_topic (int): Number of messages on topics without a mapped state, including malformed ones.
+        empty_payload (int): Number of messages without payload.
+        batches (int): Number of messages on the batch topic.
+        batches_malformed (int): Number of batches that could not be decoded.
+        batches_out_of_order (int): Number of batches dropped because their sequence number was not after the last one.
+        batch_states_skipped (int): Number of entries of applied batches skipped because their id is invalid or unknown.
+    """
+    received: int = 0
+    accepted: int = 0
+    unknown_topic: int = 0
+    empty_payload: int = 0
+    batches: int = 0
+    batches_malformed: int = 0
+    batches_out_of_order: int = 0
+    batch_states_skipped: int = 0
+
+
+@dataclass
+class CoalescerStats:
+    """Statistics collected by the state coalescer
+    Args:
+        received (int): Number of state updates received.
+        merged (int): Number of updates that replaced a pending update of the same state.
+        dropped (int): Number of settled updates that did not change the compliance, e.g. flaps.
+        applied (int): Number of settled updates that changed the compliance.
+    """
+    received: int = 0
+    merged: int = 0
+    dropped: int = 0
+    applied: int = 0
+
+
+@dataclass(frozen=True)
+class PersistedCompliance:
+    """Compliance loaded from the state file of a previous run
+    Args:
+        compliant_mask (int): Bit `slot` is set while the state in that slot is compliant.
+        saved_at (float): Wall clock time in seconds the compliance was saved at.
+    """
+    compliant_mask: int
+    saved_at: float
+
+
+@dataclass
+class PersistenceStats:
+    """Statistics collected by the state persistence
+    Args:
+        changes (int): Number of compliance changes handed to the persistence.
+        records (int): Number of records appended to the state file, changes between two syncs share one record.
+        syncs (int): Number of times the state file was synced to the storage.
+        compactions (int): Number of times the state file was rewritten with only the last record.
+        last_sync_time (float): Seconds the last write and sync took.
+    """
+    changes: int = 0
+    records: int = 0
+    syncs: int = 0
+    compactions: int = 0
+    last_sync_time: float = 0.0
+
+
+class InputEventKind(Enum):
+    """ Local controls that arrive on the input queue """
+    # Shut the script down, e.g. Ctrl+Q
+    STOP = "stop"
+    # The game button, publishes the button message
+    BUTTON = "button"
+    # Mark every state compliant again
+    RESET = "reset"
+    # Save the recorded session of every board
+    SAVE = "save"
+    # Switch to the next difficulty of the game
+    DIFFICULTY = "difficulty"
+
+
+@dataclass(frozen=True)
+class InputEvent:
+    """Local control posted to the input queue
+    Args:
+        kind (InputEventKind): What the control asks for.
+        source (str): Where it came from, e.g. "gpio16" or "terminal".
+        timestamp (float): Monotonic time in seconds the event was posted at.
+    """
+    kind: InputEventKind
+    source: str
+    timestamp: float
+
+
+@dataclass
+class InputStats:
+    """Statistics collected by the input queue
+    Args:
+        posted (int): Number of events posted by the input sources.
+        debounced (int): Number of events ignored because the previous one of the same kind was too recent.
+        dropped (int): Number of events dropped because the queue was full.
+        handled (int): Number of events taken from the queue by the render loop.
+    """
+    posted: int = 0
+    debounced: int = 0
+    dropped: int = 0
+    handled: int = 0
+
+
+@dataclass
+class BoardConfig:
+    """One board driven by the process, every board has its own compliance, topology and LED stripe
+    Args:
+        name (str): Name of the board in logs and metrics.
+        topology_filepath (str): Topology file of the board layout.
+        backend (str): LED stripe backend, "neopixel", "simulated" or "wled".
+        port (str): Pin of the Neopixel data line, e.g. "D18", or "host[:port]" of the WLED controller.
+        nb_pixels (int): Number of pixels of the stripe.
+    """
+    name: str
+    topology_filepath: str
+    backend: str
+    port: str
+    nb_pixels: int
+
+
+@dataclass(frozen=True)
+class SessionEvent:
+    """Event that explains the frames after it, e.g. a compliance change or a button press
+    Args:
+        frame_index (int): Index of the first frame rendered after the event.
+        kind (str): What happened, e.g. "compliance", "button" or "connected".
+        data (Dict[str, object]): Details of the event, e.g. the states that changed.
+    """
+    frame_index: int
+    kind: str
+    data: Dict[str, object]
+
+
+@dataclass
+class RecordedSession:
+    """Session saved by the session recorder
+    Args:
+        meta (Dict[str, object]): Board the session was recorded on, e.g. its name, topology and number of pixels.
+        records (np.ndarray): Inputs of every recorded frame, see recorder.FRAME_RECORD.
+        frames (Dict[int, np.ndarray]): Shown frames still in the ring buffer, by the index of the record that showed them.
+        events (List[SessionEvent]): Events of the session, oldest first.
+    """
+    meta: Dict[str, object]
+    records: object
+    frames: Dict[int, object]
+    events: List[SessionEvent]
+
+
+@dataclass
+class GameRemediation:
+    """Injected misconfiguration of one state during a game session
+    Args:
+        state_id (str): Name of the state in ComplianceState.
+        injected_after (float): Seconds from the start of the session until the state turned non-compliant.
+        remediated_after (float): Seconds from the start of the session until it was compliant again, None while it is not.
+    """
+    state_id: str
+    injected_after: float
+    remediated_after: Optional[float] = None
+
+    @property
+    def time_to_remediate(self) -> Optional[float]:
+        return None if self.remediated_after is None else self.remediated_after - self.injected_after
+
+
+@dataclass
+class GameSession:
+    """One round of the game, from the button press until every injected misconfiguration is remediated
+    Args:
+        difficulty (str): Difficulty the chaos was started with.
+        started_at (float): Unix time in seconds of the button press.
+        remediations (Dict[str, GameRemediation]): Injected misconfiguration per state.
+        duration (float): Seconds from the button press until the last remediation or the end of the session.
+        completed (bool): Whether every injected misconfiguration was remediated.
+    """
+    difficulty: str
+    started_at: float
+    remediations: Dict[str, GameRemediation]
+    duration: Optional[float] = None
+    completed: bool = False
+
+
+@dataclass(frozen=True)
+class LeaderboardEntry:
+    """Completed session on the leaderboard
+    Args:
+        session_id (int): Id of the session in the leaderboard database.
+        difficulty (str): Difficulty the session was played with.
+        started_at (float): Unix time in seconds of the button press.
+        duration (float): Seconds until every injected misconfiguration was remediated.
+        nb_injections (int): Number of injected misconfigurations.
+    """
+    session_id: int
+    difficulty: str
+    started_at: float
+    duration: float
+    nb_injections: int
+
+
+@dataclass
+class GameStats:
+    """Statistics collected by the game engine
+    Args:
+        started (int): Number of started sessions.
+        completed (int): Number of sessions in which every injected misconfiguration was remediated.
+        timed_out (int): Number of sessions that ended before everything was remediated.
+        aborted (int): Number of sessions ended by a reset.
+        injections (int): Number of states that turned non-compliant during a session.
+        remediations (int): Number of times an injected state turned compliant again.
+    """
+    started: int = 0
+    completed: int = 0
+    timed_out: int = 0
+    aborted: int = 0
+    injections: int = 0
+    remediations: int = 0
+
+
+@dataclass
+class SupervisorStats:
+    """Statistics of the supervisor of all components
+    Args:
+        time_to_first_frame (float): Seconds from the start of the supervisor until every board showed its first frame.
+        time_to_connected (float): Seconds from the start of the supervisor to the first subscription, 0 while never connected.
+        power_on_to_first_frame (float): Seconds from the boot of the system until every board showed its first frame, 0 if unknown.
+        connection_attempts (int): Number of times the MQTT client was started.
+        connections (int): Number of successful connections including the subscription.
+        connection_losses (int): Number of established connections that were lost.
+    """
+    time_to_first_frame: float = 0.0
+    time_to_connected: float = 0.0
+    power_on_to_first_frame: float = 0.0
+    connection_attempts: int = 0
+    connections: int = 0
+    connection_losses: int = 0
+
+
+@dataclass
+class BootReport:
+    """Duration of the startup phases of one run
+    Args:
+        phases (Dict[str, float]): Seconds spent per phase, in the order they happened.
+        process_start (float): Seconds from the boot of the system to the start of the process, None if unknown.
+        power_on_to_first_frame (float): Seconds from the boot of the system to the first shown frame, None if unknown.
+        power_on_to_connected (float): Seconds from the boot of the system to the first subscription, None if unknown or never connected.
+    """
+    phases: Dict[str, float]
+    process_start: Optional[float] = None
+    power_on_to_first_frame: Optional[float] = None
+    power_on_to_connected: Optional[float] = None
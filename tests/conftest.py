@@ -0,0 +1,41 @@
+import pytest
+
+import src.state.store as store
+import src.utils.types as types
+
+
+class FakeClock():
+    def __init__(self, now: float = 100.0, step: float = 0.0):
+        """ Monotonic clock that only moves when the test moves it
+
+        now (float): Seconds the clock starts at
+        step (float): Seconds the clock moves forward on every reading
+        """
+        self.now = now
+        self.step = step
+
+    def __call__(self) -> float:
+        self.now += self.step
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.now += seconds
+
+
+def compliance_snapshot(generation: int, non_compliant=()) -> types.ComplianceSnapshot:
+    """ Snapshot with every state compliant except the given state ids """
+    mask = (1 << len(store.STATE_SLOTS)) - 1
+    for state_id in non_compliant:
+        mask &= ~(1 << store.STATE_SLOT_INDEX[state_id])
+    return types.ComplianceSnapshot(generation=generation, compliant_mask=mask)
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+
+@pytest.fixture
+def compliance_store() -> store.ComplianceStore:
+    """ Store with every state compliant """
+    return store.ComplianceStore(types.ComplianceState(**{state_id: types.ServiceState() for state_id in store.STATE_SLOTS}))
@@ -0,0 +1,41 @@
+import src.tools.benchmark as benchmark
+
+
+def create_results(p50_us, throughput=100000.0, phases=None):
+    """ Benchmark results of one frame size with the same p50 for the given phases, all phases by default """
+    phases = phases or benchmark.FRAME_PHASES + benchmark.SHOW_CHANGES_STEPS + ("frame",)
+    entry = {"pixels": 200, "components": 10, **{phase: {"p50_us": p50_us.get(phase, 10.0)} for phase in phases}}
+    return {"frames": [entry], "mqtt": {"handler_throughput_msg_per_s": throughput}}
+
+
+def test_unchanged_results_pass():
+    results = create_results({})
+    assert benchmark.compare(results, results, tolerance=0.1) == []
+
+
+def test_slower_phase_is_reported():
+    regressions = benchmark.compare(create_results({"compose": 20.0}), create_results({}), tolerance=0.1)
+    assert regressions == ["200 pixels / 10 components compose: p50 10.0us -> 20.0us"]
+
+
+def test_sub_microsecond_jitter_is_ignored():
+    # 50% slower, but only by half a microsecond
+    baseline = create_results({"flush": 1.0})
+    assert benchmark.compare(create_results({"flush": 1.5}), baseline, tolerance=0.1) == []
+    assert benchmark.compare(create_results({"flush": 1.5}), baseline, tolerance=0.1, min_delta_us=0.4) != []
+
+
+def test_phases_missing_from_the_baseline_are_skipped():
+    baseline = create_results({}, phases=("update_animation", "frame"))
+    assert benchmark.compare(create_results({"compose": 50.0}), baseline, tolerance=0.1) == []
+
+
+def test_frame_sizes_missing_from_the_baseline_are_skipped():
+    baseline = create_results({})
+    baseline["frames"][0]["pixels"] = 100
+    assert benchmark.compare(create_results({"frame": 50.0}), baseline, tolerance=0.1) == []
+
+
+def test_lower_throughput_is_reported():
+    regressions = benchmark.compare(create_results({}, throughput=80000.0), create_results({}), tolerance=0.1)
+    assert regressions == ["MQTT handler throughput: 100000 -> 80000 messages/s"]
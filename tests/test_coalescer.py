@@ -0,0 +1,82 @@
+import pytest
+
+import src.state.coalescer as coalescer
+import src.state.store as store
+import src.utils.types as types
+
+SLOT = store.STATE_SLOT_INDEX["rds_db_compliant"]
+OTHER_SLOT = store.STATE_SLOT_INDEX["alb_compliant"]
+
+
+@pytest.fixture
+def state_coalescer(compliance_store, clock):
+    return coalescer.StateCoalescer(compliance_store, 0.5, clock)
+
+
+def test_update_is_applied_when_the_window_ends(state_coalescer, clock):
+    state_coalescer.set_state(SLOT, False)
+
+    clock.now += 0.4
+    assert state_coalescer.flush().is_compliant(SLOT)
+
+    clock.now += 0.1
+    snapshot = state_coalescer.flush()
+    assert not snapshot.is_compliant(SLOT)
+    assert snapshot.generation == 1
+    # Latency is measured from the first update of the window
+    assert snapshot.received_at == 100.0
+    assert state_coalescer.stats == types.CoalescerStats(received=1, applied=1)
+
+
+def test_flap_within_the_window_never_reaches_the_store(state_coalescer, clock):
+    for compliant in (False, True, False, True):
+        state_coalescer.set_state(SLOT, compliant)
+        clock.now += 0.1
+
+    clock.now += 0.5
+    snapshot = state_coalescer.flush()
+    assert snapshot.generation == 0
+    assert state_coalescer.stats == types.CoalescerStats(received=4, merged=3, dropped=1)
+
+
+def test_last_writer_of_the_window_wins(state_coalescer, clock):
+    state_coalescer.set_state(SLOT, True)
+    state_coalescer.set_state(SLOT, False)
+    state_coalescer.set_state(OTHER_SLOT, False)
+
+    clock.now += 0.5
+    snapshot = state_coalescer.flush()
+    assert not snapshot.is_compliant(SLOT)
+    assert not snapshot.is_compliant(OTHER_SLOT)
+    # Both states changed in one snapshot
+    assert snapshot.generation == 1
+
+
+def test_without_window_updates_apply_right_away(compliance_store, clock):
+    state_coalescer = coalescer.StateCoalescer(compliance_store, 0, clock)
+    assert not state_coalescer.set_state(SLOT, False).is_compliant(SLOT)
+    assert state_coalescer.set_state(SLOT, True).is_compliant(SLOT)
+    assert state_coalescer.compliance_store.snapshot.generation == 2
+
+
+def test_batch_drops_older_pending_updates(state_coalescer, clock):
+    state_coalescer.set_state(SLOT, False)
+
+    snapshot = state_coalescer.set_states([(SLOT, True), (OTHER_SLOT, False)])
+    assert snapshot.is_compliant(SLOT)
+    assert not snapshot.is_compliant(OTHER_SLOT)
+
+    # The superseded update must not flip the state back once its window ends
+    clock.now += 1.0
+    assert state_coalescer.flush() is snapshot
+    assert state_coalescer.stats.merged == 1
+
+
+def test_reset_drops_pending_updates(state_coalescer, clock):
+    state_coalescer.set_states([(SLOT, False)])
+    state_coalescer.set_state(OTHER_SLOT, False)
+
+    snapshot = state_coalescer.reset()
+    assert snapshot.is_compliant(SLOT)
+    clock.now += 1.0
+    assert state_coalescer.flush().is_compliant(OTHER_SLOT)
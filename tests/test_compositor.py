@@ -0,0 +1,123 @@
+import numpy as np
+import pytest
+
+import src.architecture.component as architecture
+import src.architecture.topology as topology
+import src.render.compositor as compositor
+import src.render.effects as effects
+import src.render.plan as render_plan_compiler
+from src.state.store import STATE_SLOTS
+import src.utils.constants as constants
+import src.utils.types as types
+from tests.conftest import compliance_snapshot
+
+GREEN = (255, 0, 0)
+RED = (0, 255, 0)
+BLUE = (0, 0, 255)
+CHASE_WHEEL = np.linspace(0, 1, 16)
+
+
+def create_compositor(connections, nb_pixels):
+    frame_compositor = compositor.FrameCompositor(np.zeros((nb_pixels, 3), dtype=np.uint8), effects.EffectEvaluator(CHASE_WHEEL))
+    frame_compositor.load_plan(render_plan_compiler.compile_render_plan([architecture.ArchitectureComponent(
+        component_connections=connections, ingoing_connections=[], outgoing_connections=[], name="test")], nb_pixels))
+    return frame_compositor
+
+
+def solid(color):
+    return types.EffectSpec(types.EffectKind.SOLID, color)
+
+
+def test_static_effects_follow_the_compliance():
+    frame_compositor = create_compositor([
+        types.ConnectionComponent("rds_db_compliant", [0, 1], solid(GREEN), solid(RED)),
+        types.ConnectionComponent("alb_compliant", [2, 3], solid(GREEN), types.EffectSpec(types.EffectKind.OFF))], 5)
+
+    frame_compositor.set_states(compliance_snapshot(1))
+    frame_compositor.compose(0.0)
+    assert frame_compositor.frame.tolist() == [list(GREEN)] * 4 + [[0, 0, 0]]
+
+    frame_compositor.set_states(compliance_snapshot(2, non_compliant=("rds_db_compliant", "alb_compliant")))
+    frame_compositor.compose(0.0)
+    assert frame_compositor.frame.tolist() == [list(RED)] * 2 + [[0, 0, 0]] * 3
+
+
+def test_higher_layers_cover_lower_ones_unless_transparent():
+    frame_compositor = create_compositor([
+        types.ConnectionComponent("rds_db_compliant", [0, 1, 2, 3], solid(GREEN), solid(GREEN)),
+        types.ConnectionComponent("alb_compliant", [1, 2], solid(BLUE), types.EffectSpec(types.EffectKind.NONE), layer=1)], 4)
+
+    frame_compositor.set_states(compliance_snapshot(1))
+    frame_compositor.compose(0.0)
+    assert frame_compositor.frame.tolist() == [list(GREEN), list(BLUE), list(BLUE), list(GREEN)]
+
+    frame_compositor.set_states(compliance_snapshot(2, non_compliant=("alb_compliant",)))
+    frame_compositor.compose(0.0)
+    assert frame_compositor.frame.tolist() == [list(GREEN)] * 4
+
+
+@pytest.mark.parametrize("blend, expected", [
+    (types.BlendMode.ADD, [255, 30, 0]),
+    (types.BlendMode.MAX, [200, 20, 0]),
+    (types.BlendMode.REPLACE, [200, 10, 0])])
+def test_blend_modes(blend, expected):
+    frame_compositor = create_compositor([
+        types.ConnectionComponent("rds_db_compliant", [0], solid((100, 20, 0)), solid((100, 20, 0))),
+        types.ConnectionComponent("alb_compliant", [0], solid((200, 10, 0)), solid((200, 10, 0)), layer=1, blend=blend)], 1)
+
+    frame_compositor.set_states(compliance_snapshot(1))
+    frame_compositor.compose(0.0)
+    assert frame_compositor.frame[0].tolist() == expected
+
+
+def test_blink_switches_with_the_frame_time():
+    blink = types.EffectSpec(types.EffectKind.BLINK, RED, period=1.0, duty=0.25)
+    frame_compositor = create_compositor([types.ConnectionComponent("rds_db_compliant", [0, 1], blink, blink)], 2)
+    frame_compositor.set_states(compliance_snapshot(1))
+
+    for frame_time, color in ((0.1, RED), (0.3, (0, 0, 0)), (1.2, RED), (1.9, (0, 0, 0))):
+        frame_compositor.compose(frame_time)
+        assert frame_compositor.frame.tolist() == [list(color)] * 2, frame_time
+
+
+def test_chase_moves_along_the_connection():
+    chase = types.EffectSpec(types.EffectKind.CHASE, GREEN, speed=4)
+    frame_compositor = create_compositor([types.ConnectionComponent("rds_db_compliant", [4, 3, 2, 1, 0], chase, chase)], 5)
+    frame_compositor.set_states(compliance_snapshot(1))
+
+    frame_compositor.compose(2.5)
+    # 10 steps in, the first pixel of the connection shows wheel entry 10, the ones behind it the entries before
+    step = 10
+    expected = [(np.array(GREEN) * CHASE_WHEEL[(step - position) % len(CHASE_WHEEL)]).astype(np.uint8).tolist()
+                for position in range(5)]
+    assert frame_compositor.frame[[4, 3, 2, 1, 0]].tolist() == expected
+
+
+def test_repeated_snapshot_keeps_the_frame():
+    frame_compositor = create_compositor([types.ConnectionComponent("rds_db_compliant", [0], solid(GREEN), solid(RED))], 1)
+    frame_compositor.set_states(compliance_snapshot(1))
+    frame_compositor.frame[0] = BLUE
+    # Same generation, the static pixels are not drawn again
+    frame_compositor.set_states(compliance_snapshot(1, non_compliant=("rds_db_compliant",)))
+    assert frame_compositor.frame[0].tolist() == list(BLUE)
+
+
+def test_incremental_frames_match_a_fresh_compositor(tmp_path):
+    """ Frames composed after a series of compliance changes are exactly the frames of a compositor that only
+    ever saw the last snapshot, for the shipped topology """
+    plan = topology.load_render_plan(constants.TOPOLOGY_FILEPATH, constants.NEOPIXEL_NB_PIXELS, str(tmp_path))
+    evaluator = effects.EffectEvaluator(CHASE_WHEEL)
+    running = compositor.FrameCompositor(np.zeros((plan.nb_pixels, 3), dtype=np.uint8), evaluator)
+    running.load_plan(plan)
+    random = np.random.default_rng(7)
+
+    for generation in range(1, 40):
+        current = types.ComplianceSnapshot(generation=generation, compliant_mask=int(random.integers(0, 1 << len(STATE_SLOTS))))
+        running.set_states(current)
+        fresh = compositor.FrameCompositor(np.zeros((plan.nb_pixels, 3), dtype=np.uint8), evaluator)
+        fresh.load_plan(plan)
+        fresh.set_states(current)
+        for frame_time in random.uniform(0, 30, size=3):
+            running.compose(frame_time)
+            fresh.compose(frame_time)
+            assert np.array_equal(running.frame, fresh.frame), (generation, frame_time)
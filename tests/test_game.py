@@ -0,0 +1,103 @@
+import pytest
+
+import src.game.engine as engine
+import src.game.leaderboard as leaderboard
+import src.utils.types as types
+from tests.conftest import compliance_snapshot
+
+DIFFICULTIES = {"easy": ("chaos/start", "easy"), "hard": ("chaos/start", "hard")}
+
+
+@pytest.fixture
+def game_engine(clock):
+    game_engine = engine.GameEngine(DIFFICULTIES, timeout=600, clock=clock, wall_clock=lambda: 1700000000.0)
+    game_engine.update(compliance_snapshot(0))
+    return game_engine
+
+
+def update(game_engine, clock, generation, non_compliant=()):
+    snapshot = compliance_snapshot(generation, non_compliant)
+    return game_engine.update(types.ComplianceSnapshot(snapshot.generation, snapshot.compliant_mask, received_at=clock.now))
+
+
+def test_session_completes_once_every_injection_is_remediated(game_engine, clock):
+    game_engine.start()
+    clock.now += 5
+    assert update(game_engine, clock, 1, ("rds_db_compliant", "alb_compliant")) is None
+    clock.now += 30
+    assert update(game_engine, clock, 2, ("alb_compliant",)) is None
+    clock.now += 10
+    session = update(game_engine, clock, 3)
+
+    assert session.completed
+    assert session.duration == 45
+    assert {state_id: remediation.time_to_remediate for state_id, remediation in session.remediations.items()} == {
+        "rds_db_compliant": 30, "alb_compliant": 40}
+    assert game_engine.session is None
+    assert game_engine.stats.completed == 1
+
+
+def test_changes_without_a_session_are_ignored(game_engine, clock):
+    assert update(game_engine, clock, 1, ("rds_db_compliant",)) is None
+    game_engine.start()
+    assert update(game_engine, clock, 2) is None
+    assert game_engine.session.remediations == {}
+
+
+def test_session_expires_after_the_timeout(game_engine, clock):
+    game_engine.start()
+    update(game_engine, clock, 1, ("rds_db_compliant",))
+    clock.now += 599
+    assert game_engine.expire() is None
+    clock.now += 1
+    session = game_engine.expire()
+    assert not session.completed
+    assert game_engine.stats.timed_out == 1
+
+
+def test_new_session_replaces_the_running_one(game_engine, clock):
+    first = game_engine.start()
+    game_engine.next_difficulty()
+    second = game_engine.start()
+
+    assert first is not second
+    assert not first.completed
+    assert game_engine.session is second
+    assert second.difficulty == "hard"
+    assert game_engine.stats.started == 2
+    assert game_engine.stats.aborted == 1
+    assert game_engine.message == ("chaos/start", "hard")
+
+
+def create_session(difficulty, duration, completed=True):
+    return types.GameSession(difficulty=difficulty, started_at=1700000000.0, remediations={
+        "rds_db_compliant": types.GameRemediation("rds_db_compliant", injected_after=1.0, remediated_after=duration)},
+        duration=duration, completed=completed)
+
+
+@pytest.fixture
+def game_leaderboard(tmp_path):
+    game_leaderboard = leaderboard.Leaderboard(str(tmp_path / "game" / "leaderboard.sqlite"))
+    yield game_leaderboard
+    game_leaderboard.close()
+
+
+def test_sessions_are_ranked_by_duration_and_ties_share_the_place(game_leaderboard):
+    ids = {name: game_leaderboard.add_session(session).result() for name, session in {
+        "slow": create_session("easy", 90.0),
+        "fast": create_session("easy", 30.0),
+        "tie": create_session("easy", 60.0),
+        "other_tie": create_session("easy", 60.0),
+        "timed_out": create_session("easy", 10.0, completed=False),
+        "other_difficulty": create_session("hard", 5.0)}.items()}
+
+    ranks = {name: game_leaderboard.rank(session_id).result() for name, session_id in ids.items()}
+    assert ranks == {"slow": 4, "fast": 1, "tie": 2, "other_tie": 2, "timed_out": None, "other_difficulty": 1}
+    assert [entry.duration for entry in game_leaderboard.top("easy").result()] == [30.0, 60.0, 60.0, 90.0]
+    assert game_leaderboard.top("easy", limit=1).result()[0].session_id == ids["fast"]
+
+
+def test_best_remediation_per_state(game_leaderboard):
+    for duration in (90.0, 30.0):
+        game_leaderboard.add_session(create_session("easy", duration))
+    assert game_leaderboard.best_remediations().result() == {"rds_db_compliant": 29.0}
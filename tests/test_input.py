@@ -0,0 +1,70 @@
+import io
+
+import pytest
+
+import src.interfaces.input as input_interface
+import src.utils.types as types
+
+BUTTON = types.InputEventKind.BUTTON
+RESET = types.InputEventKind.RESET
+STOP = types.InputEventKind.STOP
+
+
+@pytest.fixture
+def input_queue(clock):
+    return input_interface.InputQueue(input_interface.DebouncePolicy({BUTTON: 10.0, RESET: 1.0}), max_size=3, clock=clock)
+
+
+def test_press_within_the_interval_is_debounced(input_queue, clock):
+    assert input_queue.post(BUTTON, "gpio")
+    clock.now += 9.9
+    assert not input_queue.post(BUTTON, "gpio")
+    clock.now += 0.1
+    assert input_queue.post(BUTTON, "gpio")
+    assert input_queue.stats.debounced == 1
+
+
+def test_debounced_press_does_not_extend_the_interval(input_queue, clock):
+    input_queue.post(BUTTON, "gpio")
+    for _ in range(5):
+        clock.now += 3
+        input_queue.post(BUTTON, "gpio")
+    # The interval starts at the last accepted press, so the press at 112 is accepted although 109 was debounced
+    assert [event.timestamp for event in input_queue.drain()] == [100.0, 112.0]
+
+
+def test_kinds_are_debounced_independently(input_queue):
+    assert input_queue.post(BUTTON, "gpio")
+    assert input_queue.post(RESET, "terminal")
+    assert not input_queue.post(RESET, "terminal")
+    assert [event.kind for event in input_queue.drain()] == [BUTTON, RESET]
+    # Kinds without an interval are never debounced
+    assert input_queue.post(STOP, "terminal")
+    assert input_queue.post(STOP, "keyboard")
+
+
+def test_drain_takes_the_events_in_order(input_queue):
+    input_queue.post(RESET, "terminal")
+    input_queue.post(BUTTON, "gpio")
+    assert [event.kind for event in input_queue.drain()] == [RESET, BUTTON]
+    assert input_queue.drain() == []
+    assert input_queue.stats.handled == 2
+
+
+def test_full_queue_drops_the_oldest_event(input_queue):
+    for source in ("a", "b", "c", "d"):
+        input_queue.post(STOP, source)
+    assert [event.source for event in input_queue.drain()] == ["b", "c", "d"]
+    assert input_queue.stats == types.InputStats(posted=4, dropped=1, handled=3)
+
+
+def test_callback_posts_the_kind(input_queue):
+    input_queue.callback(BUTTON, "gpio17")(17)
+    event, = input_queue.drain()
+    assert (event.kind, event.source) == (BUTTON, "gpio17")
+
+
+def test_terminal_source_without_a_terminal_does_nothing(input_queue):
+    source = input_interface.TerminalInputSource(input_queue, {"\x11": STOP}, stream=io.StringIO())
+    assert source.fd is None
+    source.cleanup()
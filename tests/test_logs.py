@@ -0,0 +1,50 @@
+import json
+import logging
+
+import src.utils.logs as logs
+
+
+def create_record(name="src.interfaces.mqtt", lineno=10, level=logging.INFO):
+    return logging.LogRecord(name, level, "mqtt.py", lineno, "Received message", None, None)
+
+
+def filter_records(rate_limit_filter, records):
+    return [rate_limit_filter.filter(record) for record in records]
+
+
+def test_hot_path_call_site_is_limited_per_interval(clock):
+    rate_limit_filter = logs.RateLimitFilter(interval=1.0, burst=2, loggers=["src.interfaces.mqtt"], clock=clock)
+    assert filter_records(rate_limit_filter, [create_record() for _ in range(5)]) == [True, True, False, False, False]
+    # Another call site of the same logger has its own budget
+    assert rate_limit_filter.filter(create_record(lineno=20))
+
+    clock.now += 1.0
+    record = create_record()
+    assert rate_limit_filter.filter(record)
+    assert record.suppressed == 3
+
+
+def test_child_loggers_are_limited_too(clock):
+    rate_limit_filter = logs.RateLimitFilter(burst=1, loggers=["src.interfaces"], clock=clock)
+    assert filter_records(rate_limit_filter, [create_record("src.interfaces.publisher") for _ in range(2)]) == [True, False]
+    # Only the logger and its children, not every logger sharing the prefix
+    assert filter_records(rate_limit_filter, [create_record("src.interfaces_other") for _ in range(2)]) == [True, True]
+
+
+def test_other_loggers_are_never_limited(clock):
+    rate_limit_filter = logs.RateLimitFilter(burst=1, loggers=["src.interfaces.mqtt"], clock=clock)
+    # Summaries log many lines from one call site and errors must never be lost
+    assert all(filter_records(rate_limit_filter, [create_record("src.supervisor") for _ in range(10)]))
+    assert all(filter_records(rate_limit_filter, [create_record("src.main", level=logging.ERROR) for _ in range(10)]))
+
+
+def test_structured_formatter_writes_the_data_and_suppressed_records():
+    record = create_record()
+    record.data = {"topic": "aws/bulb/31"}
+    record.suppressed = 4
+    entry = json.loads(logs.StructuredFormatter().format(record))
+    assert entry["logger"] == "src.interfaces.mqtt"
+    assert entry["message"] == "Received message"
+    assert entry["topic"] == "aws/bulb/31"
+    assert entry["suppressed"] == 4
+    assert logs.ConsoleFormatter().format(record) == "Received message topic=aws/bulb/31 (4 more suppressed)"
@@ -0,0 +1,59 @@
+import urllib.error
+import urllib.request
+
+import pytest
+
+import src.interfaces.metrics as metrics_interface
+import src.utils.metrics as metrics
+
+
+def test_counter_with_and_without_labels():
+    assert metrics.format_metric("kitty_frames_total", "counter", "Frames rendered.", [(None, 3), ({"board": "kitty"}, 2.5)]) == [
+        "# HELP kitty_frames_total Frames rendered.",
+        "# TYPE kitty_frames_total counter",
+        "kitty_frames_total 3",
+        'kitty_frames_total{board="kitty"} 2.5']
+
+
+def test_label_values_are_escaped():
+    assert metrics.format_labels({"board": 'a"b\\c\nd', "slot": 3}) == '{board="a\\"b\\\\c\\nd",slot="3"}'
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = metrics.Histogram((0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value)
+    assert metrics.format_histogram("kitty_seconds", "Durations.", [({"board": "kitty"}, histogram)])[2:] == [
+        'kitty_seconds_bucket{board="kitty",le="0.1"} 2',
+        'kitty_seconds_bucket{board="kitty",le="1.0"} 3',
+        'kitty_seconds_bucket{board="kitty",le="+Inf"} 4',
+        'kitty_seconds_sum{board="kitty"} 2.65',
+        'kitty_seconds_count{board="kitty"} 4']
+
+
+@pytest.fixture
+def metrics_server():
+    metrics_server = metrics_interface.MetricsServer(port=0)
+    metrics_server.start(lambda: "kitty_up 1\n")
+    yield metrics_server
+    metrics_server.stop()
+
+
+def get(metrics_server, path):
+    url = f"http://127.0.0.1:{metrics_server._server.server_port}{path}"
+    with urllib.request.urlopen(url, timeout=5) as response:
+        return response.headers["Content-Type"], response.read().decode("utf-8")
+
+
+def test_server_serves_the_collected_metrics(metrics_server):
+    content_type, body = get(metrics_server, "/metrics")
+    assert content_type.startswith("text/plain; version=0.0.4")
+    assert body == "kitty_up 1\n"
+    assert metrics_server.requests == 1
+
+
+def test_server_only_serves_metrics(metrics_server):
+    with pytest.raises(urllib.error.HTTPError) as error:
+        get(metrics_server, "/")
+    assert error.value.code == 404
+    assert metrics_server.requests == 0
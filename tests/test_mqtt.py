@@ -0,0 +1,83 @@
+import pytest
+
+import src.interfaces.mqtt as mqtt
+import src.interfaces.mqtt_batch as mqtt_batch
+import src.interfaces.mqtt_loopback as mqtt_loopback
+import src.state.store as store
+import src.utils.constants as constants
+import src.utils.types as types
+
+# aws/bulb/36 and aws/bulb/38
+SLOT = store.STATE_SLOT_INDEX["rds_db_compliant"]
+OTHER_SLOT = store.STATE_SLOT_INDEX["s3_bucket_compliant"]
+
+
+@pytest.fixture
+def mqtt_client(compliance_store):
+    mqtt_client = mqtt.MqttClientInterface(
+        compliance_store,
+        types.MqttClientOption("localhost", 8883, "", "", "test"),
+        "aws/bulb/+",
+        batch_topic="aws/bulb/batch",
+        client_builder=mqtt_loopback.loopback_client_builder)
+    mqtt_client.connect()
+    yield mqtt_client
+    mqtt_client.cleanup()
+
+
+def test_state_messages_update_the_store(mqtt_client, compliance_store):
+    mqtt_client.client.deliver("aws/bulb/36", b"red")
+    assert not compliance_store.snapshot.is_compliant(SLOT)
+    mqtt_client.client.deliver("aws/bulb/36", constants.MQTT_CLIENT_SUBSCRIPTION_PAYLOAD_COMPLIANT.encode("utf-8"))
+    assert compliance_store.snapshot.is_compliant(SLOT)
+    assert compliance_store.snapshot.generation == 2
+    assert mqtt_client.stats.accepted == 2
+    assert mqtt_client.topic_messages["aws/bulb/36"] == 2
+
+
+def test_unknown_topics_and_empty_payloads_are_counted(mqtt_client, compliance_store):
+    for topic in ("aws/bulb/99", "aws/bulb/kitty", "aws/bulb/"):
+        mqtt_client.client.deliver(topic, b"red")
+    mqtt_client.client.deliver("aws/bulb/36", b"")
+    assert mqtt_client.stats.unknown_topic == 3
+    assert mqtt_client.stats.empty_payload == 1
+    assert mqtt_client.stats.accepted == 0
+    assert compliance_store.snapshot.generation == 0
+
+
+def test_batch_is_applied_in_one_step(mqtt_client, compliance_store):
+    mqtt_client.client.deliver("aws/bulb/batch", mqtt_batch.encode_batch(1, {36: False, 38: False, 63: True}))
+    snapshot = compliance_store.snapshot
+    assert snapshot.generation == 1
+    assert not snapshot.is_compliant(SLOT)
+    assert not snapshot.is_compliant(OTHER_SLOT)
+    assert mqtt_client.stats.batch_states_skipped == 1
+
+
+def test_older_and_repeated_batches_are_dropped(mqtt_client, compliance_store):
+    mqtt_client.client.deliver("aws/bulb/batch", mqtt_batch.encode_batch(5, {36: False}))
+    mqtt_client.client.deliver("aws/bulb/batch", mqtt_batch.encode_batch(5, {36: True}))
+    mqtt_client.client.deliver("aws/bulb/batch", mqtt_batch.encode_batch(4, {36: True}))
+    assert not compliance_store.snapshot.is_compliant(SLOT)
+    assert mqtt_client.stats.batches_out_of_order == 2
+
+
+def test_sequence_is_kept_across_reconnects(mqtt_client, compliance_store):
+    mqtt_client.client.deliver("aws/bulb/batch", mqtt_batch.encode_batch(5, {36: False}))
+    mqtt_client.client.drop_connection()
+    mqtt_client.client.start()
+    mqtt_client.subscribe_async().result(1)
+
+    # Delivered again by the broker after the reconnect
+    mqtt_client.client.deliver("aws/bulb/batch", mqtt_batch.encode_batch(4, {36: True}))
+    assert not compliance_store.snapshot.is_compliant(SLOT)
+    # A restarted publisher starts its sequence again
+    mqtt_client.client.deliver("aws/bulb/batch", mqtt_batch.encode_batch(0, {36: True}, restart=True))
+    assert compliance_store.snapshot.is_compliant(SLOT)
+    assert mqtt_client.batch_sequence == 0
+
+
+def test_malformed_batch_is_counted(mqtt_client, compliance_store):
+    mqtt_client.client.deliver("aws/bulb/batch", b'{"seq": 1, "restart": 1, "states": {}}')
+    assert mqtt_client.stats.batches_malformed == 1
+    assert compliance_store.snapshot.generation == 0
@@ -0,0 +1,86 @@
+import json
+
+import pytest
+
+import src.interfaces.mqtt_batch as mqtt_batch
+import src.utils.types as types
+
+ID_TO_SLOT = {31: 0, 32: 1, 38: 7}
+
+
+def create_decoder():
+    return mqtt_batch.BatchDecoder(ID_TO_SLOT, "green")
+
+
+@pytest.mark.parametrize("sequence, last_sequence, newer", [
+    (1, None, True),
+    (8, 7, True),
+    (7, 7, False),
+    (6, 7, False),
+    # Wrapped around
+    (0, mqtt_batch.SEQUENCE_MODULO - 1, True),
+    (3, mqtt_batch.SEQUENCE_MODULO - 2, True),
+    (mqtt_batch.SEQUENCE_MODULO - 1, 0, False),
+    # More than half the range ahead counts as older
+    (mqtt_batch.SEQUENCE_MODULO // 2 + 7, 7, False),
+    (mqtt_batch.SEQUENCE_MODULO // 2 + 6, 7, True)])
+def test_is_newer_sequence(sequence, last_sequence, newer):
+    assert mqtt_batch.is_newer_sequence(sequence, last_sequence) is newer
+
+
+def test_binary_batch_roundtrip():
+    payload = mqtt_batch.encode_batch(mqtt_batch.SEQUENCE_MODULO + 5, {31: True, 32: False, 38: True})
+    batch = create_decoder().decode(payload)
+    assert batch.sequence == 5
+    assert not batch.restart
+    assert sorted(batch.updates) == [(0, True), (1, False), (7, True)]
+    assert batch.skipped == 0
+    assert create_decoder().decode(mqtt_batch.encode_batch(0, {31: True}, restart=True)).restart
+
+
+def test_binary_batch_counts_unknown_ids():
+    batch = create_decoder().decode(mqtt_batch.encode_batch(1, {31: False, 40: True, 63: False}))
+    assert batch.updates == [(0, False)]
+    assert batch.skipped == 2
+
+
+def test_binary_batch_rejects_ids_that_do_not_fit():
+    with pytest.raises(ValueError):
+        mqtt_batch.encode_batch(1, {64: True})
+
+
+def test_truncated_binary_batch_is_malformed():
+    with pytest.raises(ValueError):
+        create_decoder().decode(mqtt_batch.encode_batch(1, {31: True})[:-1])
+
+
+def test_json_batch():
+    payload = json.dumps({"seq": 9, "states": {"31": "green", "32": "red"}}).encode("utf-8")
+    assert create_decoder().decode(payload) == types.StateBatch(9, False, [(0, True), (1, False)], 0)
+
+
+def test_json_batch_skips_bad_entries():
+    payload = json.dumps({"seq": 9, "states": {"31": "red", "99": "green", "kitty": "green", "38": "green"}}).encode("utf-8")
+    assert create_decoder().decode(payload) == types.StateBatch(9, False, [(0, False), (7, True)], 2)
+
+
+def test_json_restart_batch():
+    payload = json.dumps({"seq": 0, "restart": True, "states": {"31": "green"}}).encode("utf-8")
+    assert create_decoder().decode(payload).restart
+
+
+@pytest.mark.parametrize("payload", [
+    b"",
+    b"not json",
+    b"\xff\xfe",
+    b"[1, 2]",
+    b'{"states": {"31": "green"}}',
+    b'{"seq": 1}',
+    b'{"seq": true, "states": {"31": "green"}}',
+    b'{"seq": "1", "states": {"31": "green"}}',
+    b'{"seq": 1.5, "states": {"31": "green"}}',
+    b'{"seq": 1, "states": ["31"]}',
+    b'{"seq": 1, "restart": 1, "states": {"31": "green"}}'])
+def test_malformed_json_batch(payload):
+    with pytest.raises(ValueError):
+        create_decoder().decode(payload)
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+import src.render.output as output
+
+
+def apply(output_stage, frame):
+    result = np.zeros_like(frame)
+    output_stage.apply(frame, result)
+    return result
+
+
+def test_identity_stage_copies_the_frame():
+    frame = np.array([[255, 128, 0], [1, 2, 3]], dtype=np.uint8)
+    output_stage = output.OutputStage()
+    assert output_stage.identity
+    assert apply(output_stage, frame).tolist() == frame.tolist()
+
+
+def test_gamma_and_brightness_keep_the_ends():
+    frame = np.array([[0, 128, 255]], dtype=np.uint8)
+    assert apply(output.OutputStage(gamma=2.0), frame).tolist() == [[0, 64, 255]]
+    assert apply(output.OutputStage(brightness=0.5), frame).tolist() == [[0, 64, 128]]
+
+
+def test_frame_within_the_budget_is_not_dimmed():
+    frame = np.full((10, 3), 255, dtype=np.uint8)
+    # 10 pixels at full white draw 10 * (1 + 3 * 20) = 610mA
+    output_stage = output.OutputStage(power_budget_ma=610)
+    assert apply(output_stage, frame).tolist() == frame.tolist()
+    assert output_stage.stats.frames_limited == 0
+    assert output_stage.stats.last_current_ma == pytest.approx(610)
+
+
+def test_frame_above_the_budget_is_dimmed_as_a_whole():
+    frame = np.full((10, 3), 255, dtype=np.uint8)
+    frame[5:] = (255, 0, 0)
+    output_stage = output.OutputStage(power_budget_ma=210)
+    result = apply(output_stage, frame)
+
+    # Only the lit channels are scaled, the idle current of 10mA stays
+    assert output_stage.stats.frames_limited == 1
+    assert output_stage.stats.last_scale == pytest.approx(200 / 400)
+    assert output_stage.stats.last_current_ma <= 210
+    # The ratio between the channels is kept
+    assert result[0].tolist() == [127, 127, 127]
+    assert result[9].tolist() == [127, 0, 0]
+
+
+def test_budget_below_the_idle_current_turns_the_frame_off():
+    frame = np.full((10, 3), 255, dtype=np.uint8)
+    output_stage = output.OutputStage(power_budget_ma=5)
+    assert not apply(output_stage, frame).any()
+    assert output_stage.stats.last_scale == 0
+
+
+def test_brightness_has_to_be_between_0_and_1():
+    with pytest.raises(ValueError):
+        output.OutputStage(brightness=1.5)
@@ -0,0 +1,100 @@
+import time
+
+import src.state.persistence as persistence
+import src.utils.types as types
+from tests.conftest import FakeClock
+
+
+def create_persistence(tmp_path, max_records=4096):
+    return persistence.StatePersistence(str(tmp_path / "persistence" / "kitty.state"), sync_interval=0,
+                                        max_records=max_records, clock=FakeClock(1000.0, step=1.0))
+
+
+def save(tmp_path, masks, max_records=4096):
+    """ Record every mask and wait for it to be written, so each one becomes its own record """
+    state_persistence = create_persistence(tmp_path, max_records)
+    state_persistence.start()
+    for generation, mask in enumerate(masks, start=1):
+        state_persistence.record(types.ComplianceSnapshot(generation=generation, compliant_mask=mask))
+        while state_persistence._written != mask:
+            time.sleep(0.001)
+    state_persistence.close()
+    return state_persistence
+
+
+def read(tmp_path) -> bytes:
+    with open(tmp_path / "persistence" / "kitty.state", "rb") as state_file:
+        return state_file.read()
+
+
+def write(tmp_path, data: bytes):
+    with open(tmp_path / "persistence" / "kitty.state", "wb") as state_file:
+        state_file.write(data)
+
+
+def test_missing_file_loads_nothing(tmp_path):
+    assert create_persistence(tmp_path).load() is None
+
+
+def test_last_record_is_loaded(tmp_path):
+    state_persistence = save(tmp_path, [0b1, 0b10, 0b11])
+    assert state_persistence.stats.records == 3
+    assert len(read(tmp_path)) == persistence.FILE_HEADER.size + 3 * persistence.RECORD.size
+
+    loaded = create_persistence(tmp_path).load()
+    assert loaded == types.PersistedCompliance(compliant_mask=0b11, saved_at=1003.0)
+
+
+def test_torn_record_falls_back_to_the_previous_one(tmp_path):
+    save(tmp_path, [0b1, 0b10])
+    data = read(tmp_path)
+    # Power cut in the middle of the last record
+    write(tmp_path, data[:-5])
+    assert create_persistence(tmp_path).load().compliant_mask == 0b1
+
+
+def test_corrupt_record_falls_back_to_the_previous_one(tmp_path):
+    save(tmp_path, [0b1, 0b10])
+    data = bytearray(read(tmp_path))
+    data[-persistence.RECORD.size + 9] ^= 0xff
+    write(tmp_path, bytes(data))
+    assert create_persistence(tmp_path).load().compliant_mask == 0b1
+
+
+def test_file_of_other_states_is_ignored(tmp_path):
+    save(tmp_path, [0b1])
+    data = read(tmp_path)
+    write(tmp_path, persistence.FILE_HEADER.pack(persistence.FILE_MAGIC, persistence.slot_layout_checksum() ^ 1) + data[persistence.FILE_HEADER.size:])
+    assert create_persistence(tmp_path).load() is None
+
+
+def test_restart_compacts_the_previous_records(tmp_path):
+    save(tmp_path, [0b1, 0b10, 0b11])
+
+    state_persistence = create_persistence(tmp_path)
+    assert state_persistence.load().compliant_mask == 0b11
+    state_persistence.start()
+    state_persistence.record(types.ComplianceSnapshot(generation=1, compliant_mask=0b100))
+    state_persistence.close()
+
+    assert state_persistence.stats.compactions == 1
+    assert len(read(tmp_path)) == persistence.FILE_HEADER.size + persistence.RECORD.size
+    assert create_persistence(tmp_path).load().compliant_mask == 0b100
+
+
+def test_file_is_compacted_after_max_records(tmp_path):
+    state_persistence = save(tmp_path, [0b1, 0b10, 0b11, 0b100, 0b101], max_records=3)
+    # The first write and the fourth one start a new file
+    assert state_persistence.stats.compactions == 2
+    assert len(read(tmp_path)) == persistence.FILE_HEADER.size + 2 * persistence.RECORD.size
+    assert create_persistence(tmp_path).load().compliant_mask == 0b101
+
+
+def test_unchanged_compliance_is_not_written_again(tmp_path):
+    save(tmp_path, [0b1])
+    state_persistence = create_persistence(tmp_path)
+    state_persistence.load()
+    state_persistence.start()
+    state_persistence.record(types.ComplianceSnapshot(generation=1, compliant_mask=0b1))
+    state_persistence.close()
+    assert state_persistence.stats.records == 0
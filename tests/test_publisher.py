@@ -0,0 +1,142 @@
+import threading
+import time
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+import pytest
+
+import src.interfaces.publisher as publisher
+import src.utils.types as types
+
+PUBACK = SimpleNamespace(puback=SimpleNamespace(reason_code=0))
+
+
+class FakeMqttClient():
+    def __init__(self, futures=()):
+        """ Returns the given futures for the first publishes, completed ones after them
+
+        futures (Iterable[Future]): Futures of the first publishes, completed or failed by the test
+        """
+        self.futures = list(futures)
+        self.published = []
+
+    def publish_message_async(self, topic, message):
+        self.published.append((topic, message))
+        if self.futures:
+            return self.futures.pop(0)
+        return completed()
+
+
+def completed(result=PUBACK) -> Future:
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+def failed() -> Future:
+    future = Future()
+    future.set_exception(RuntimeError("Connection lost"))
+    return future
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "Condition not met in time"
+        time.sleep(0.001)
+
+
+def test_queued_messages_are_published_on_stop():
+    mqtt_client = FakeMqttClient()
+    outbound_publisher = publisher.OutboundPublisher(mqtt_client)
+    assert outbound_publisher.publish("topic", "1")
+    assert outbound_publisher.publish("topic", "2")
+    outbound_publisher.stop(timeout=2)
+
+    assert mqtt_client.published == [("topic", "1"), ("topic", "2")]
+    assert outbound_publisher.stats.published == 2
+    assert outbound_publisher.stats.queue_depth == 0
+
+
+def test_late_puback_is_waited_for_without_publishing_again():
+    late = Future()
+    mqtt_client = FakeMqttClient([late])
+    outbound_publisher = publisher.OutboundPublisher(mqtt_client, puback_timeout=0.05)
+    outbound_publisher.publish("topic", "chaos")
+    wait_until(lambda: outbound_publisher.stats.puback_timeouts)
+    late.set_result(PUBACK)
+    outbound_publisher.stop(timeout=2)
+
+    # The message is still in flight, a second publish would start the chaos twice
+    assert mqtt_client.published == [("topic", "chaos")]
+    assert outbound_publisher.stats.published == 1
+    assert outbound_publisher.stats.retried == 0
+    assert outbound_publisher.stats.failed == 0
+
+
+def test_missing_puback_gives_up_after_the_retries():
+    mqtt_client = FakeMqttClient([Future()])
+    outbound_publisher = publisher.OutboundPublisher(mqtt_client, max_retries=2, puback_timeout=0.01)
+    outbound_publisher.publish("topic", "chaos")
+    wait_until(lambda: outbound_publisher.stats.failed)
+    outbound_publisher.stop(timeout=0)
+
+    assert len(mqtt_client.published) == 1
+    assert outbound_publisher.stats.puback_timeouts == 3
+
+
+def test_failed_idempotent_message_is_published_again():
+    mqtt_client = FakeMqttClient([failed()])
+    outbound_publisher = publisher.OutboundPublisher(mqtt_client, retry_backoff=0)
+    outbound_publisher.publish("topic", "resync", idempotent=True)
+    outbound_publisher.stop(timeout=2)
+
+    assert mqtt_client.published == [("topic", "resync")] * 2
+    assert outbound_publisher.stats.retried == 1
+    assert outbound_publisher.stats.published == 1
+
+
+def test_failed_message_is_not_published_again():
+    mqtt_client = FakeMqttClient([failed()])
+    outbound_publisher = publisher.OutboundPublisher(mqtt_client, retry_backoff=0)
+    outbound_publisher.publish("topic", "chaos")
+    outbound_publisher.stop(timeout=2)
+
+    # The broker may have received it before the publish failed
+    assert mqtt_client.published == [("topic", "chaos")]
+    assert outbound_publisher.stats.retried == 0
+    assert outbound_publisher.stats.failed == 1
+
+
+@pytest.mark.parametrize("overflow_policy, accepted, published", [
+    (types.OverflowPolicy.DROP_OLDEST, True, ["a", "c", "d"]),
+    (types.OverflowPolicy.REJECT_NEWEST, False, ["a", "b", "c"])])
+def test_full_queue_follows_the_overflow_policy(overflow_policy, accepted, published):
+    # The first message waits for its PUBACK and holds back the others
+    pending = Future()
+    mqtt_client = FakeMqttClient([pending])
+    outbound_publisher = publisher.OutboundPublisher(mqtt_client, max_queue_size=2, overflow_policy=overflow_policy)
+    outbound_publisher.publish("topic", "a")
+    wait_until(lambda: mqtt_client.published)
+    assert outbound_publisher.publish("topic", "b")
+    assert outbound_publisher.publish("topic", "c")
+    assert outbound_publisher.publish("topic", "d") is accepted
+    assert outbound_publisher.stats.max_queue_depth == 2
+
+    threading.Timer(0.01, pending.set_result, (PUBACK,)).start()
+    outbound_publisher.stop(timeout=2)
+    assert [message for _, message in mqtt_client.published] == published
+    assert outbound_publisher.stats.dropped == int(accepted)
+    assert outbound_publisher.stats.rejected == int(not accepted)
+
+
+def test_messages_left_after_the_flush_timeout_are_dropped():
+    mqtt_client = FakeMqttClient([Future()])
+    outbound_publisher = publisher.OutboundPublisher(mqtt_client, puback_timeout=1.0)
+    outbound_publisher.publish("topic", "a")
+    wait_until(lambda: mqtt_client.published)
+    outbound_publisher.publish("topic", "b")
+    outbound_publisher.stop(timeout=0.05)
+
+    assert mqtt_client.published == [("topic", "a")]
+    assert outbound_publisher.stats.dropped == 1
@@ -0,0 +1,85 @@
+import sys
+
+import numpy as np
+import pytest
+
+import src.architecture.topology as topology
+import src.interfaces.backends as backends
+import src.main as kitty
+import src.render.plan as render_plan_compiler
+import src.render.recorder as recorder
+from src.state.store import STATE_SLOTS
+import src.tools.replay as replay
+import src.utils.constants as constants
+import src.utils.types as types
+
+NB_PIXELS = constants.NEOPIXEL_NB_PIXELS
+NB_FRAMES = 400
+
+
+def record_session(path, cache_dir, render_settings, max_bytes=32 * 1024):
+    """ Render frames like a board does, connecting first and with a compliance change every 50 frames, and save them """
+    board_plan = topology.load_render_plan(constants.TOPOLOGY_FILEPATH, NB_PIXELS, cache_dir)
+    connecting_plan = render_plan_compiler.compile_status_plan(NB_PIXELS)
+    neopixel_client = kitty.create_neopixel_client(backends.SimulatedStripBackend(NB_PIXELS, history=1, render_interval=0), render_settings)
+    session_recorder = recorder.SessionRecorder(NB_PIXELS, max_bytes=max_bytes, meta={
+        "board": "test", "topology": constants.TOPOLOGY_FILEPATH, "render": render_settings})
+    random = np.random.default_rng(3)
+    snapshot = types.ComplianceSnapshot(generation=0, compliant_mask=(1 << len(STATE_SLOTS)) - 1)
+    loaded_plan = None
+    for index in range(NB_FRAMES):
+        if index and index % 50 == 0:
+            snapshot = types.ComplianceSnapshot(generation=snapshot.generation + 1, compliant_mask=int(random.integers(0, 1 << len(STATE_SLOTS))))
+        plan = board_plan if index >= 30 else connecting_plan
+        if plan is not loaded_plan:
+            neopixel_client.load_plan(plan)
+            loaded_plan = plan
+        frame_time = index / 60 + float(random.uniform(0, 0.005))
+        neopixel_client.update_animation(frame_time)
+        neopixel_client.update_states(snapshot)
+        shown = neopixel_client.show_changes()
+        session_recorder.record_frame(frame_time, snapshot, plan is board_plan, neopixel_client.frame_buffer.output if shown else None)
+    session_recorder.save(path)
+
+
+def run_replay(monkeypatch, capsys, *args):
+    monkeypatch.setattr(sys, "argv", ["replay", *args])
+    replay.main()
+    return capsys.readouterr().out
+
+
+def test_saved_session_keeps_the_last_records(tmp_path):
+    path = str(tmp_path / "session.npz")
+    record_session(path, str(tmp_path), kitty.create_render_settings())
+
+    session = recorder.load_session(path)
+    # The ring buffers of 32 KiB wrapped, only the newest records and frames are left
+    assert 0 < len(session.records) < NB_FRAMES
+    assert session.meta["first_record"] == NB_FRAMES - len(session.records)
+    assert session.frames and max(session.frames) < len(session.records)
+    assert session.meta["render"] == kitty.create_render_settings()
+
+
+@pytest.mark.parametrize("max_bytes", [32 * 1024, 4 * 1024 * 1024])
+def test_replay_renders_the_recorded_frames(tmp_path, monkeypatch, capsys, max_bytes):
+    path = str(tmp_path / "session.npz")
+    # Render settings other than the current constants, the replay has to use the recorded ones
+    render_settings = {**kitty.create_render_settings(), "gamma": 2.2, "brightness": 0.5, "pulse_period": 1.3}
+    record_session(path, str(tmp_path), render_settings, max_bytes)
+
+    output = run_replay(monkeypatch, capsys, path, "--cache-dir", str(tmp_path / "cache"))
+    session = recorder.load_session(path)
+    assert f"Replayed {len(session.records)} frames, {len(session.frames)} compared with the recording, 0 differ" in output
+
+
+def test_replay_reports_differing_frames(tmp_path, monkeypatch, capsys):
+    path = str(tmp_path / "session.npz")
+    record_session(path, str(tmp_path), kitty.create_render_settings(), max_bytes=4 * 1024 * 1024)
+    session = recorder.load_session(path)
+    index = sorted(session.frames)[len(session.frames) // 2]
+    session.frames[index][:3] = session.frames[index][:3] ^ 0xff
+    monkeypatch.setattr(recorder, "load_session", lambda _: session)
+
+    output = run_replay(monkeypatch, capsys, path, "--cache-dir", str(tmp_path / "cache"))
+    assert f"Frame {index} differs from the recorded one in 3 pixels" in output
+    assert ", 1 differ" in output
@@ -0,0 +1,49 @@
+import pytest
+
+import src.render.scheduler as scheduler
+from tests.conftest import FakeClock
+
+
+def run(frame_durations, target_fps=10):
+    """ Run the scheduler on a fake clock, every frame takes the next of the durations. Returns the elapsed
+    times the frames were rendered with """
+    clock = FakeClock()
+    render_scheduler = scheduler.RenderScheduler(target_fps, clock, clock.sleep)
+    durations = iter(frame_durations)
+    elapsed = []
+
+    def render_frame(frame_time):
+        elapsed.append(frame_time)
+        clock.now += next(durations)
+
+    render_scheduler.run(render_frame, max_frames=len(frame_durations))
+    return render_scheduler, elapsed
+
+
+def test_frames_are_paced_to_the_target_fps():
+    render_scheduler, elapsed = run([0.01] * 4)
+    assert elapsed == pytest.approx([0.0, 0.1, 0.2, 0.3])
+    assert render_scheduler.stats.frames_rendered == 4
+    assert render_scheduler.stats.missed_deadlines == 0
+    assert render_scheduler.stats.max_frame_time == pytest.approx(0.01)
+
+
+def test_slow_frame_skips_the_missed_slots_instead_of_catching_up():
+    render_scheduler, elapsed = run([0.01, 0.25, 0.01, 0.01])
+    # The slow frame ends at 0.35, the slots at 0.2 and 0.3 are dropped and the next frame renders at 0.4
+    assert elapsed == pytest.approx([0.0, 0.1, 0.4, 0.5])
+    assert render_scheduler.stats.missed_deadlines == 1
+    assert render_scheduler.stats.frames_skipped == 2
+
+
+def test_stop_returns_after_the_current_frame():
+    clock = FakeClock()
+    render_scheduler = scheduler.RenderScheduler(60, clock, clock.sleep)
+    render_scheduler.run(lambda frame_time: render_scheduler.stop())
+    assert render_scheduler.stats.frames_rendered == 1
+    assert not render_scheduler.running
+
+
+def test_target_fps_has_to_be_positive():
+    with pytest.raises(ValueError):
+        scheduler.RenderScheduler(0)
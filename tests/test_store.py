@@ -0,0 +1,36 @@
+import src.state.store as store
+
+SLOT = store.STATE_SLOT_INDEX["rds_db_compliant"]
+OTHER_SLOT = store.STATE_SLOT_INDEX["alb_compliant"]
+
+
+def test_initial_snapshot_follows_the_compliance_state(compliance_store):
+    snapshot = compliance_store.snapshot
+    assert snapshot.generation == 0
+    assert all(snapshot.is_compliant(slot) for slot in range(len(store.STATE_SLOTS)))
+
+
+def test_change_publishes_a_new_snapshot(compliance_store):
+    before = compliance_store.snapshot
+    after = compliance_store.set_state(SLOT, False)
+
+    assert after is compliance_store.snapshot
+    assert after.generation == 1
+    assert not after.is_compliant(SLOT)
+    # A reader holding the previous snapshot keeps a consistent view
+    assert before.generation == 0
+    assert before.is_compliant(SLOT)
+
+
+def test_repeated_state_keeps_the_snapshot(compliance_store):
+    snapshot = compliance_store.set_state(SLOT, False)
+    assert compliance_store.set_state(SLOT, False) is snapshot
+    assert compliance_store.set_states([(SLOT, False), (OTHER_SLOT, True)]) is snapshot
+
+
+def test_updates_of_a_batch_share_one_generation(compliance_store):
+    snapshot = compliance_store.set_states([(SLOT, False), (OTHER_SLOT, False)], received_at=12.5)
+    assert snapshot.generation == 1
+    assert not snapshot.is_compliant(SLOT)
+    assert not snapshot.is_compliant(OTHER_SLOT)
+    assert snapshot.received_at == 12.5
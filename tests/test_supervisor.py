@@ -0,0 +1,146 @@
+import asyncio
+
+import pytest
+
+import src.board as board_interface
+import src.game.engine as engine
+import src.interfaces.backends as backends
+import src.interfaces.input as input_interface
+import src.interfaces.mqtt as mqtt
+import src.interfaces.mqtt_loopback as mqtt_loopback
+import src.interfaces.publisher as publisher
+import src.main as kitty
+import src.render.plan as render_plan_compiler
+import src.render.scheduler as scheduler
+import src.state.coalescer as coalescer
+import src.state.store as store
+import src.supervisor as supervisor
+import src.utils.types as types
+
+NB_PIXELS = 16
+SLOT = store.STATE_SLOT_INDEX["rds_db_compliant"]
+RESYNC_MESSAGE = ("kitty/resync", "all")
+
+
+def create_board(compliance_store) -> board_interface.Board:
+    neopixel_client = kitty.create_neopixel_client(backends.SimulatedStripBackend(NB_PIXELS, history=1), kitty.create_render_settings())
+    return board_interface.Board(
+        "kitty",
+        neopixel_client,
+        scheduler.RenderScheduler(200),
+        coalescer.StateCoalescer(compliance_store, 0),
+        board_plan=render_plan_compiler.compile_status_plan(NB_PIXELS),
+        connecting_plan=render_plan_compiler.compile_status_plan(NB_PIXELS))
+
+
+class Clients():
+    def __init__(self, board: board_interface.Board, connect_failures: int = 0):
+        """ MQTT client on the loopback broker and publisher, created by the supervisor after the first frame """
+        self.board = board
+        self.connect_failures = connect_failures
+        self.mqtt_client = None
+
+    def __call__(self):
+        self.mqtt_client = mqtt.MqttClientInterface(
+            self.board.state_coalescer,
+            types.MqttClientOption("localhost", 8883, "", "", "test"),
+            "aws/bulb/+",
+            client_builder=mqtt_loopback.loopback_client_builder)
+        self.mqtt_client.client.connect_failures = self.connect_failures
+        return self.mqtt_client, publisher.OutboundPublisher(self.mqtt_client), []
+
+
+@pytest.fixture
+def board(compliance_store):
+    return create_board(compliance_store)
+
+
+def create_supervisor(board, clients, **kwargs) -> supervisor.Supervisor:
+    return supervisor.Supervisor([board], clients, input_interface.InputQueue(), reconnect_min_delay=0.01,
+                                 reconnect_max_delay=0.02, connect_timeout=2, **kwargs)
+
+
+def run(app_supervisor, scenario):
+    """ Run the supervisor until the scenario is done and shut it down """
+    async def main():
+        task = asyncio.ensure_future(app_supervisor.run())
+        try:
+            await asyncio.wait_for(scenario(), 5)
+        finally:
+            app_supervisor.stop()
+            await task
+    asyncio.run(main())
+
+
+async def wait_until(condition):
+    while not condition():
+        await asyncio.sleep(0.005)
+
+
+def test_compliance_is_shown_once_connected(board, compliance_store):
+    clients = Clients(board)
+    app_supervisor = create_supervisor(board, clients, resync_message=RESYNC_MESSAGE)
+
+    async def scenario():
+        await wait_until(lambda: app_supervisor.stats.connections)
+        assert board.requested_plan is board.board_plan
+        clients.mqtt_client.client.deliver("aws/bulb/36", b"red")
+        await wait_until(lambda: app_supervisor.outbound_publisher.stats.published)
+
+    run(app_supervisor, scenario)
+    assert not compliance_store.snapshot.is_compliant(SLOT)
+    assert app_supervisor.stats.time_to_first_frame > 0
+    assert [packet.topic for packet in clients.mqtt_client.client.published] == [RESYNC_MESSAGE[0]]
+    # Shut down in order: the board stopped rendering and the client is stopped and unsubscribed
+    assert board.stopped
+    assert not clients.mqtt_client.running
+    assert clients.mqtt_client.client.subscriptions == []
+
+
+def test_failed_and_lost_connections_are_retried(board):
+    clients = Clients(board, connect_failures=2)
+    app_supervisor = create_supervisor(board, clients)
+
+    async def scenario():
+        await wait_until(lambda: app_supervisor.stats.connections == 1)
+        assert app_supervisor.stats.connection_attempts == 3
+        clients.mqtt_client.client.drop_connection()
+        await wait_until(lambda: board.requested_plan is board.connecting_plan)
+        await wait_until(lambda: app_supervisor.stats.connections == 2)
+        assert board.requested_plan is board.board_plan
+        # The lost session took its subscriptions along, the new one subscribes again
+        assert clients.mqtt_client.client.subscriptions == ["aws/bulb/+"]
+
+    run(app_supervisor, scenario)
+    assert app_supervisor.stats.connection_losses == 1
+
+
+def test_stop_input_shuts_down(board):
+    app_supervisor = create_supervisor(board, Clients(board))
+
+    async def scenario():
+        await wait_until(lambda: app_supervisor.stats.connections)
+        app_supervisor.input_queue.post(types.InputEventKind.STOP, "terminal")
+        await wait_until(lambda: app_supervisor._stop_event.is_set())
+
+    run(app_supervisor, scenario)
+    assert app_supervisor.input_queue.stats.handled == 1
+
+
+def test_press_during_a_session_starts_a_new_one(board):
+    clients = Clients(board)
+    game_engine = engine.GameEngine({"easy": ("chaos/start", "easy")})
+    app_supervisor = create_supervisor(board, clients, game_engine=game_engine)
+
+    async def scenario():
+        await wait_until(lambda: app_supervisor.stats.connections)
+        for started in (1, 2):
+            app_supervisor.input_queue.post(types.InputEventKind.BUTTON, "gpio")
+            await wait_until(lambda: game_engine.stats.started == started)
+        await wait_until(lambda: app_supervisor.outbound_publisher.stats.published == 2)
+
+    run(app_supervisor, scenario)
+    # Both presses started the chaos, the first session ended without a result
+    assert [packet.topic for packet in clients.mqtt_client.client.published] == ["chaos/start"] * 2
+    assert game_engine.stats.aborted == 1
+    assert game_engine.session is not None
@@ -0,0 +1,100 @@
+import json
+import os
+
+import pytest
+
+import src.architecture.topology as topology
+import src.utils.types as types
+
+
+def write_topology(path, pixels=("0-3",), state_id="rds_db_compliant"):
+    with open(path, "w") as topology_file:
+        json.dump({"components": [{"name": "rds", "component_connections": [
+            {"state_id": state_id, "pixels": list(pixels)}]}]}, topology_file)
+
+
+def cached_plans(cache_dir):
+    return sorted(name for name in os.listdir(cache_dir) if name.endswith(".plan"))
+
+
+def test_pixel_ranges_are_expanded():
+    assert topology.parse_pixels([7, "2-4", "10-8"], "test") == [7, 2, 3, 4, 10, 9, 8]
+
+
+@pytest.mark.parametrize("pixels", [[True], ["a-b"], ["1-2-3"], [1.5]])
+def test_invalid_pixels_are_rejected(pixels):
+    with pytest.raises(topology.TopologyError):
+        topology.parse_pixels(pixels, "test")
+
+
+def test_unknown_state_id_is_rejected(tmp_path):
+    path = str(tmp_path / "kitty.json")
+    write_topology(path, state_id="kitty_compliant")
+    with pytest.raises(topology.TopologyError):
+        topology.load_render_plan(path, 10)
+
+
+def test_pixels_outside_the_stripe_are_rejected(tmp_path):
+    path = str(tmp_path / "kitty.json")
+    write_topology(path, pixels=("8-12",))
+    with pytest.raises(topology.TopologyError):
+        topology.load_render_plan(path, 10)
+
+
+def test_plan_is_loaded_from_the_cache(tmp_path, monkeypatch):
+    path = str(tmp_path / "kitty.json")
+    cache_dir = str(tmp_path / "cache")
+    write_topology(path)
+    plan = topology.load_render_plan(path, 10, cache_dir)
+    assert len(cached_plans(cache_dir)) == 1
+
+    monkeypatch.setattr(topology, "compile_render_plan", None)
+    cached = topology.load_render_plan(path, 10, cache_dir)
+    assert cached.nb_pixels == plan.nb_pixels
+
+
+def test_outdated_plans_of_the_same_file_are_deleted(tmp_path):
+    path = str(tmp_path / "kitty.json")
+    cache_dir = str(tmp_path / "cache")
+    write_topology(path)
+    topology.load_render_plan(path, 10, cache_dir)
+    topology.load_render_plan(path, 20, cache_dir)
+    first = cached_plans(cache_dir)
+
+    write_topology(path, pixels=("4-7",))
+    topology.load_render_plan(path, 10, cache_dir)
+    plans = cached_plans(cache_dir)
+    # The plan of the other stripe length is kept
+    assert len(plans) == 2
+    assert [name for name in first if name.startswith("kitty-20-")] == [name for name in plans if name.startswith("kitty-20-")]
+    assert [name for name in first if name.startswith("kitty-10-")] != [name for name in plans if name.startswith("kitty-10-")]
+
+
+def test_unreadable_cache_is_compiled_again(tmp_path):
+    path = str(tmp_path / "kitty.json")
+    cache_dir = str(tmp_path / "cache")
+    write_topology(path)
+    topology.load_render_plan(path, 10, cache_dir)
+    plan_name, = cached_plans(cache_dir)
+    with open(os.path.join(cache_dir, plan_name), "wb") as cache_file:
+        cache_file.write(b"not a plan")
+    assert topology.load_render_plan(path, 10, cache_dir).nb_pixels == 10
+
+
+def test_effect_parameters_are_parsed():
+    effect = topology.parse_effect({"effect": "blink", "color": [0, 255, 0], "period": 2, "duty": 0.25}, "test")
+    assert (effect.kind, effect.color, effect.period, effect.duty) == (types.EffectKind.BLINK, (0, 255, 0), 2, 0.25)
+
+
+@pytest.mark.parametrize("effect", [
+    {"effect": "sparkle", "color": [0, 255, 0]},
+    {"effect": "solid"},
+    {"effect": "solid", "color": [0, 256, 0]},
+    {"effect": "solid", "color": [0, 255, 0], "speed_up": 2},
+    {"effect": "pulse", "color": [0, 255, 0], "period": 0},
+    {"effect": "pulse", "color": [0, 255, 0], "period": "1"},
+    {"effect": "pulse", "color": [0, 255, 0], "period": True},
+    {"effect": "blink", "color": [0, 255, 0], "duty": 1.5}])
+def test_invalid_effects_are_rejected(effect):
+    with pytest.raises(topology.TopologyError):
+        topology.parse_effect(effect, "test")